@@ -1,17 +1,17 @@
+import sqlite3
 import streamlit as st
-from db import create_connection, create_tables
+from db import pooled_connection
+from instrumentation import streamlit_profiler, timed
+from shards import database_for
 from tracker import show_tracker
 
 def main():
-    database = "chores.db"
-    conn = create_connection(database)
-    if conn is not None:
-        create_tables(conn)
-    else:
-        st.error("Error! Cannot create the database connection.")
-        return
-
-    show_tracker(conn, 1)
+    with streamlit_profiler():
+        try:
+            with pooled_connection(database_for(1)) as conn, timed("show_tracker"):
+                show_tracker(conn, 1)
+        except sqlite3.Error as e:
+            st.error(f"Error! Cannot create the database connection: {e}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
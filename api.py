@@ -0,0 +1,317 @@
+"""Headless JSON API over db.py for kiosks and smart buttons.
+
+A plain ASGI application with no framework dependency; serve it with any
+ASGI server, e.g. ``uvicorn api:app``. Reads run on worker threads against
+the shared connection pool (and read cache), and activity logs go through
+the background writer, so concurrent requests are group-committed.
+
+Every /admins/{admin_id} route needs ``Authorization: Bearer <token>`` for
+that admin, where the token comes from POST /login (set ``CHORES_API_AUTH=0``
+to turn this off on a trusted network).
+
+    GET  /health
+    POST /login                                  {"username", "password"}
+    POST /logout
+    GET  /admins/{admin_id}/users
+    GET  /admins/{admin_id}/tasks
+    GET  /admins/{admin_id}/levels
+    GET  /admins/{admin_id}/progress[?user_id=1,2]
+    GET  /admins/{admin_id}/users/{user_id}/progress
+    GET  /admins/{admin_id}/changes?since=<cursor>[&limit=1000]
+    POST /admins/{admin_id}/activities          {"user_id", "task_id", "time_spent", ...}
+    POST /admins/{admin_id}/activities/batch    {"activities": [...]}
+
+An activity may carry a "client_ref" (up to 64 characters); the server logs
+each client_ref once, so a client can resend a log whose reply it never got.
+A batch answers 201, or 207 with one result per item; a failed item has
+its own status (503 when it timed out or the database was busy) and
+its client_ref, so the items worth resending can be picked out.
+GET .../changes is the delta feed for sync.SyncClient (see db.get_changes).
+"""
+import asyncio
+import json
+import os
+import re
+import sqlite3
+from datetime import date
+from urllib.parse import parse_qs
+
+import auth
+from db import pooled_connection, get_users, get_tasks, get_levels, get_level_index, get_changes
+from shards import database_for
+from writer import get_writer
+
+MAX_BODY_BYTES = 1 << 20
+MAX_BATCH = 500
+MAX_CHANGES = 5000  # largest page of changes a client may ask for
+MAX_CLIENT_REF = 64
+LOG_TIMEOUT = 10  # seconds to wait for the writer to commit a log
+REQUIRE_AUTH = os.environ.get("CHORES_API_AUTH", "1") != "0"
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _read(fn, admin_id, *args):
+    with pooled_connection(database_for(admin_id)) as conn:
+        return fn(conn, admin_id, *args)
+
+
+def _users(conn, admin_id):
+    return [{"user_id": u, "name": n, "current_level": lvl, "total_xp": xp} for u, n, lvl, xp in get_users(conn, admin_id)]
+
+
+def _tasks(conn, admin_id):
+    return [{"task_id": t, "task_name": n, "base_xp": xp, "time_multiplier": m} for t, n, xp, m in get_tasks(conn, admin_id)]
+
+
+def _levels(conn, admin_id):
+    return [{"level": lvl, "xp_required": req, "cumulative_xp": cum, "reward": r} for lvl, req, cum, r in get_levels(conn, admin_id)]
+
+
+def _progress(conn, admin_id, user_ids=None):
+    level_index = get_level_index(conn, admin_id)
+    progress = []
+    for user_id, name, _, total_xp in get_users(conn, admin_id):
+        if user_ids is not None and user_id not in user_ids:
+            continue
+        level, floor, ceiling, fraction = level_index.progress(total_xp)
+        progress.append({"user_id": user_id, "name": name, "total_xp": total_xp or 0, "level": level,
+                         "level_floor_xp": floor, "next_level_xp": ceiling, "progress": round(fraction, 4),
+                         "xp_to_next_level": None if ceiling is None else ceiling - (total_xp or 0)})
+    return progress
+
+
+def _known_ids(conn, admin_id):
+    return {u[0] for u in get_users(conn, admin_id)}, {t[0] for t in get_tasks(conn, admin_id)}
+
+
+def _parse_activity(item, users, tasks):
+    if not isinstance(item, dict):
+        raise HTTPError(400, "Each activity must be a JSON object")
+    try:
+        user_id, task_id = int(item["user_id"]), int(item["task_id"])
+        time_spent = int(item.get("time_spent", 0))
+        bonus_xp = int(item.get("bonus_xp", 0))
+        day = date.fromisoformat(item.get("date") or date.today().isoformat()).isoformat()
+        client_ref = item.get("client_ref")
+        if client_ref is not None and (not isinstance(client_ref, str) or not 0 < len(client_ref) <= MAX_CLIENT_REF):
+            raise ValueError(f"client_ref must be a string of 1 to {MAX_CLIENT_REF} characters")
+    except KeyError as e:
+        raise HTTPError(400, f"Missing field {e.args[0]}")
+    except (TypeError, ValueError) as e:
+        raise HTTPError(400, f"Invalid activity: {e}")
+    if user_id not in users:
+        raise HTTPError(404, f"User {user_id} not found")
+    if task_id not in tasks:
+        raise HTTPError(404, f"Task {task_id} not found")
+    return user_id, task_id, day, time_spent, bonus_xp, item.get("small_reward"), client_ref
+
+
+async def _log(admin_id, args):
+    future = get_writer(database_for(admin_id)).submit(admin_id, *args)
+    xp_earned, total_xp, current_level = await asyncio.wait_for(asyncio.wrap_future(future), LOG_TIMEOUT)
+    return {"user_id": args[0], "task_id": args[1], "xp_earned": xp_earned, "total_xp": total_xp,
+            "current_level": current_level, "client_ref": args[6]}
+
+
+async def health(request):
+    return 200, {"status": "ok"}
+
+
+async def login(request):
+    body = request["json"]
+    if not isinstance(body, dict) or not isinstance(body.get("username"), str) or not isinstance(body.get("password"), str):
+        raise HTTPError(400, "Expected {\"username\": ..., \"password\": ...}")
+    try:
+        admin_id, token = await asyncio.wrap_future(auth.submit_login(body["username"], body["password"], request["client"]))
+    except auth.RateLimitedError as e:
+        raise HTTPError(429, str(e))
+    if admin_id is None:
+        raise HTTPError(401, "Invalid username or password")
+    return 200, {"admin_id": admin_id, "token": token}
+
+
+async def logout(request):
+    auth.logout(request["token"] or "")
+    return 200, {"status": "logged out"}
+
+
+async def list_users(request, admin_id):
+    return 200, await asyncio.to_thread(_read, _users, admin_id)
+
+
+async def list_tasks(request, admin_id):
+    return 200, await asyncio.to_thread(_read, _tasks, admin_id)
+
+
+async def list_levels(request, admin_id):
+    return 200, await asyncio.to_thread(_read, _levels, admin_id)
+
+
+async def all_progress(request, admin_id):
+    wanted = request["query"].get("user_id")
+    try:
+        user_ids = {int(u) for value in wanted for u in value.split(",") if u} if wanted else None
+    except ValueError:
+        raise HTTPError(400, "user_id must be a comma-separated list of integers")
+    return 200, await asyncio.to_thread(_read, _progress, admin_id, user_ids)
+
+
+async def user_progress(request, admin_id, user_id):
+    progress = await asyncio.to_thread(_read, _progress, admin_id, {user_id})
+    if not progress:
+        raise HTTPError(404, f"User {user_id} not found")
+    return 200, progress[0]
+
+
+async def list_changes(request, admin_id):
+    try:
+        since = int(request["query"].get("since", ["0"])[0])
+        limit = int(request["query"].get("limit", ["1000"])[0])
+    except ValueError:
+        raise HTTPError(400, "since and limit must be integers")
+    if since < 0 or not 0 < limit <= MAX_CHANGES:
+        raise HTTPError(400, f"since must be 0 or more and limit between 1 and {MAX_CHANGES}")
+    return 200, await asyncio.to_thread(_read, get_changes, admin_id, since, limit)
+
+
+async def log_activity(request, admin_id):
+    users, tasks = await asyncio.to_thread(_read, _known_ids, admin_id)
+    args = _parse_activity(request["json"], users, tasks)
+    try:
+        return 201, await _log(admin_id, args)
+    except ValueError as e:
+        raise HTTPError(404, str(e))
+
+
+async def log_activities(request, admin_id):
+    body = request["json"]
+    items = body.get("activities") if isinstance(body, dict) else None
+    if not isinstance(items, list) or not items:
+        raise HTTPError(400, "Expected {\"activities\": [...]} with at least one activity")
+    if len(items) > MAX_BATCH:
+        raise HTTPError(413, f"At most {MAX_BATCH} activities per batch")
+    users, tasks = await asyncio.to_thread(_read, _known_ids, admin_id)
+    parsed = []
+    for item in items:
+        try:
+            parsed.append(_parse_activity(item, users, tasks))
+        except HTTPError as e:
+            parsed.append(e)
+    # Submit everything before awaiting so the writer commits the batch together.
+    pending = [e if isinstance(e, HTTPError) else asyncio.ensure_future(_log(admin_id, e)) for e in parsed]
+    results = []
+    for item, entry in zip(items, pending):
+        if isinstance(entry, HTTPError):
+            failure = {"ok": False, "status": entry.status, "error": entry.message}
+        else:
+            try:
+                results.append({"ok": True, **await entry})
+                continue
+            except ValueError as e:
+                failure = {"ok": False, "status": 404, "error": str(e)}
+            except (asyncio.TimeoutError, sqlite3.Error) as e:
+                # A timed-out log may still commit; resending it with its client_ref will not log it twice.
+                failure = {"ok": False, "status": 503, "error": str(e) or "Timed out waiting for the writer"}
+        if isinstance(item, dict) and isinstance(item.get("client_ref"), str):
+            failure["client_ref"] = item["client_ref"]
+        results.append(failure)
+    logged = sum(r["ok"] for r in results)
+    return (201 if logged == len(results) else 207), {"logged": logged, "failed": len(results) - logged, "results": results}
+
+
+ROUTES = [
+    ("GET", r"/health", health),
+    ("POST", r"/login", login),
+    ("POST", r"/logout", logout),
+    ("GET", r"/admins/(\d+)/users", list_users),
+    ("GET", r"/admins/(\d+)/tasks", list_tasks),
+    ("GET", r"/admins/(\d+)/levels", list_levels),
+    ("GET", r"/admins/(\d+)/progress", all_progress),
+    ("GET", r"/admins/(\d+)/users/(\d+)/progress", user_progress),
+    ("GET", r"/admins/(\d+)/changes", list_changes),
+    ("POST", r"/admins/(\d+)/activities", log_activity),
+    ("POST", r"/admins/(\d+)/activities/batch", log_activities),
+]
+_ROUTES = [(method, re.compile(pattern + r"/?"), handler) for method, pattern, handler in ROUTES]
+
+
+def route(method, path):
+    """Return (handler, int path params), raising HTTPError 404/405."""
+    allowed = False
+    for route_method, pattern, handler in _ROUTES:
+        match = pattern.fullmatch(path)
+        if match:
+            if route_method == method:
+                return handler, [int(p) for p in match.groups()]
+            allowed = True
+    raise HTTPError(405 if allowed else 404, "Method not allowed" if allowed else "Not found")
+
+
+def _bearer_token(scope):
+    for name, value in scope.get("headers", []):
+        if name.lower() == b"authorization" and value[:7].lower() == b"bearer ":
+            return value[7:].decode().strip()
+    return None
+
+
+def _authorize(scope, token):
+    if not REQUIRE_AUTH or not scope["path"].startswith("/admins/"):
+        return
+    admin_id = auth.admin_for_token(token)
+    if admin_id is None:
+        raise HTTPError(401, "Missing or expired session token")
+    if scope["path"].split("/")[2] != str(admin_id):
+        raise HTTPError(403, "Token does not belong to this admin")
+
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while (await receive())["type"] != "lifespan.shutdown":
+            await send({"type": "lifespan.startup.complete"})
+        await send({"type": "lifespan.shutdown.complete"})
+        return
+    if scope["type"] != "http":
+        return
+    try:
+        handler, params = route(scope["method"], scope["path"])
+        token = _bearer_token(scope)
+        _authorize(scope, token)
+        request = {"query": parse_qs(scope.get("query_string", b"").decode()), "json": None, "token": token,
+                   "client": (scope.get("client") or (None,))[0]}
+        if scope["method"] == "POST":
+            try:
+                request["json"] = json.loads(await _read_body(receive) or b"null")
+            except ValueError:
+                raise HTTPError(400, "Body is not valid JSON")
+        status, payload = await handler(request, *params)
+    except HTTPError as e:
+        status, payload = e.status, {"error": e.message}
+    except (asyncio.TimeoutError, sqlite3.OperationalError) as e:
+        status, payload = 503, {"error": f"Database busy: {e}"}
+    except sqlite3.Error as e:
+        status, payload = 500, {"error": f"Database error: {e}"}
+    await _send_json(send, status, payload)
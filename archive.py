@@ -0,0 +1,267 @@
+"""Archive old ActivityLog rows to month-partitioned Parquet files.
+
+Rows dated before a cutoff are streamed, in chunks, into one Parquet file
+per admin and month under ``CHORES_ARCHIVE_DIR`` (default ``archive/`` next
+to the database), then removed from ActivityLog in one transaction that
+also records the file in ActivityArchive and adds the rows' rollup totals
+to ArchivedDailyXP. DailyXP and Users.total_xp are left as they were, so
+the dashboard and levels do not change. History reads
+(``db.get_activity_page``, ``db.get_all_user_activities``) merge in the
+archived rows, reading the files memory-mapped.
+
+pyarrow is optional: without it nothing can be archived, and history from
+archived partitions is skipped with a warning. It is imported on first use,
+so loading db (which imports this module) does not pay for it.
+
+    python archive.py chores.db --before 2024-01-01
+"""
+import argparse
+import functools
+import importlib.util
+import os
+import sqlite3
+import sys
+import time
+from datetime import date
+
+pa = pq = None  # optional dependency, see _pyarrow
+
+ARCHIVE_DIR = os.environ.get("CHORES_ARCHIVE_DIR") or None
+CHUNK_ROWS = 50_000
+
+ARCHIVE_COLUMNS = ("activity_id", "admin_id", "user_id", "task_id", "task_name", "date",
+                   "time_spent", "xp_earned", "bonus_xp", "small_reward")
+HISTORY_COLUMNS = ["activity_id", "date", "task_name", "time_spent", "xp_earned"]
+
+# Rows of one partition: admin_id, date in [start, end), present when archiving started.
+PARTITION_WHERE = "a.admin_id = ? AND a.date >= ? AND a.date < ? AND a.activity_id <= ?"
+
+_warned = False
+
+
+@functools.cache
+def available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _pyarrow():
+    global pa, pq
+    if pq is None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    return pa, pq
+
+
+def _schema():
+    pa, _ = _pyarrow()
+    return pa.schema([("activity_id", pa.int64()), ("admin_id", pa.int64()), ("user_id", pa.int64()),
+                      ("task_id", pa.int64()), ("task_name", pa.string()), ("date", pa.string()),
+                      ("time_spent", pa.int64()), ("xp_earned", pa.int64()), ("bonus_xp", pa.int64()),
+                      ("small_reward", pa.string())])
+
+
+def database_path(conn):
+    """File behind conn's main database ('' for in-memory databases)."""
+    for _, name, path in conn.execute("PRAGMA database_list").fetchall():
+        if name == "main":
+            return path or ""
+    return ""
+
+
+def archive_root(conn):
+    db_path = database_path(conn)
+    stem = os.path.splitext(os.path.basename(db_path))[0] or "memory"
+    return os.path.join(ARCHIVE_DIR or os.path.join(os.path.dirname(db_path), "archive"), stem)
+
+
+def _resolve(conn, path):
+    return os.path.join(os.path.dirname(database_path(conn)), path)
+
+
+def _next_month(month):
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{year + mon // 12:04d}-{mon % 12 + 1:02d}"
+
+
+def _totals(conn, params):
+    return conn.execute(f"""
+        SELECT COUNT(*), COALESCE(SUM(xp_earned), 0), COALESCE(SUM(bonus_xp), 0), COALESCE(SUM(time_spent), 0)
+        FROM ActivityLog a WHERE {PARTITION_WHERE}""", params).fetchone()
+
+
+def _write_partition(conn, path, params, chunk_rows):
+    pa, pq = _pyarrow()
+    tmp = path + ".tmp"
+    writer = pq.ParquetWriter(tmp, _schema(), compression="zstd")
+    try:
+        cursor = conn.execute(f"""
+            SELECT a.activity_id, a.admin_id, a.user_id, a.task_id, t.task_name, a.date,
+                   a.time_spent, a.xp_earned, a.bonus_xp, a.small_reward
+            FROM ActivityLog a LEFT JOIN Tasks t ON a.task_id = t.task_id
+            WHERE {PARTITION_WHERE}
+            ORDER BY a.date, a.activity_id""", params)
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            writer.write_table(pa.table({name: list(col) for name, col in zip(ARCHIVE_COLUMNS, columns)}, schema=_schema()))
+    finally:
+        writer.close()
+    os.replace(tmp, path)
+
+
+def archive_activities(conn, before, admin_id=None, chunk_rows=CHUNK_ROWS):
+    """Move activities dated before `before` (YYYY-MM-DD) into Parquet files.
+
+    Each admin/month partition is written and then committed on its own, so
+    an interrupted run leaves finished partitions archived and the rest
+    live. A partition whose rows change while its file is written is left
+    alone. Returns a summary dict.
+    """
+    if not available():
+        raise RuntimeError("Archiving needs pyarrow (pip install pyarrow)")
+    before = date.fromisoformat(str(before)).isoformat()
+    start = time.perf_counter()
+    max_id = conn.execute("SELECT COALESCE(MAX(activity_id), 0) FROM ActivityLog").fetchone()[0]
+    where, params = "date < ? AND admin_id IS NOT NULL", [before]
+    if admin_id is not None:
+        where += " AND admin_id = ?"
+        params.append(admin_id)
+    partitions = conn.execute(f"""
+        SELECT admin_id, substr(date, 1, 7) AS month FROM ActivityLog
+        WHERE {where} GROUP BY admin_id, month ORDER BY admin_id, month""", params).fetchall()
+
+    root = archive_root(conn)
+    summary = {"partitions": 0, "rows_archived": 0, "skipped": 0, "files": []}
+    for part_admin, month in partitions:
+        params = (part_admin, month, min(_next_month(month), before), max_id)
+        expected = _totals(conn, params)
+        if not expected[0]:
+            continue
+        directory = os.path.join(root, f"admin_{part_admin}", month)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{time.time_ns()}.parquet")
+        _write_partition(conn, path, params, chunk_rows)
+        first_date, last_date = conn.execute(
+            f"SELECT MIN(a.date), MAX(a.date) FROM ActivityLog a WHERE {PARTITION_WHERE}", params).fetchone()
+        try:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                if _totals(conn, params) != expected:  # written to while the file was being built
+                    raise sqlite3.IntegrityError("partition changed during archiving")
+                conn.execute("INSERT INTO ArchiveInProgress (locked) VALUES (1)")
+                conn.execute(f"""
+                    INSERT INTO ArchivedDailyXP (admin_id, user_id, date, task_id, activity_count, time_spent, xp_earned, bonus_xp)
+                    SELECT a.admin_id, a.user_id, a.date, a.task_id, COUNT(*),
+                           COALESCE(SUM(a.time_spent), 0), COALESCE(SUM(a.xp_earned), 0), COALESCE(SUM(a.bonus_xp), 0)
+                    FROM ActivityLog a
+                    WHERE {PARTITION_WHERE} AND a.user_id IS NOT NULL AND a.task_id IS NOT NULL
+                    GROUP BY a.admin_id, a.user_id, a.date, a.task_id
+                    ON CONFLICT (admin_id, user_id, date, task_id) DO UPDATE SET
+                        activity_count = activity_count + excluded.activity_count,
+                        time_spent = time_spent + excluded.time_spent,
+                        xp_earned = xp_earned + excluded.xp_earned,
+                        bonus_xp = bonus_xp + excluded.bonus_xp""", params)
+                conn.execute(f"DELETE FROM ActivityLog AS a WHERE {PARTITION_WHERE}", params)
+                conn.execute("DELETE FROM ArchiveInProgress")
+                conn.execute("""
+                    INSERT INTO ActivityArchive (admin_id, month, path, first_date, last_date, max_activity_id, row_count, xp_earned)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (part_admin, month, os.path.relpath(path, os.path.dirname(database_path(conn)) or "."),
+                     first_date, last_date, max_id, expected[0], expected[1]))
+        except sqlite3.Error as e:
+            os.remove(path)
+            print(f"Skipped admin {part_admin} {month}: {e}")
+            summary["skipped"] += 1
+            continue
+        summary["partitions"] += 1
+        summary["rows_archived"] += expected[0]
+        summary["files"].append(path)
+    elapsed = time.perf_counter() - start
+    summary["seconds"] = round(elapsed, 3)
+    summary["rows_per_second"] = round(summary["rows_archived"] / elapsed) if elapsed else 0
+    return summary
+
+
+def archived_partitions(conn, admin_id):
+    return conn.execute("""
+        SELECT month, path, first_date, last_date, row_count, xp_earned, created_at
+        FROM ActivityArchive WHERE admin_id = ? ORDER BY last_date DESC, archive_id DESC""", (admin_id,)).fetchall()
+
+
+def _read_part(conn, path, user_id):
+    _, pq = _pyarrow()
+    table = pq.read_table(_resolve(conn, path), columns=HISTORY_COLUMNS, filters=[("user_id", "=", user_id)],
+                          memory_map=True)
+    return list(zip(*(table.column(name).to_pylist() for name in HISTORY_COLUMNS)))
+
+
+def read_archived_activities(conn, admin_id, user_id, before=None, since=None, limit=None):
+    """Archived history rows for a user, newest first.
+
+    Rows are (activity_id, date, task_name, time_spent, xp_earned), matching
+    the live history query. before is a (date, activity_id) keyset cursor;
+    since skips partitions that end before that date. Only partitions that
+    can hold matching rows are opened, newest first, and reading stops once
+    `limit` rows are certain.
+    """
+    global _warned
+    clauses, params = ["admin_id = ?"], [admin_id]
+    if before is not None:
+        clauses.append("first_date <= ?")
+        params.append(before[0])
+    if since is not None:
+        clauses.append("last_date >= ?")
+        params.append(since)
+    parts = conn.execute(f"""
+        SELECT path, first_date, last_date FROM ActivityArchive
+        WHERE {' AND '.join(clauses)} ORDER BY last_date DESC, archive_id DESC""", params).fetchall()
+    if not parts:
+        return []
+    if not available():
+        if not _warned:
+            print("pyarrow is not installed; archived activity history is not shown")
+            _warned = True
+        return []
+    rows = []
+    for path, first_date, last_date in parts:
+        if limit is not None and len(rows) >= limit:
+            rows.sort(key=lambda r: (r[1], r[0]), reverse=True)
+            if rows[limit - 1][1] > last_date:
+                break  # every remaining partition is older than the rows we have
+        part = _read_part(conn, path, user_id)
+        if before is not None:
+            part = [r for r in part if (r[1], r[0]) < tuple(before)]
+        rows.extend(part)
+    rows.sort(key=lambda r: (r[1], r[0]), reverse=True)
+    return rows[:limit] if limit is not None else rows
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Move old activities into Parquet archive files.")
+    parser.add_argument("db_file", nargs="?", default="chores.db")
+    parser.add_argument("--before", required=True, help="archive activities dated before this day (YYYY-MM-DD)")
+    parser.add_argument("--admin-id", type=int)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv[1:])
+
+    from db import create_tables  # imported late, db imports this module
+    conn = sqlite3.connect(args.db_file)
+    create_tables(conn)
+    try:
+        summary = archive_activities(conn, args.before, args.admin_id, args.chunk_rows)
+    except (RuntimeError, ValueError) as e:
+        print(e)
+        return 1
+    finally:
+        conn.close()
+    print(f"Archived {summary['rows_archived']} activities in {summary['partitions']} partitions "
+          f"({summary['rows_per_second']} rows/s), skipped {summary['skipped']}")
+    for path in summary["files"]:
+        print(f"    {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
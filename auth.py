@@ -0,0 +1,194 @@
+"""Admin authentication: off-thread bcrypt, session tokens and rate limits.
+
+bcrypt verification is deliberately slow, so it runs on a small thread pool
+(``CHORES_AUTH_WORKERS``, default 2) instead of the caller's thread, which
+also caps how many cores logins can use at once. A successful login returns
+a session token; resolving the token on later requests or reruns is a dict
+lookup, so passwords are only verified once per session. Failed attempts
+are counted per username and per client address, and a key that fails too
+often is refused without running bcrypt at all.
+
+The bcrypt cost is ``db.BCRYPT_ROUNDS`` (``CHORES_BCRYPT_ROUNDS``); hashes
+made with another cost are upgraded by ``db.login_admin`` on the next login.
+"""
+import hashlib
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import shards
+
+AUTH_WORKERS = int(os.environ.get("CHORES_AUTH_WORKERS", 2))
+MAX_PENDING = 32  # verifications queued or running before new logins are refused
+SESSION_TTL = 12 * 3600
+
+
+class RateLimitedError(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Too many login attempts, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Sliding-window count of failed attempts per key."""
+
+    def __init__(self, max_failures, window):
+        self.max_failures = max_failures
+        self.window = window
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def retry_after(self, key, now=None):
+        """Seconds until key may try again, 0 if it may try now."""
+        now = now or time.monotonic()
+        with self._lock:
+            failures = self._failures.get(key)
+            if not failures:
+                return 0
+            while failures and failures[0] <= now - self.window:
+                failures.popleft()
+            if not failures:
+                del self._failures[key]
+                return 0
+            if len(failures) < self.max_failures:
+                return 0
+            return failures[0] + self.window - now
+
+    def record_failure(self, key):
+        with self._lock:
+            self._failures.setdefault(key, deque()).append(time.monotonic())
+
+    def reset(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+
+
+class SessionStore:
+    """In-process session tokens. Only a hash of each token is kept."""
+
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def create(self, admin_id, username):
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._sessions[self._key(token)] = (admin_id, username, time.monotonic() + self.ttl)
+        return token
+
+    def resolve(self, token):
+        """Return the admin_id for a live token, or None."""
+        if not token:
+            return None
+        key = self._key(token)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                return None
+            if session[2] < time.monotonic():
+                del self._sessions[key]
+                return None
+            return session[0]
+
+    def revoke(self, token):
+        with self._lock:
+            return self._sessions.pop(self._key(token), None) is not None
+
+    def revoke_admin(self, admin_id):
+        with self._lock:
+            for key in [k for k, s in self._sessions.items() if s[0] == admin_id]:
+                del self._sessions[key]
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+username_limiter = RateLimiter(max_failures=5, window=300)
+address_limiter = RateLimiter(max_failures=20, window=300)
+sessions = SessionStore()
+_executor = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="auth")
+_pending = threading.BoundedSemaphore(MAX_PENDING)
+_stats = {"attempts": 0, "succeeded": 0, "failed": 0, "rate_limited": 0, "verify_time": 0.0}
+_stats_lock = threading.Lock()
+
+
+def _verify(username, password):
+    start = time.perf_counter()
+    try:
+        return shards.login_admin(username, password)
+    finally:
+        with _stats_lock:
+            _stats["verify_time"] += time.perf_counter() - start
+        _pending.release()
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats["attempts"] += 1
+        _stats[outcome] += 1
+
+
+def submit_login(username, password, address=None):
+    """Start verifying a login on the auth pool and return a Future.
+
+    Raises RateLimitedError straight away, without running bcrypt, when the
+    username or address has failed too often or the pool is saturated. The
+    Future resolves to (admin_id, token), or (None, None) for bad credentials.
+    """
+    keys = [(username_limiter, username.lower())]
+    if address:
+        keys.append((address_limiter, address))
+    wait = max(limiter.retry_after(key) for limiter, key in keys)
+    if wait or not _pending.acquire(blocking=False):
+        _count("rate_limited")
+        raise RateLimitedError(wait or 1)
+    verifying = _executor.submit(_verify, username, password)
+    result = Future()
+
+    def done(f):
+        error = f.exception()
+        if error is not None:
+            result.set_exception(error)
+            return
+        admin_id, ok = f.result()
+        if ok:
+            username_limiter.reset(username.lower())
+            _count("succeeded")
+            result.set_result((admin_id, sessions.create(admin_id, username)))
+        else:
+            for limiter, key in keys:
+                limiter.record_failure(key)
+            _count("failed")
+            result.set_result((None, None))
+
+    verifying.add_done_callback(done)
+    return result
+
+
+def login(username, password, address=None, timeout=30):
+    """Blocking submit_login: returns (admin_id, token) or (None, None)."""
+    return submit_login(username, password, address).result(timeout)
+
+
+def logout(token):
+    return sessions.revoke(token)
+
+
+def admin_for_token(token):
+    return sessions.resolve(token)
+
+
+def get_auth_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["verify_time_ms"] = round(stats.pop("verify_time") * 1000, 3)
+    stats["active_sessions"] = len(sessions)
+    return stats
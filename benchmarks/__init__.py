@@ -0,0 +1,8 @@
+"""Benchmarks for the chore tracker.
+
+``python -m benchmarks.run`` seeds a scratch database with synthetic
+households (see ``benchmarks.datagen``), times the public functions in db.py
+plus the data preparation done by tracker.py and the dashboard page, and
+writes the results as JSON. Pass ``--compare old.json`` to flag regressions
+against an earlier run.
+"""
@@ -0,0 +1,94 @@
+"""Synthetic household and activity data for benchmarks.
+
+Everything is written through the public db.py functions, so seeding also
+exercises the same write paths the app uses.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+import db
+
+KID_NAMES = ["Ava", "Ben", "Cleo", "Dev", "Eli", "Fay", "Gus", "Hana", "Ivan", "Jade", "Kai", "Lena"]
+TASK_NAMES = ["Dishes", "Laundry", "Vacuum", "Feed Pets", "Homework", "Make Bed", "Trash", "Garden",
+              "Sweep Floor", "Reading", "Practice Piano", "Clean Room", "Set Table", "Fold Clothes", "Walk Dog"]
+
+
+def seed_database(db_file, admins=2, kids=4, tasks=10, years=1.0, activities_per_day=3, seed=0, bulk=False):
+    """Create db_file and fill it with synthetic households.
+
+    Each admin gets `kids` children and `tasks` chores. Every child logs
+    around `activities_per_day` chores a day for `years` years ending today.
+    With bulk=True activities go through bulk_import_activities instead of
+    one log_activity call each, which is much faster for large datasets.
+    Returns a dict describing what was generated.
+    """
+    rng = random.Random(seed)
+    if os.path.exists(db_file):
+        os.remove(db_file)
+    conn = sqlite3.connect(db_file)
+    db.create_tables(conn)
+
+    start = time.perf_counter()
+    days = max(1, int(years * 365))
+    first_day = date.today() - timedelta(days=days - 1)
+    activity_count = 0
+    for a in range(admins):
+        username = f"bench_admin_{a}"
+        db.register_admin(conn, username, "password")
+        admin_id, _ = db.login_admin(conn, username, "password")
+        for k in range(kids):
+            db.add_user(conn, admin_id, f"{KID_NAMES[k % len(KID_NAMES)]} {a}-{k}")
+        for t in range(tasks):
+            db.add_task(conn, admin_id, TASK_NAMES[t % len(TASK_NAMES)], rng.choice([10, 25, 50, 75, 100]),
+                        rng.choice([0.0, 0.5, 1.0]))
+        user_ids = [row[0] for row in db.get_users(conn, admin_id)]
+        task_ids = [row[0] for row in db.get_tasks(conn, admin_id)]
+
+        def activities():
+            for d in range(days):
+                day = str(first_day + timedelta(days=d))
+                for user_id in user_ids:
+                    for _ in range(rng.randint(0, 2 * activities_per_day)):
+                        yield {"user_id": user_id, "task_id": rng.choice(task_ids), "date": day,
+                               "time_spent": rng.randint(5, 60), "bonus_xp": rng.choice([0, 0, 0, 5, 10])}
+
+        if bulk:
+            activity_count += db.bulk_import_activities(conn, admin_id, activities())["rows_inserted"]
+        else:
+            for row in activities():
+                db.log_activity(conn, admin_id, row["user_id"], row["task_id"], row["date"],
+                                row["time_spent"], row["bonus_xp"])
+                activity_count += 1
+    conn.close()
+    return {
+        "admins": admins,
+        "kids_per_admin": kids,
+        "tasks_per_admin": tasks,
+        "days": days,
+        "activities": activity_count,
+        "seed": seed,
+        "seed_seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a scratch chore tracker database with synthetic data.")
+    parser.add_argument("db_file")
+    parser.add_argument("--admins", type=int, default=2)
+    parser.add_argument("--kids", type=int, default=4)
+    parser.add_argument("--tasks", type=int, default=10)
+    parser.add_argument("--years", type=float, default=1.0)
+    parser.add_argument("--activities-per-day", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bulk", action="store_true", help="insert activities with bulk_import_activities")
+    args = parser.parse_args()
+    print(seed_database(args.db_file, args.admins, args.kids, args.tasks, args.years,
+                        args.activities_per_day, args.seed, args.bulk))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Load test for the JSON API with an in-process ASGI client.
+
+    python -m benchmarks.load --concurrency 32 --requests 5000
+
+Requests are sent straight to ``api.app`` (no sockets or server), so the
+numbers measure the API, pool, cache and writer rather than the network.
+Reports requests per second plus p50/p95/p99 latency per endpoint.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import db
+import writer
+from benchmarks.datagen import seed_database
+
+# (weight, name, method, path template, body factory)
+MIX = [
+    (6, "log_activity", "POST", "/admins/{admin_id}/activities",
+     lambda rng, ids: {"user_id": rng.choice(ids["users"]), "task_id": rng.choice(ids["tasks"]), "time_spent": rng.randint(5, 60)}),
+    (1, "log_batch", "POST", "/admins/{admin_id}/activities/batch",
+     lambda rng, ids: {"activities": [{"user_id": rng.choice(ids["users"]), "task_id": rng.choice(ids["tasks"]),
+                                       "time_spent": rng.randint(5, 60)} for _ in range(10)]}),
+    (6, "user_progress", "GET", "/admins/{admin_id}/users/{user_id}/progress", None),
+    (3, "progress", "GET", "/admins/{admin_id}/progress", None),
+    (3, "tasks", "GET", "/admins/{admin_id}/tasks", None),
+    (1, "levels", "GET", "/admins/{admin_id}/levels", None),
+]
+
+
+class ASGIClient:
+    """Minimal stand-in HTTP client that calls an ASGI app directly."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method, path, body=None, token=None):
+        path, _, query = path.partition("?")
+        headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+        scope = {"type": "http", "method": method, "path": path, "query_string": query.encode(), "headers": headers,
+                 "client": ("127.0.0.1", 0)}
+        payload = json.dumps(body).encode() if body is not None else b""
+        sent = False
+        response = {}
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                return {"type": "http.disconnect"}
+            sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["body"] = response.get("body", b"") + message.get("body", b"")
+
+        await self.app(scope, receive, send)
+        return response["status"], json.loads(response.get("body") or b"null")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_load(app, admins, total_requests, concurrency, password="password", seed=0):
+    """admins is a list of usernames; each logs in once and its token is reused."""
+    client = ASGIClient(app)
+    rng = random.Random(seed)
+    ids = {}
+    tokens = {}
+    for username in admins:
+        status, session = await client.request("POST", "/login", {"username": username, "password": password})
+        if status != 200:
+            raise RuntimeError(f"Login as {username} failed: {session}")
+        admin_id = session["admin_id"]
+        tokens[admin_id] = session["token"]
+        _, users = await client.request("GET", f"/admins/{admin_id}/users", token=tokens[admin_id])
+        _, tasks = await client.request("GET", f"/admins/{admin_id}/tasks", token=tokens[admin_id])
+        ids[admin_id] = {"users": [u["user_id"] for u in users], "tasks": [t["task_id"] for t in tasks]}
+    admin_ids = list(ids)
+    weights = [m[0] for m in MIX]
+    latencies = {m[1]: [] for m in MIX}
+    errors = {m[1]: 0 for m in MIX}
+    remaining = total_requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            _, name, method, template, body = rng.choices(MIX, weights)[0]
+            admin_id = rng.choice(admin_ids)
+            path = template.format(admin_id=admin_id, user_id=rng.choice(ids[admin_id]["users"]))
+            start = time.perf_counter()
+            status, _ = await client.request(method, path, body(rng, ids[admin_id]) if body else None, tokens[admin_id])
+            latencies[name].append((time.perf_counter() - start) * 1000)
+            if status >= 400:
+                errors[name] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    every = [ms for samples in latencies.values() for ms in samples]
+    results = {name: {"requests": len(samples), "errors": errors[name],
+                      "p50_ms": round(statistics.median(samples), 3), "p95_ms": round(percentile(samples, 95), 3),
+                      "p99_ms": round(percentile(samples, 99), 3)}
+               for name, samples in latencies.items() if samples}
+    return {"requests": len(every), "concurrency": concurrency, "seconds": round(elapsed, 3),
+            "requests_per_second": round(len(every) / elapsed, 1), "errors": sum(errors.values()),
+            "p50_ms": round(statistics.median(every), 3), "p99_ms": round(percentile(every, 99), 3),
+            "endpoints": results}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Load test the JSON API in-process.")
+    parser.add_argument("--db", help="database to use (default: a fresh synthetic one in a temp dir)")
+    parser.add_argument("--admins", type=int, default=2)
+    parser.add_argument("--kids", type=int, default=4)
+    parser.add_argument("--years", type=float, default=0.5)
+    parser.add_argument("--password", default="password", help="password of every admin in --db")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args(argv[1:])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = args.db or os.path.join(tmp, "load.db")
+        if not args.db:
+            seed_database(db_file, admins=args.admins, kids=args.kids, years=args.years, seed=args.seed, bulk=True)
+        db.DATABASE = db_file  # api routes through shards.database_for, which falls back to db.DATABASE
+        import api
+        with db.pooled_connection(db_file) as conn:
+            admins = [row[0] for row in conn.execute("SELECT username FROM admin ORDER BY id")]
+        results = asyncio.run(run_load(api.app, admins, args.requests, args.concurrency, args.password, args.seed))
+        results["writer"] = writer.get_writer_stats(db_file)
+        writer.close_writers()
+        db.close_pools()
+
+    print(f"{results['requests']} requests, concurrency {results['concurrency']}: "
+          f"{results['requests_per_second']} req/s, p50 {results['p50_ms']} ms, p99 {results['p99_ms']} ms, "
+          f"{results['errors']} errors")
+    for name, r in results["endpoints"].items():
+        print(f"  {name:<14} {r['requests']:>6}  p50 {r['p50_ms']:>8} ms  p95 {r['p95_ms']:>8} ms  p99 {r['p99_ms']:>8} ms"
+              f"  errors {r['errors']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if results["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
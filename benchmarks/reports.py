@@ -0,0 +1,86 @@
+"""Time weekly report generation as the worker count grows.
+
+    python -m benchmarks.reports --admins 32 --workers 1 2 4 8 --output reports.json
+
+Seeds a scratch database, then runs reports.generate_reports over every
+admin once per worker count (best of --repeats) and prints the speedup and
+parallel efficiency against one worker. Worker counts default to powers of
+two up to os.cpu_count(); counts above it only measure oversubscription.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+
+def _default_workers():
+    cpus = os.cpu_count() or 1
+    return sorted({1 << n for n in range(cpus.bit_length()) if 1 << n <= cpus} | {cpus})
+
+
+def run(dataset, workers, repeats=3):
+    from benchmarks.datagen import seed_database
+    from benchmarks.run import git_commit
+    import reports
+
+    workdir = tempfile.mkdtemp(prefix="chore-reports-")
+    try:
+        db_file = os.path.join(workdir, "reports.db")
+        generated = seed_database(db_file, **dataset)
+        admins = reports.admin_ids(db_file)
+        results = {}
+        for count in workers:
+            times = []
+            for _ in range(repeats):
+                summaries, seconds = reports.generate_reports(db_file, admins, out_dir=os.path.join(workdir, "out"),
+                                                              workers=count)
+                failed = [s for s in summaries if "error" in s]
+                if failed:
+                    raise RuntimeError(f"{len(failed)} reports failed: {failed[0]['error']}")
+                times.append(seconds)
+            best = min(times)
+            baseline = results.get(1, {}).get("seconds", best if count == 1 else None)
+            speedup = baseline / best if baseline else None
+            results[count] = {"seconds": round(best, 4), "reports_per_second": round(len(admins) / best, 2),
+                              "speedup": round(speedup, 2) if speedup else None,
+                              "efficiency": round(speedup / count, 2) if speedup else None}
+            print(f"{count:3} workers  {best:8.3f} s  {results[count]['reports_per_second']:8.1f} reports/s"
+                  + (f"  speedup {speedup:5.2f}x  efficiency {speedup / count:4.0%}" if speedup else ""))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "cpus": os.cpu_count(),
+            "dataset": generated,
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark parallel weekly report generation.")
+    parser.add_argument("--admins", type=int, default=32)
+    parser.add_argument("--kids", type=int, default=4)
+    parser.add_argument("--years", type=float, default=1.0)
+    parser.add_argument("--workers", type=int, nargs="+", help="worker counts, default powers of two up to the CPUs")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="write JSON results here")
+    args = parser.parse_args(argv)
+
+    workers = sorted(set(args.workers or _default_workers()) | {1})
+    dataset = {"admins": args.admins, "kids": args.kids, "years": args.years, "bulk": True}
+    results = run(dataset, workers, args.repeats)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""Time db.py and the app's data preparation against a synthetic database.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare baseline.json --output results.json
+
+Results hold per-function timings (median, mean, p95, min in ms) plus the
+dataset parameters and git commit, so runs can be compared across commits.
+With --compare, a hot-path function whose median got slower by more than
+--threshold makes the command exit with status 1.
+"""
+import argparse
+import importlib.util
+import inspect
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import db
+import events
+import tracker
+from benchmarks.datagen import seed_database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOT_PATHS = ["log_activity", "get_user_activities", "get_users"]
+
+# Public db.py names that are plumbing rather than something a page calls.
+NOT_BENCHMARKED = {"create_connection", "get_pool", "pooled_connection", "get_pool_stats", "close_pools",
+                   "cached_read", "get_cache_stats", "explain_query", "check_query_plans"}
+
+
+def load_page(filename):
+    """Import a Streamlit page module without running the page."""
+    path = os.path.join(ROOT, "pages", filename)
+    spec = importlib.util.spec_from_file_location(os.path.splitext(filename)[0].lstrip("0123456789_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_cases(conn, admin_id):
+    """Return {name: (callable taking the iteration number, repeats)}."""
+    user_id = db.get_users(conn, admin_id)[0][0]
+    task_id = db.get_tasks(conn, admin_id)[0][0]
+    today = str(date.today())
+    recent_activity_id = db.get_recent_activities(conn, admin_id, user_id, 1)[0][0]
+    level_index = db.get_level_index(conn, admin_id)
+    dashboard = load_page("01_Dashboard.py")
+    user_frame = dashboard.load_dashboard_data(conn, admin_id, date.today())[0]
+    hashed = db.hash_password("password")
+    user_csv = ("Name,Current Level,Total XP\n" + "".join(f"Imported {n},,{n * 10}\n" for n in range(200))).encode()
+    csv_rows = "user_id,task_id,date,time_spent,bonus_xp\n" + "".join(
+        f"{user_id},{task_id},{today},10,0\n" for _ in range(200))
+
+    def uncached(func):
+        def call(*args):
+            db.read_cache.enabled = False
+            try:
+                return func(*args)
+            finally:
+                db.read_cache.enabled = True
+        return call
+
+    scratch_users = []
+    scratch_tasks = []
+
+    def add_scratch_user(i):
+        db.add_user(conn, admin_id, f"Bench User {i}")
+        scratch_users.append(conn.execute("SELECT MAX(user_id) FROM Users").fetchone()[0])
+
+    def insert_activities(i, count=20, client_ref=None):
+        # A batch inside one transaction, the way the background writer commits them
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for n in range(count):
+                db.insert_activity(conn, admin_id, user_id, task_id, today, 10, client_ref=client_ref)
+
+    def add_scratch_task(i):
+        db.add_task(conn, admin_id, f"Bench Task {i}", 10, 1.0)
+        scratch_tasks.append(conn.execute("SELECT MAX(task_id) FROM Tasks").fetchone()[0])
+
+    return {
+        "hash_password": (lambda i: db.hash_password("password"), 5),
+        "check_password": (lambda i: db.check_password(hashed, "password"), 5),
+        "needs_rehash": (lambda i: db.needs_rehash(hashed), 200),
+        "register_admin": (lambda i: db.register_admin(conn, f"bench_extra_{time.time_ns()}", "password"), 3),
+        "login_admin": (lambda i: db.login_admin(conn, "bench_admin_0", "password"), 5),
+        "create_tables": (lambda i: db.create_tables(conn), 50),
+        "get_users": (lambda i: uncached(db.get_users)(conn, admin_id), 200),
+        "get_users[cached]": (lambda i: db.get_users(conn, admin_id), 200),
+        "get_tasks": (lambda i: uncached(db.get_tasks)(conn, admin_id), 200),
+        "get_tasks[cached]": (lambda i: db.get_tasks(conn, admin_id), 200),
+        "get_levels": (lambda i: uncached(db.get_levels)(conn, admin_id), 200),
+        "get_levels[cached]": (lambda i: db.get_levels(conn, admin_id), 200),
+        "get_small_rewards": (lambda i: uncached(db.get_small_rewards)(conn), 200),
+        "get_small_rewards[admin]": (lambda i: uncached(db.get_small_rewards)(conn, admin_id), 200),
+        "get_random_small_reward": (lambda i: db.get_random_small_reward(conn), 200),
+        "get_random_small_reward[capped]": (lambda i: db.get_random_small_reward(conn, admin_id, user_id, today), 200),
+        "get_reward_sampler": (lambda i: db.get_reward_sampler(conn, admin_id), 200),
+        "add_user": (add_scratch_user, 50),
+        "add_users": (lambda i: db.add_users(conn, admin_id, [(f"Batch {i}-{n}", 0, 0) for n in range(20)]), 20),
+        "update_user": (lambda i: db.update_user(conn, scratch_users[i % len(scratch_users)], f"Renamed {i}"), 50),
+        "delete_user": (lambda i: db.delete_user(conn, scratch_users.pop()), 20),
+        "add_task": (add_scratch_task, 50),
+        "update_task": (lambda i: db.update_task(conn, scratch_tasks[i % len(scratch_tasks)], f"Task {i}", 20, 1.0), 50),
+        "delete_task": (lambda i: db.delete_task(conn, scratch_tasks.pop()), 20),
+        "calculate_xp": (lambda i: db.calculate_xp(conn, task_id, 10), 200),
+        "get_xp_rule": (lambda i: db.get_xp_rule(conn, admin_id), 1000),
+        "recompute_xp[dry_run]": (lambda i: db.recompute_xp(conn, admin_id, 2, dry_run=True), 5),
+        "recompute_xp": (lambda i: db.recompute_xp(conn, admin_id, 2 - i % 2), 5),
+        "log_activity": (lambda i: db.log_activity(conn, admin_id, user_id, task_id, today, 10, 0), 200),
+        "insert_activity": (insert_activities, 20),
+        "insert_activity[replay]": (lambda i: insert_activities(i, client_ref="bench-replay"), 20),
+        "update_total_xp": (lambda i: db.update_total_xp(conn, user_id, 0), 100),
+        "update_level": (lambda i: db.update_level(conn, user_id), 100),
+        "get_user_activities": (lambda i: db.get_user_activities(conn, admin_id, user_id, today), 200),
+        "get_all_user_activities": (lambda i: db.get_all_user_activities(conn, admin_id, user_id), 20),
+        "get_recent_activities": (lambda i: db.get_recent_activities(conn, admin_id, user_id), 200),
+        "correct_activity": (lambda i: db.correct_activity(conn, admin_id, recent_activity_id, time_spent=i % 60, reason="bench"), 50),
+        "void_activity": (lambda i: db.void_activity(conn, admin_id, -i), 20),
+        "events.get_user_state": (lambda i: events.get_user_state(conn, user_id), 200),
+        "events.take_snapshots": (lambda i: events.take_snapshots(conn, admin_id, min_events=1), 20),
+        "events.check_consistency": (lambda i: events.check_consistency(conn, admin_id), 20),
+        "get_activity_page": (lambda i: db.get_activity_page(conn, admin_id, user_id, 25), 200),
+        "read_activity_rows": (lambda i: sum(1 for _ in db.read_activity_rows(io.StringIO(csv_rows))), 50),
+        "bulk_import_activities": (
+            lambda i: db.bulk_import_activities(conn, admin_id, db.read_activity_rows(io.StringIO(csv_rows))), 10),
+        "content_hash": (lambda i: db.content_hash(io.BytesIO(user_csv)), 50),
+        "import_users": (lambda i: db.import_users(conn, admin_id, io.BytesIO(user_csv + f"Import {i},,1\n".encode())), 10),
+        "import_users[repeat]": (lambda i: db.import_users(conn, admin_id, io.BytesIO(user_csv)), 50),
+        "rebuild_rollups": (lambda i: db.rebuild_rollups(conn, admin_id), 5),
+        "add_schedule": (lambda i: db.add_schedule(conn, admin_id, task_id, "weekly", user_id, 1, [i % 7]), 50),
+        "get_schedules": (lambda i: uncached(db.get_schedules)(conn, admin_id), 200),
+        "get_agenda": (lambda i: db.get_agenda(conn, admin_id, today, user_id), 1000),
+        "get_agenda[build]": (lambda i: db._build_agenda(conn, admin_id, date.today()), 200),
+        "schedule_rule": (lambda i: db.schedule_rule((0, task_id, None, "monthly", 1, None, 31, "2024-01-31", None)), 1000),
+        "delete_schedule": (lambda i: db.delete_schedule(conn, -i, admin_id), 20),
+        "week_start": (lambda i: db.week_start(today), 1000),
+        "get_top_scores": (lambda i: db.get_top_scores(conn, "weekly", admin_id), 200),
+        "get_top_scores[shared]": (lambda i: db.get_top_scores(conn, "all_time"), 200),
+        "get_rank_index": (lambda i: db.get_rank_index(conn, "all_time", admin_id), 200),
+        "get_user_rank": (lambda i: db.get_user_rank(conn, admin_id, user_id), 1000),
+        "set_leaderboard_sharing": (lambda i: db.set_leaderboard_sharing(conn, admin_id, True), 50),
+        "get_leaderboard_sharing": (lambda i: db.get_leaderboard_sharing(conn, admin_id), 200),
+        "rebuild_leaderboards": (lambda i: db.rebuild_leaderboards(conn, admin_id), 5),
+        "compact_leaderboards": (lambda i: db.compact_leaderboards(conn), 20),
+        "get_xp_by_day": (lambda i: db.get_xp_by_day(conn, admin_id, start_date=date.today() - timedelta(days=90)), 50),
+        "get_xp_by_day[weekly]": (
+            lambda i: db.get_xp_by_day(conn, admin_id, start_date=date.today() - timedelta(days=365), freq="W"), 20),
+        "get_xp_by_task": (lambda i: db.get_xp_by_task(conn, admin_id, start_date=date.today() - timedelta(days=90)), 50),
+        "initialize_default_levels": (
+            lambda i: db.initialize_default_levels(conn, 10_000 + i), 20),
+        "add_level": (lambda i: db.add_level(conn, admin_id, 100 + i, 1000, 100_000 + i, "Bench reward"), 20),
+        "update_level_details": (lambda i: db.update_level_details(conn, admin_id, 100, 1000, 100_000, "Bench"), 50),
+        "get_level_index": (lambda i: db.get_level_index(conn, admin_id), 200),
+        "get_changes[full]": (lambda i: db.get_changes(conn, admin_id), 20),
+        "get_changes": (lambda i: db.get_changes(conn, admin_id, db.get_change_cursor(conn) - 20), 200),
+        "get_change_cursor": (lambda i: db.get_change_cursor(conn), 1000),
+        "recompute_levels": (lambda i: db.recompute_levels(conn, admin_id), 50),
+        "update_reward": (lambda i: db.update_reward(conn, 100, f"Bench {i}", admin_id), 50),
+        "add_small_reward": (lambda i: db.add_small_reward(conn, f"Sticker {i}", admin_id, tier="rare", daily_cap=3), 20),
+        "delete_small_reward": (lambda i: db.delete_small_reward(conn, -i, admin_id), 20),
+        "tracker.get_level_progress": (
+            lambda i: tracker.get_level_progress(level_index, 750), 1000),
+        "dashboard.compute_level_progress": (
+            lambda i: dashboard.compute_level_progress(user_frame, level_index), 200),
+        "dashboard.load_dashboard_data": (
+            lambda i: dashboard.load_dashboard_data(conn, admin_id, date.today() - timedelta(days=90)), 20),
+    }
+
+
+def time_case(func, repeats):
+    func(-1)  # warm up statement caches and imports
+    samples = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        func(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "calls": repeats,
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "min_ms": round(samples[0], 4),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(dataset, only=None):
+    workdir = tempfile.mkdtemp(prefix="chore-bench-")
+    db_file = os.path.join(workdir, "bench.db")
+    generated = seed_database(db_file, **dataset)
+    try:
+        with db.pooled_connection(db_file) as conn:
+            admin_id, _ = db.login_admin(conn, "bench_admin_0", "password")
+            cases = build_cases(conn, admin_id)
+            results = {}
+            for name, (func, repeats) in cases.items():
+                if only and not any(pattern in name for pattern in only):
+                    continue
+                results[name] = time_case(func, repeats)
+                print(f"{name:35} median {results[name]['median_ms']:9.3f} ms  p95 {results[name]['p95_ms']:9.3f} ms")
+    finally:
+        db.close_pools()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_file + suffix):
+                os.remove(db_file + suffix)
+        os.rmdir(workdir)
+
+    public = {name for name, obj in vars(db).items()
+              if inspect.isfunction(obj) and not name.startswith("_") and obj.__module__ == "db"}
+    covered = {name.split("[")[0] for name in cases}
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "dataset": generated,
+            "not_benchmarked": sorted(public - covered - NOT_BENCHMARKED),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Print median changes against a baseline and return the regressed hot paths."""
+    regressed = []
+    print(f"\nCompared with {baseline['meta'].get('commit')} (threshold {threshold:.0%}):")
+    for name, result in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old or not old["median_ms"]:
+            continue
+        change = result["median_ms"] / old["median_ms"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "REGRESSION" if name in HOT_PATHS else "slower"
+            if name in HOT_PATHS:
+                regressed.append(name)
+        print(f"{name:35} {old['median_ms']:9.3f} -> {result['median_ms']:9.3f} ms ({change:+.0%}) {flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark db.py and page data preparation.")
+    parser.add_argument("--admins", type=int, default=2)
+    parser.add_argument("--kids", type=int, default=4)
+    parser.add_argument("--tasks", type=int, default=10)
+    parser.add_argument("--years", type=float, default=1.0)
+    parser.add_argument("--activities-per-day", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bulk", action="store_true", help="seed activities with bulk_import_activities")
+    parser.add_argument("--only", nargs="*", help="only run benchmarks whose name contains one of these")
+    parser.add_argument("--output", help="write JSON results here")
+    parser.add_argument("--compare", help="baseline JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed median slowdown, default 0.2")
+    args = parser.parse_args(argv)
+
+    dataset = {"admins": args.admins, "kids": args.kids, "tasks": args.tasks, "years": args.years,
+               "activities_per_day": args.activities_per_day, "seed": args.seed, "bulk": args.bulk}
+    results = run(dataset, args.only)
+    if results["meta"]["not_benchmarked"]:
+        print("Not benchmarked:", ", ".join(results["meta"]["not_benchmarked"]))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(json.load(f), results, args.threshold)
+        if regressed:
+            print("Hot path regressions:", ", ".join(regressed))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""Time cold starts and reruns of the Streamlit pages.
+
+    python -m benchmarks.startup --output startup.json
+    python -m benchmarks.startup --compare startup.json --output startup.json
+
+Every page runs in its own fresh interpreter with Streamlit's AppTest,
+against a seeded database. The first run is the cold start, imports
+included. The runs after it are reruns, which is what each widget
+interaction costs. ``import db`` is timed the same way, since the API, the
+writer and the CLIs load it without Streamlit. Each result lists the heavy
+modules (pandas, numpy, plotly, pyarrow, bcrypt) that were imported by the
+end, so a new top-level import shows up even before it shows in the times.
+With --compare, a median that got slower by more than --threshold makes the
+command exit with status 1.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ["Home.py", os.path.join("pages", "01_Dashboard.py"), os.path.join("pages", "02_Admin.py")]
+HEAVY_MODULES = ["pandas", "numpy", "plotly", "pyarrow", "bcrypt"]
+
+
+def _loaded_heavy_modules(before=()):
+    return [name for name in HEAVY_MODULES if name in sys.modules and name not in before]
+
+
+def measure_import(module):
+    """Child side: import one module and report the time."""
+    start = time.perf_counter()
+    __import__(module)
+    return {"import_ms": (time.perf_counter() - start) * 1000, "heavy_modules": _loaded_heavy_modules()}
+
+
+def measure_page(script, reruns):
+    """Child side: run one page cold, then rerun it."""
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    streamlit_ms = (time.perf_counter() - start) * 1000
+    preloaded = _loaded_heavy_modules()  # pulled in by streamlit itself, not the app
+    at = AppTest.from_file(os.path.join(ROOT, script), default_timeout=120)
+    start = time.perf_counter()
+    at.run()
+    cold_ms = (time.perf_counter() - start) * 1000
+    rerun_ms = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        at.run()
+        rerun_ms.append((time.perf_counter() - start) * 1000)
+    return {
+        "streamlit_ms": streamlit_ms,
+        "cold_ms": cold_ms,
+        "rerun_ms": statistics.median(rerun_ms) if rerun_ms else None,
+        "exceptions": [e.value for e in at.exception],
+        "heavy_modules": _loaded_heavy_modules(preloaded),
+    }
+
+
+def _child(args, workdir):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    result = subprocess.run([sys.executable, "-m", "benchmarks.startup", "--child", *args], cwd=workdir, env=env,
+                            capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _summarize(samples, fields):
+    summary = {}
+    for field in fields:
+        values = [sample[field] for sample in samples if sample[field] is not None]
+        if values:
+            summary[f"{field}_median"] = round(statistics.median(values), 3)
+            summary[f"{field}_min"] = round(min(values), 3)
+    summary["heavy_modules"] = samples[-1]["heavy_modules"]
+    summary["exceptions"] = samples[-1].get("exceptions", [])
+    return summary
+
+
+def run(dataset, repeats=3, reruns=5):
+    # imported here so the --child processes start without db or streamlit loaded
+    from benchmarks.datagen import seed_database
+    from benchmarks.run import git_commit
+
+    workdir = tempfile.mkdtemp(prefix="chore-startup-")
+    try:
+        generated = seed_database(os.path.join(workdir, "chores.db"), **dataset)
+        results = {}
+        samples = [_child(["import", "db"], workdir) for _ in range(repeats)]
+        results["import db"] = _summarize(samples, ["import_ms"])
+        print(f"{'import db':30} {results['import db']['import_ms_median']:9.1f} ms  "
+              f"loads {', '.join(results['import db']['heavy_modules']) or 'nothing heavy'}")
+        for script in PAGES:
+            samples = [_child(["page", script, "--reruns", str(reruns)], workdir) for _ in range(repeats)]
+            results[script] = _summarize(samples, ["streamlit_ms", "cold_ms", "rerun_ms"])
+            result = results[script]
+            print(f"{script:30} cold {result['cold_ms_median']:9.1f} ms  rerun {result.get('rerun_ms_median', 0):8.1f} ms  "
+                  f"loads {', '.join(result['heavy_modules']) or 'nothing heavy'}")
+            if result["exceptions"]:
+                print(f"{'':30} exceptions: {result['exceptions']}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": ".".join(map(str, sys.version_info[:3])),
+            "dataset": generated,
+            "repeats": repeats,
+            "reruns": reruns,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Print median changes against a baseline and return the names that got slower."""
+    regressed = []
+    print(f"\nCompared with {baseline['meta'].get('commit')} (threshold {threshold:.0%}):")
+    for name, result in current["results"].items():
+        for field in ("import_ms_median", "cold_ms_median", "rerun_ms_median"):
+            old = baseline["results"].get(name, {}).get(field)
+            if not old or field not in result:
+                continue
+            change = result[field] / old - 1
+            flag = "REGRESSION" if change > threshold else ""
+            if flag:
+                regressed.append(f"{name} {field}")
+            print(f"{name:30} {field:17} {old:9.1f} -> {result[field]:9.1f} ms ({change:+.0%}) {flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark page cold starts and reruns.")
+    parser.add_argument("--admins", type=int, default=2)
+    parser.add_argument("--kids", type=int, default=4)
+    parser.add_argument("--years", type=float, default=1.0)
+    parser.add_argument("--repeats", type=int, default=3, help="fresh interpreters per page")
+    parser.add_argument("--reruns", type=int, default=5, help="reruns timed after each cold start")
+    parser.add_argument("--output", help="write JSON results here")
+    parser.add_argument("--compare", help="baseline JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed median slowdown, default 0.2")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        kind, target = args.child[0], args.child[1]
+        result = measure_import(target) if kind == "import" else measure_page(target, args.reruns)
+        print(json.dumps(result))
+        return 0
+
+    dataset = {"admins": args.admins, "kids": args.kids, "years": args.years, "bulk": True}
+    results = run(dataset, args.repeats, args.reruns)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(json.load(f), results, args.threshold)
+        if regressed:
+            print("Startup regressions:", ", ".join(regressed))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
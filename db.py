@@ -1,6 +1,47 @@
 import sqlite3
-import pandas as pd
-import bcrypt
+import csv
+import functools
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import date as _date, timedelta
+from contextlib import contextmanager
+from archive import read_archived_activities
+from instrumentation import instrument
+from levels import LevelIndex
+from ranking import RankIndex
+from records import Records
+from rewards import REWARD_TIERS, RewardSampler
+from schedules import Recurrence, weekday_mask
+from sync import SYNC_ENTITIES
+from xp_rules import DEFAULT_RULE, get_rule
+from migrations import migrate
+
+DATABASE = "chores.db"
+# Most pools kept open at once; the least recently used one is closed beyond
+# this, which bounds open file handles when every admin has a shard file.
+MAX_OPEN_POOLS = 64
+
+# Applied to every pooled connection. WAL lets readers run alongside the single
+# writer, and busy_timeout makes writers wait for the lock instead of failing
+# straight away with "database is locked".
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 134217728",
+)
+
+# bcrypt work factor for new hashes; stored hashes with a different cost are
+# rehashed on the next successful login.
+BCRYPT_ROUNDS = int(os.environ.get("CHORES_BCRYPT_ROUNDS", 12))
+
 DEFAULT_LEVELS = [
     (1, 100, 100, "Reward: Gift card $5"),
     (2, 200, 300, "Reward: Extra 30 minutes screen time"),
@@ -19,71 +60,319 @@ DEFAULT_LEVELS = [
 def create_connection(db_file):
     conn = None
     try:
-        conn = sqlite3.connect(db_file)
+        conn = instrument(sqlite3.connect(db_file))
     except sqlite3.Error as e:
         print(f"Error connecting to database: {e}")
     return conn
 
-def hash_password(password):
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+# Connection Pool
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that remembers which database file it belongs to."""
+    db_file = None
+
+
+class PoolClosedError(sqlite3.ProgrammingError):
+    pass
+
+
+class ConnectionPool:
+    """Thread-safe pool of SQLite connections for one database file.
+
+    The schema is set up once when the pool is created (setup defaults to
+    create_tables), so callers no longer need to run it on every Streamlit
+    rerun. Connections are opened lazily, up to max_size.
+    """
+
+    def __init__(self, db_file, max_size=8, timeout=10.0, setup=None):
+        if db_file == ":memory:":
+            max_size = 1  # every in-memory connection would be a separate database
+        self.db_file = db_file
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._active = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._closed = False
+
+        conn = self._connect()
+        (setup or create_tables)(conn)
+        self._created = 1
+        self._idle.put(conn)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file, timeout=self.timeout, check_same_thread=False, factory=PooledConnection)
+        conn.db_file = self.db_file
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def dedicated(self):
+        """A connection set up like the pooled ones but not counted against max_size; the caller closes it."""
+        return self._connect()
+
+    def acquire(self):
+        if self._closed:
+            raise PoolClosedError("Connection pool is closed")
+        start = time.perf_counter()
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.max_size
+                if can_create:
+                    self._created += 1  # reserve the slot before connecting
+            if can_create:
+                try:
+                    conn = self._connect()
+                except sqlite3.Error:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise sqlite3.OperationalError(
+                        f"Timed out after {self.timeout}s waiting for a connection to {self.db_file}"
+                    )
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._checkouts += 1
+            self._active += 1
+            self._wait_time += waited
+            self._max_wait = max(self._max_wait, waited)
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()  # never hand out a connection with a half-finished transaction
+        with self._lock:
+            self._active -= 1
+        if self._closed:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "db_file": self.db_file,
+                "max_size": self.max_size,
+                "created": self._created,
+                "active": self._active,
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "total_wait_ms": round(self._wait_time * 1000, 3),
+                "avg_wait_ms": round(self._wait_time * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 3),
+            }
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = OrderedDict()
+_pool_options = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_file=DATABASE, **kwargs):
+    """Return the process-wide pool for db_file, creating it on first use.
+
+    Pools live at module level, so they survive Streamlit reruns and are
+    shared by every session served by this process. kwargs are passed to
+    ConnectionPool and remembered, so a pool closed by LRU eviction comes
+    back with the same options.
+    """
+    with _pools_lock:
+        if kwargs:
+            _pool_options[db_file] = kwargs
+        pool = _pools.get(db_file)
+        if pool is None:
+            pool = _pools[db_file] = ConnectionPool(db_file, **_pool_options.get(db_file, {}))
+            while len(_pools) > MAX_OPEN_POOLS:
+                _, evicted = _pools.popitem(last=False)
+                evicted.close()  # connections still checked out close when released
+        else:
+            _pools.move_to_end(db_file)
+    return pool
+
+@contextmanager
+def pooled_connection(db_file=DATABASE):
+    pool = get_pool(db_file)
+    try:
+        conn = pool.acquire()
+    except PoolClosedError:
+        pool = get_pool(db_file)  # evicted between lookup and checkout
+        conn = pool.acquire()
+    try:
+        yield instrument(conn)
+    finally:
+        pool.release(conn)
+
+def get_pool_stats(db_file=DATABASE):
+    pool = _pools.get(db_file)
+    return pool.stats() if pool else None
+
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+# Read Cache
+class ReadCache:
+    """Process-wide cache for small per-admin reads (users, tasks, levels...).
+
+    Entries are keyed by (db_file, entity, admin_id), bounded by max_entries
+    (least recently used evicted first) and expire after ttl seconds, which
+    bounds staleness for writes made by other processes. Writes in this
+    process call invalidate() for exactly the entities they touch. A
+    generation counter per (entity, admin_id) stops a read that raced with a
+    write from storing the stale result.
+    """
+
+    def __init__(self, max_entries=512, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = True
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get_or_load(self, key, loader):
+        _, entity, admin_id = key
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[1])
+            self.misses += 1
+            generation = self._generations.get((entity, admin_id), 0)
+        value = loader()
+        with self._lock:
+            if self._generations.get((entity, admin_id), 0) == generation:
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return list(value)
+
+    def invalidate(self, entity, admin_id=None):
+        """Drop cached reads of entity for admin_id, or for every admin if None."""
+        with self._lock:
+            self.invalidations += 1
+            if admin_id is None:
+                targets = {(e, a) for e, a in self._generations if e == entity}
+                targets.update((k[1], k[2]) for k in self._entries if k[1] == entity)
+                targets.add((entity, None))
+            else:
+                targets = {(entity, admin_id)}
+            for target in targets:
+                self._generations[target] = self._generations.get(target, 0) + 1
+            for key in [k for k in self._entries if (k[1], k[2]) in targets]:
+                del self._entries[key]
+
+    def generation(self, entity, admin_id=None):
+        """Counter bumped by every invalidate() that covers (entity, admin_id)."""
+        with self._lock:
+            return self._generations.get((entity, admin_id), 0)
+
+    def clear(self):
+        with self._lock:
+            for target in self._generations:
+                self._generations[target] += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+read_cache = ReadCache()
+
+def cached_read(entity):
+    """Cache a getter's rows under (db_file, entity, admin_id).
+
+    Only pooled connections are cached, since they carry the db_file the
+    entry belongs to; other connections always read through. The wrapped
+    getter's second argument, if any, is taken as the admin_id.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(conn, *args):
+            db_file = getattr(conn, "db_file", None)
+            if db_file is None or not read_cache.enabled:
+                return func(conn, *args)
+            admin_id = args[0] if args else None
+            return read_cache.get_or_load((db_file, entity, admin_id), lambda: func(conn, *args))
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+def get_cache_stats():
+    return read_cache.stats()
+
+def hash_password(password, rounds=None):
+    import bcrypt
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds or BCRYPT_ROUNDS))
 
 def check_password(hashed_password, user_password):
+    if not hashed_password:
+        return False  # a shard's admin row; its hash lives in the catalog
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode('utf-8')
+    import bcrypt
     return bcrypt.checkpw(user_password.encode('utf-8'), hashed_password)
 
+def needs_rehash(hashed_password, rounds=None):
+    """True when a stored hash was made with a different bcrypt cost."""
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode('utf-8')
+    try:
+        return int(hashed_password.split(b"$")[2]) != (rounds or BCRYPT_ROUNDS)
+    except (IndexError, ValueError):
+        return True
+
 # Admin Related Functions
 def create_tables(conn):
-    with conn:
-        conn.executescript("""
-            CREATE TABLE IF NOT EXISTS admin (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL
-            );
-            CREATE TABLE IF NOT EXISTS Users (
-                user_id INTEGER PRIMARY KEY,
-                admin_id INTEGER,
-                name TEXT NOT NULL,
-                current_level INTEGER DEFAULT 0,
-                total_xp INTEGER DEFAULT 0,
-                FOREIGN KEY (admin_id) REFERENCES admin(id)
-            );
-            CREATE TABLE IF NOT EXISTS Tasks (
-                task_id INTEGER PRIMARY KEY,
-                admin_id INTEGER,
-                task_name TEXT NOT NULL,
-                base_xp INTEGER NOT NULL,
-                time_multiplier REAL NOT NULL,
-                FOREIGN KEY (admin_id) REFERENCES admin(id)
-            );
-            CREATE TABLE IF NOT EXISTS ActivityLog (
-                activity_id INTEGER PRIMARY KEY,
-                admin_id INTEGER,
-                user_id INTEGER,
-                task_id INTEGER,
-                date TEXT NOT NULL,
-                time_spent INTEGER,
-                xp_earned INTEGER,
-                bonus_xp INTEGER DEFAULT 0,
-                small_reward TEXT,
-                FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE,
-                FOREIGN KEY (task_id) REFERENCES Tasks(task_id),
-                FOREIGN KEY (admin_id) REFERENCES admin(id) ON DELETE CASCADE
-            
-            );
-            CREATE TABLE IF NOT EXISTS "Levels" (
-                Level INTEGER,
-                admin_id INTEGER,
-                XPRequired INTEGER,
-                CumulativeXP INTEGER,
-                Reward TEXT,
-                PRIMARY KEY (Level, admin_id),
-                FOREIGN KEY (admin_id) REFERENCES admin(id)
-            );
-            CREATE TABLE IF NOT EXISTS SmallRewards (
-                reward_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                reward TEXT NOT NULL
-);               
-        """)
+    """Create the schema or upgrade it in place to the latest version."""
+    migrate(conn)
 
 def register_admin(conn, username, password):
     try:
@@ -92,6 +381,7 @@ def register_admin(conn, username, password):
             cursor.execute("INSERT INTO admin (username, password_hash) VALUES (?, ?)", (username, hash_password(password)))
             admin_id = cursor.lastrowid
             initialize_default_levels(conn, admin_id)
+        read_cache.invalidate("levels", admin_id)
         return True
     except sqlite3.IntegrityError as ie:
         print(f"IntegrityError: {ie}")
@@ -105,6 +395,9 @@ def login_admin(conn, username, password):
     c.execute("SELECT id, password_hash FROM admin WHERE username = ?", (username,))
     admin = c.fetchone()
     if admin and check_password(admin[1], password):
+        if needs_rehash(admin[1]):
+            with conn:
+                conn.execute("UPDATE admin SET password_hash = ? WHERE id = ?", (hash_password(password), admin[0]))
         return admin[0], True  # Assuming admin_id is obtained during authentication
     else:
         return None, False
@@ -116,73 +409,979 @@ def add_user(conn, admin_id, name, current_level=0, total_xp=0):
             "INSERT INTO Users (admin_id, name, current_level, total_xp) VALUES (?, ?, ?, ?)",
             (admin_id, name, current_level, total_xp)
         )
+    read_cache.invalidate("users", admin_id)
+
+def add_users(conn, admin_id, users):
+    """Insert many (name, current_level, total_xp) rows in one transaction."""
+    with conn:
+        conn.executemany(
+            "INSERT INTO Users (admin_id, name, current_level, total_xp) VALUES (?, ?, ?, ?)",
+            ((admin_id, name, current_level, total_xp) for name, current_level, total_xp in users)
+        )
+    read_cache.invalidate("users", admin_id)
+
+GET_USERS_SQL = "SELECT user_id, name, current_level, total_xp FROM Users WHERE admin_id = ? ORDER BY user_id"
+
+@cached_read("users")
 def get_users(conn, admin_id):
     c = conn.cursor()
-    c.execute("SELECT user_id, name, current_level, total_xp FROM Users WHERE admin_id = ?", (admin_id,))
+    c.execute(GET_USERS_SQL, (admin_id,))
     return c.fetchall()
 
 def update_user(conn, user_id, name):
     with conn:
-        conn.execute("UPDATE Users SET name = ? WHERE user_id = ?", (name, user_id))
+        rows = conn.execute("UPDATE Users SET name = ? WHERE user_id = ? RETURNING admin_id", (name, user_id)).fetchall()
+    for (admin_id,) in rows:
+        read_cache.invalidate("users", admin_id)
 
 def delete_user(conn, user_id):
     with conn:
-        conn.execute("DELETE FROM Users WHERE user_id = ?", (user_id,))
+        rows = conn.execute("DELETE FROM Users WHERE user_id = ? RETURNING admin_id", (user_id,)).fetchall()
+    for (admin_id,) in rows:
+        read_cache.invalidate("users", admin_id)
+        read_cache.invalidate("schedules", admin_id)
 
 # Task Management Functions
 def add_task(conn, admin_id, task_name, base_xp, time_multiplier):
     with conn:
         conn.execute("INSERT INTO Tasks (admin_id, task_name, base_xp, time_multiplier) VALUES (?, ?, ?, ?)", (admin_id, task_name, base_xp, time_multiplier))
+    read_cache.invalidate("tasks", admin_id)
+
+GET_TASKS_SQL = "SELECT task_id, task_name, base_xp, time_multiplier FROM Tasks WHERE admin_id = ? ORDER BY task_id"
 
+@cached_read("tasks")
 def get_tasks(conn, admin_id):
     c = conn.cursor()
-    c.execute("SELECT task_id, task_name, base_xp, time_multiplier FROM Tasks WHERE admin_id = ?", (admin_id,))
+    c.execute(GET_TASKS_SQL, (admin_id,))
     return c.fetchall()
 
 def update_task(conn, task_id, task_name, base_xp, time_multiplier):
     with conn:
-        conn.execute("UPDATE Tasks SET task_name = ?, base_xp = ?, time_multiplier = ? WHERE task_id = ?", (task_name, base_xp, time_multiplier, task_id))
+        rows = conn.execute("UPDATE Tasks SET task_name = ?, base_xp = ?, time_multiplier = ? WHERE task_id = ? RETURNING admin_id",
+                            (task_name, base_xp, time_multiplier, task_id)).fetchall()
+    for (admin_id,) in rows:
+        read_cache.invalidate("tasks", admin_id)
 
 def delete_task(conn, task_id):
     with conn:
-        conn.execute("DELETE FROM Tasks WHERE task_id = ?", (task_id,))
+        rows = conn.execute("DELETE FROM Tasks WHERE task_id = ? RETURNING admin_id", (task_id,)).fetchall()
+    for (admin_id,) in rows:
+        read_cache.invalidate("tasks", admin_id)
+        read_cache.invalidate("schedules", admin_id)
 
 # Activity Log Functions
-def log_activity(conn, admin_id, user_id, task_id, date, time_spent, bonus_xp=0, small_reward=None):
-    xp_earned = calculate_xp(conn, task_id, time_spent)
+# XP comes from the admin's rule ({xp}, see xp_rules.py), scored by the INSERT itself.
+LOG_ACTIVITY_SQL = """
+    INSERT INTO ActivityLog (admin_id, user_id, task_id, date, time_spent, xp_earned, bonus_xp, small_reward, xp_rule,
+                             client_ref)
+    SELECT ?1, ?2, task_id, ?3, ?4, {xp}, ?5, ?6, ?7, ?9 FROM Tasks WHERE task_id = ?8
+    RETURNING xp_earned
+    """
+
+# A log already made under this client_ref (an offline client replaying its outbox).
+LOGGED_CLIENT_REF_SQL = """
+    SELECT a.xp_earned, u.total_xp, u.current_level
+    FROM ActivityLog a JOIN Users u ON u.user_id = a.user_id
+    WHERE a.admin_id = ? AND a.client_ref = ?
+    """
+
+@functools.lru_cache(maxsize=None)
+def _rule_sql(template, version, **columns):
+    """template with {xp} replaced by XP rule `version`'s expression over columns."""
+    return template.format(xp=get_rule(version).expression(**columns))
+
+ADD_XP_SQL = "UPDATE Users SET total_xp = total_xp + ? WHERE user_id = ? RETURNING admin_id, total_xp, current_level"
+
+def _credit_xp(conn, user_id, xp, level_index=None):
+    """Add xp to a user and move them to the level their new total reaches.
+
+    Runs inside the caller's transaction. The level only costs a second
+    UPDATE when it actually changes. Returns (admin_id, total_xp,
+    current_level), or None if the user does not exist.
+    """
+    updated = conn.execute(ADD_XP_SQL, (xp, user_id)).fetchall()
+    if not updated:
+        return None
+    admin_id, total_xp, current_level = updated[0]
+    if level_index is None:
+        level_index = get_level_index(conn, admin_id)
+    new_level = level_index.level_for(total_xp)
+    if new_level != current_level:
+        conn.execute("UPDATE Users SET current_level = ? WHERE user_id = ?", (new_level, user_id))
+    return admin_id, total_xp, new_level
+
+def insert_activity(conn, admin_id, user_id, task_id, date, time_spent, bonus_xp=0, small_reward=None, level_index=None,
+                    client_ref=None):
+    """Insert an activity and credit the user inside the caller's transaction.
+
+    Used by log_activity and by the background writer, which commits many of
+    these together. Callers must invalidate the admin's cached users after
+    committing. Returns (xp_earned, total_xp, current_level). An activity
+    with a client_ref is logged once: a repeat returns the first log's XP
+    and the user's current totals without logging again.
+    """
+    if client_ref is not None:
+        logged = conn.execute(LOGGED_CLIENT_REF_SQL, (admin_id, client_ref)).fetchone()
+        if logged:
+            return logged
     bonus_xp = int(bonus_xp)
+    if level_index is None:
+        level_index = get_level_index(conn, admin_id)
+    rule = get_xp_rule(conn, admin_id)
+    inserted = conn.execute(_rule_sql(LOG_ACTIVITY_SQL, rule, time_spent="?4"),
+                            (admin_id, user_id, date, time_spent, bonus_xp, small_reward, rule, task_id, client_ref)).fetchall()
+    if not inserted:
+        raise ValueError(f"Task {task_id} does not exist")
+    xp_earned = inserted[0][0]
+    credited = _credit_xp(conn, user_id, xp_earned + bonus_xp, level_index)
+    _, total_xp, current_level = credited or (None, None, None)
+    return xp_earned, total_xp, current_level
+
+def log_activity(conn, admin_id, user_id, task_id, date, time_spent, bonus_xp=0, small_reward=None, client_ref=None):
+    """Log an activity and credit the user in one transaction.
+
+    XP is read from Tasks inside the INSERT and the user's total is updated by
+    a single UPDATE, with the level taken from the admin's cached LevelIndex,
+    so a log costs two statements (three on a level change) and one commit.
+    Returns (xp_earned, total_xp, current_level).
+    """
+    level_index = get_level_index(conn, admin_id)
     with conn:
-        conn.execute("INSERT INTO ActivityLog (admin_id, user_id, task_id, date, time_spent, xp_earned, bonus_xp, small_reward) VALUES (?, ?, ?, ?, ?, ?, ?,?)",
-                     (admin_id, user_id, task_id, date, time_spent, xp_earned, bonus_xp, small_reward))
-        update_total_xp(conn, user_id, xp_earned + bonus_xp)  # Update the user's total XP along with logging the activity
-        
-            
+        result = insert_activity(conn, admin_id, user_id, task_id, date, time_spent, bonus_xp, small_reward, level_index,
+                                 client_ref)
+    read_cache.invalidate("users", admin_id)
+    return result
+
+USER_ACTIVITIES_SQL = """
+    SELECT a.date, COALESCE(t.task_name, 'Deleted task'), a.time_spent, a.xp_earned, a.small_reward
+    FROM ActivityLog a
+    LEFT JOIN Tasks t ON a.task_id = t.task_id
+    WHERE a.admin_id = ? AND a.user_id = ? AND a.date = ?
+    """
+
 def get_user_activities(conn, admin_id, user_id, date):
     c = conn.cursor()
-    query = """
-    SELECT a.date, t.task_name, a.time_spent, a.xp_earned, a.small_reward
+    c.execute(USER_ACTIVITIES_SQL, (admin_id, user_id, date))
+    return Records(c.fetchall(), ['Date', 'Task Name', 'Time Spent', 'XP Earned', 'Small Reward'], start=1)
+
+ALL_USER_ACTIVITIES_SQL = """
+    SELECT a.activity_id, a.date, COALESCE(t.task_name, 'Deleted task'), a.time_spent, a.xp_earned
     FROM ActivityLog a
-    JOIN Tasks t ON a.task_id = t.task_id
-    WHERE a.admin_id = ? AND a.user_id = ? AND a.date = ?
+    LEFT JOIN Tasks t ON a.task_id = t.task_id
+    WHERE a.admin_id = ? AND a.user_id = ?
+    ORDER BY a.date DESC, a.activity_id DESC
     """
-    c.execute(query, (admin_id, user_id, date))
-    df = pd.DataFrame(c.fetchall(), columns=['Date', 'Task Name', 'Time Spent', 'XP Earned', 'Small Reward'])
-    df.index += 1
-    return df
 
 def get_all_user_activities(conn, admin_id, user_id):
     c = conn.cursor()
-    query = """
-    SELECT a.date, t.task_name, a.time_spent, a.xp_earned
+    c.execute(ALL_USER_ACTIVITIES_SQL, (admin_id, user_id))
+    rows = c.fetchall()
+    archived = read_archived_activities(conn, admin_id, user_id)
+    if archived:
+        rows = sorted(rows + archived, key=lambda row: (row[1], row[0]), reverse=True)
+    return Records([row[1:] for row in rows], ['Date', 'Task Name', 'Time Spent', 'XP Earned'], start=1)
+# Newest-first history pages. Seeking past the (date, activity_id) of the last
+# row shown uses idx_activitylog_admin_user_date (activity_id is the rowid, so
+# it is already the last index column), so every page costs the same no
+# matter how far back it is.
+ACTIVITY_PAGE_SQL = """
+    SELECT a.activity_id, a.date, COALESCE(t.task_name, 'Deleted task'), a.time_spent, a.xp_earned
     FROM ActivityLog a
-    JOIN Tasks t ON a.task_id = t.task_id
+    LEFT JOIN Tasks t ON a.task_id = t.task_id
+    WHERE a.admin_id = ? AND a.user_id = ? AND (a.date, a.activity_id) < (?, ?)
+    ORDER BY a.date DESC, a.activity_id DESC
+    LIMIT ?
+    """
+
+def get_activity_page(conn, admin_id, user_id, page_size=25, before=None):
+    """Return one page of a user's history, newest first, and the next cursor.
+
+    before is the cursor returned for the previous page, or None for the
+    first page. The next cursor is None when there are no older activities.
+    Archived partitions that overlap the page are merged in.
+    """
+    if before is None:
+        before = ("9999-12-31", 2**63 - 1)  # sorts after every stored row
+    c = conn.cursor()
+    c.execute(ACTIVITY_PAGE_SQL, (admin_id, user_id, before[0], before[1], page_size + 1))
+    rows = c.fetchall()
+    since = rows[-1][1] if len(rows) > page_size else None
+    archived = read_archived_activities(conn, admin_id, user_id, before, since, page_size + 1)
+    if archived:
+        rows = sorted(rows + archived, key=lambda row: (row[1], row[0]), reverse=True)[:page_size + 1]
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = (rows[-1][1], rows[-1][0])
+    return Records([row[1:] for row in rows], ['Date', 'Task Name', 'Time Spent', 'XP Earned'], start=1), next_cursor
+
+# Corrections
+# ActivityLog rows are never edited or removed in place without a trace: the
+# triggers from migration 10 append a 'correction' or 'void' event (with the
+# old values) to ActivityEvents, and EventContext carries the reason into it.
+RECENT_ACTIVITIES_SQL = """
+    SELECT a.activity_id, a.date, COALESCE(t.task_name, 'Deleted task'), a.time_spent, a.xp_earned, a.bonus_xp
+    FROM ActivityLog a
+    LEFT JOIN Tasks t ON a.task_id = t.task_id
     WHERE a.admin_id = ? AND a.user_id = ?
-    ORDER BY a.date DESC
+    ORDER BY a.date DESC, a.activity_id DESC
+    LIMIT ?
+    """
+
+def get_recent_activities(conn, admin_id, user_id, limit=20):
+    """(activity_id, date, task_name, time_spent, xp_earned, bonus_xp) rows that can still be corrected, newest first."""
+    return conn.execute(RECENT_ACTIVITIES_SQL, (admin_id, user_id, limit)).fetchall()
+
+CORRECT_ACTIVITY_SQL = """
+    UPDATE ActivityLog SET task_id = ?1, date = ?2, time_spent = ?3, bonus_xp = ?4, xp_rule = ?5,
+        xp_earned = (SELECT {xp} FROM Tasks WHERE task_id = ?1)
+    WHERE activity_id = ?6 AND admin_id = ?7
+    """
+
+def correct_activity(conn, admin_id, activity_id, task_id=None, date=None, time_spent=None, bonus_xp=None, reason=None):
+    """Change a logged activity and re-credit its user in one transaction.
+
+    Fields left as None keep their value. XP is rescored with the admin's
+    current rule. Returns the user's (admin_id, total_xp, current_level),
+    or None if the activity does not exist (or has been archived).
+    """
+    rule = get_xp_rule(conn, admin_id)
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT user_id, task_id, date, time_spent, bonus_xp, COALESCE(xp_earned, 0) + COALESCE(bonus_xp, 0) "
+                           "FROM ActivityLog WHERE activity_id = ? AND admin_id = ?", (activity_id, admin_id)).fetchone()
+        if row is None:
+            return None
+        user_id, old_xp = row[0], row[5]
+        task_id = row[1] if task_id is None else task_id
+        date = row[2] if date is None else str(date)[:10]
+        time_spent = row[3] if time_spent is None else time_spent
+        bonus_xp = row[4] if bonus_xp is None else int(bonus_xp)
+        conn.execute("INSERT INTO EventContext (reason) VALUES (?)", (reason,))
+        conn.execute(_rule_sql(CORRECT_ACTIVITY_SQL, rule, time_spent="?3"),
+                     (task_id, date, time_spent, bonus_xp, rule, activity_id, admin_id))
+        conn.execute("DELETE FROM EventContext")
+        new_xp = conn.execute("SELECT COALESCE(xp_earned, 0) + COALESCE(bonus_xp, 0) FROM ActivityLog WHERE activity_id = ?",
+                              (activity_id,)).fetchone()[0]
+        credited = _credit_xp(conn, user_id, new_xp - old_xp)
+    read_cache.invalidate("users", admin_id)
+    return credited
+
+def void_activity(conn, admin_id, activity_id, reason=None):
+    """Remove a logged activity and take its XP back from the user.
+
+    The activity's values are kept in its 'void' event. Returns the user's
+    (admin_id, total_xp, current_level), or None if there was no such activity.
+    """
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("INSERT INTO EventContext (reason) VALUES (?)", (reason,))
+        deleted = conn.execute("DELETE FROM ActivityLog WHERE activity_id = ? AND admin_id = ? "
+                               "RETURNING user_id, COALESCE(xp_earned, 0) + COALESCE(bonus_xp, 0)",
+                               (activity_id, admin_id)).fetchall()
+        conn.execute("DELETE FROM EventContext")
+        credited = _credit_xp(conn, deleted[0][0], -deleted[0][1]) if deleted else None
+    read_cache.invalidate("users", admin_id)
+    return credited
+
+# Bulk Import Functions
+# Users and tasks must both belong to the importing admin; rows that reference
+# anything else match nothing in the join and are skipped.
+IMPORT_ACTIVITY_SQL = """
+    INSERT INTO ActivityLog (admin_id, user_id, task_id, date, time_spent, xp_earned, bonus_xp, small_reward, xp_rule)
+    SELECT t.admin_id, u.user_id, t.task_id, ?1, ?2, {xp}, ?3, ?4, ?8
+    FROM Tasks t
+    JOIN Users u ON u.admin_id = t.admin_id
+    WHERE t.task_id = ?5 AND u.user_id = ?6 AND t.admin_id = ?7
+    RETURNING user_id, xp_earned + bonus_xp
+    """
+
+def read_activity_rows(fileobj, fmt="csv"):
+    """Yield activity rows as dicts from a CSV or JSON Lines text stream.
+
+    Rows are read one at a time, so large files are never held in memory.
+    Expected fields are date, time_spent, bonus_xp and small_reward plus
+    either user_id or name and either task_id or task_name.
+    """
+    if fmt == "jsonl":
+        for line in fileobj:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        yield from csv.DictReader(fileobj)
+
+def _int_or_default(value, default=0):
+    if value is None or value == "":
+        return default
+    return int(float(value))
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def bulk_import_activities(conn, admin_id, rows, chunk_size=5000):
+    """Insert activity rows in chunked transactions and credit XP once.
+
+    Each chunk is inserted inside its own transaction, with XP taken from
+    Tasks by the INSERT itself. Per-user XP is summed from the rows each
+    INSERT returns and every affected user's total_xp and current_level is updated in
+    one final transaction. Returns a summary dict including rows_per_second.
+    """
+    start = time.perf_counter()
+    user_ids = {name: user_id for user_id, name, *_ in get_users(conn, admin_id)}
+    task_ids = {name: task_id for task_id, name, *_ in get_tasks(conn, admin_id)}
+    xp_by_user = {}
+    rows_read = rows_inserted = 0
+    rule = get_xp_rule(conn, admin_id)
+    import_sql = _rule_sql(IMPORT_ACTIVITY_SQL, rule, base_xp="t.base_xp", time_multiplier="t.time_multiplier", time_spent="?2")
+
+    for chunk in _chunks(rows, chunk_size):
+        rows_read += len(chunk)
+        params = []
+        for row in chunk:
+            try:
+                user_id = _int_or_default(row.get("user_id"), None)
+                if user_id is None:
+                    user_id = user_ids.get(row.get("name"))
+                task_id = _int_or_default(row.get("task_id"), None)
+                if task_id is None:
+                    task_id = task_ids.get(row.get("task_name"))
+                date = str(row["date"])[:10]
+                params.append((
+                    date,
+                    _int_or_default(row.get("time_spent")),
+                    _int_or_default(row.get("bonus_xp")),
+                    row.get("small_reward") or None,
+                    task_id,
+                    user_id,
+                    admin_id,
+                    rule,
+                ))
+            except (KeyError, TypeError, ValueError):
+                continue  # counted as skipped below
+        if not params:
+            continue
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for p in params:
+                for user_id, xp in conn.execute(import_sql, p):
+                    rows_inserted += 1
+                    xp_by_user[user_id] = xp_by_user.get(user_id, 0) + xp
+
+    with conn:
+        conn.executemany("UPDATE Users SET total_xp = total_xp + ? WHERE user_id = ?",
+                         [(xp, user_id) for user_id, xp in xp_by_user.items()])
+        recompute_levels(conn, admin_id, list(xp_by_user))
+
+    seconds = time.perf_counter() - start
+    return {
+        "rows_read": rows_read,
+        "rows_inserted": rows_inserted,
+        "rows_skipped": rows_read - rows_inserted,
+        "users_updated": len(xp_by_user),
+        "xp_credited": sum(xp_by_user.values()),
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows_inserted / seconds) if seconds else 0,
+    }
+
+# Column names accepted by import_users, after lower-casing and replacing
+# spaces with underscores; the export's "User ID" column is ignored.
+USER_IMPORT_COLUMNS = ("name", "current_level", "total_xp")
+
+def content_hash(fileobj, block_size=1 << 20):
+    """sha256 of a binary file object's contents, leaving it rewound."""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(block_size), b""):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+def _nullable_ints(series):
+    import pandas as pd
+    return [None if pd.isna(v) else int(v) for v in series]
+
+def _find_import(conn, admin_id, kind, digest):
+    row = conn.execute("SELECT summary FROM ImportLog WHERE admin_id = ? AND kind = ? AND content_hash = ?",
+                       (admin_id, kind, digest)).fetchone()
+    return json.loads(row[0]) if row else None
+
+# An import that sets an existing user's XP records the difference as an adjustment.
+IMPORT_ADJUSTMENT_SQL = """
+    INSERT INTO ActivityEvents (admin_id, user_id, kind, xp_change, reason)
+    SELECT admin_id, user_id, 'adjustment', ?1 - COALESCE(total_xp, 0), 'user import'
+    FROM Users WHERE admin_id = ?2 AND name = ?3 AND ?1 IS NOT COALESCE(total_xp, 0)
+    """
+
+def import_users(conn, admin_id, fileobj, filename=None, chunk_size=5000):
+    """Upsert users from a CSV upload, reading it in chunks.
+
+    Columns are Name plus optional Current Level and Total XP (the export
+    format). Each chunk is validated with vectorized column checks: blank
+    names and negative or non-numeric values are rejected, missing XP is 0
+    and a missing level is taken from the XP. A name already in the
+    household, or seen earlier in the file, updates that user instead of
+    adding a second one. Each chunk commits in one transaction.
+
+    The upload's content hash is recorded, so importing the same file again
+    (e.g. on a Streamlit rerun) does nothing and returns the first summary
+    with already_imported set. Returns a summary dict including timing.
+    """
+    import pandas as pd
+    start = time.perf_counter()
+    digest = content_hash(fileobj)
+    previous = _find_import(conn, admin_id, "users", digest)
+    if previous is not None:
+        return {**previous, "already_imported": True}
+
+    level_index = get_level_index(conn, admin_id)
+    existing = {name for _, name, *_ in get_users(conn, admin_id)}
+    seen = set()
+    summary = {"rows_read": 0, "rows_inserted": 0, "rows_updated": 0, "rows_invalid": 0, "duplicates_in_file": 0}
+    try:
+        for chunk in pd.read_csv(fileobj, chunksize=chunk_size, dtype=str, keep_default_na=False, skipinitialspace=True):
+            chunk.columns = [str(c).strip().lower().replace(" ", "_") for c in chunk.columns]
+            if "name" not in chunk.columns:
+                raise ValueError("The CSV needs a Name column")
+            summary["rows_read"] += len(chunk)
+            names = chunk["name"].str.strip()
+            valid = names != ""
+            values = {}
+            for column in ("current_level", "total_xp"):
+                raw = chunk[column].str.strip() if column in chunk.columns else pd.Series("", index=chunk.index)
+                numbers = pd.to_numeric(raw, errors="coerce")
+                valid &= (raw == "") | (numbers.notna() & (numbers >= 0))
+                values[column] = numbers
+            frame = pd.DataFrame({"name": names, **values})[valid]
+            summary["rows_invalid"] += int((~valid).sum())
+
+            last = ~frame["name"].duplicated(keep="last")
+            summary["duplicates_in_file"] += int((~last).sum()) + int(frame.loc[last, "name"].isin(seen).sum())
+            frame = frame[last]
+            xp = frame["total_xp"] // 1
+            derived = pd.Series(level_index.levels_for(xp.fillna(0)), index=frame.index)
+            # New users default to 0 XP; existing users keep whatever the file leaves blank.
+            level = (frame["current_level"] // 1).fillna(derived.where(xp.notna()))
+            known = frame["name"].isin(existing | seen)
+            new = frame[~known]
+            inserts = list(zip([admin_id] * len(new), new["name"], level[~known].fillna(derived[~known]).astype("int64").tolist(),
+                               xp[~known].fillna(0).astype("int64").tolist()))
+            updates = list(zip(_nullable_ints(level[known]), _nullable_ints(xp[known]), [admin_id] * int(known.sum()),
+                               frame.loc[known, "name"]))
+            with conn:
+                conn.executemany("INSERT INTO Users (admin_id, name, current_level, total_xp) VALUES (?, ?, ?, ?)", inserts)
+                conn.executemany(IMPORT_ADJUSTMENT_SQL, [(xp, admin_id, name) for _, xp, admin_id, name in updates if xp is not None])
+                conn.executemany("""
+                    UPDATE Users SET current_level = COALESCE(?, current_level), total_xp = COALESCE(?, total_xp)
+                    WHERE admin_id = ? AND name = ?""", updates)
+            read_cache.invalidate("users", admin_id)
+            seen.update(frame["name"])
+            summary["rows_inserted"] += len(inserts)
+            summary["rows_updated"] += len(updates)
+    except pd.errors.EmptyDataError:
+        pass
+
+    seconds = time.perf_counter() - start
+    summary.update(seconds=round(seconds, 3), rows_per_second=round(summary["rows_read"] / seconds) if seconds else 0,
+                   content_hash=digest, already_imported=False)
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO ImportLog (admin_id, kind, content_hash, filename, summary) VALUES (?, ?, ?, ?, ?)",
+                     (admin_id, "users", digest, filename, json.dumps(summary)))
+    return summary
+
+# XP Rollup Functions
+# DailyXP holds one row per (admin_id, user_id, date, task_id). Triggers on
+# ActivityLog keep it current, so trend queries read O(days) rows instead of
+# the whole activity history.
+def rebuild_rollups(conn, admin_id=None):
+    """Recompute DailyXP from ActivityLog plus the totals of archived rows."""
+    where = "WHERE admin_id IS NOT NULL AND user_id IS NOT NULL AND task_id IS NOT NULL"
+    params = ()
+    if admin_id is not None:
+        where += " AND admin_id = ?"
+        params = (admin_id,)
+    with conn:
+        conn.execute("DELETE FROM DailyXP" + (" WHERE admin_id = ?" if admin_id is not None else ""), params)
+        cursor = conn.execute(f"""
+            INSERT INTO DailyXP (admin_id, user_id, date, task_id, activity_count, time_spent, xp_earned, bonus_xp)
+            SELECT admin_id, user_id, date, task_id, SUM(activity_count),
+                   SUM(time_spent), SUM(xp_earned), SUM(bonus_xp)
+            FROM (
+                SELECT admin_id, user_id, date, task_id, 1 AS activity_count, COALESCE(time_spent, 0) AS time_spent,
+                       COALESCE(xp_earned, 0) AS xp_earned, COALESCE(bonus_xp, 0) AS bonus_xp
+                FROM ActivityLog {where}
+                UNION ALL
+                SELECT admin_id, user_id, date, task_id, activity_count, time_spent, xp_earned, bonus_xp
+                FROM ArchivedDailyXP {where}
+            )
+            GROUP BY admin_id, user_id, date, task_id
+            """, params * 2)
+    return cursor.rowcount
+
+def _rollup_filters(admin_id, user_id, start_date, end_date):
+    clauses = ["d.admin_id = ?"]
+    params = [admin_id]
+    if user_id is not None:
+        clauses.append("d.user_id = ?")
+        params.append(user_id)
+    if start_date is not None:
+        clauses.append("d.date >= ?")
+        params.append(str(start_date))
+    if end_date is not None:
+        clauses.append("d.date <= ?")
+        params.append(str(end_date))
+    return " AND ".join(clauses), params
+
+# Period labels for get_xp_by_day, the same as pandas' "D", "W" (week ending
+# Sunday) and "M" (month end) resampling.
+XP_PERIODS = {
+    "D": "d.date",
+    "W": "date(d.date, 'weekday 0')",
+    "M": "date(d.date, 'start of month', '+1 month', '-1 day')",
+}
+
+def get_xp_by_day(conn, admin_id, user_id=None, start_date=None, end_date=None, freq="D"):
+    """XP per user per period as Records, read from DailyXP.
+
+    freq is "D" for the stored days, or "W" / "M" to sum them by week or
+    month; each period is labelled with its last day (YYYY-MM-DD).
     """
-    c.execute(query, (admin_id, user_id))
-    df = pd.DataFrame(c.fetchall(), columns=['Date', 'Task Name', 'Time Spent', 'XP Earned'])
-    df.index += 1
-    return df
+    if freq not in XP_PERIODS:
+        raise ValueError(f"Unknown period {freq!r}")
+    where, params = _rollup_filters(admin_id, user_id, start_date, end_date)
+    c = conn.cursor()
+    c.execute(f"""
+        SELECT {XP_PERIODS[freq]} AS period, d.user_id, u.name, SUM(d.xp_earned + d.bonus_xp), SUM(d.activity_count),
+               SUM(d.time_spent)
+        FROM DailyXP d
+        JOIN Users u ON u.user_id = d.user_id
+        WHERE {where}
+        GROUP BY period, d.user_id
+        ORDER BY period
+        """, params)
+    return Records(c.fetchall(), ['Date', 'User ID', 'Name', 'XP', 'Activities', 'Time Spent'])
+
+def get_xp_by_task(conn, admin_id, user_id=None, start_date=None, end_date=None):
+    """XP, activity count and time per task as Records, read from DailyXP."""
+    where, params = _rollup_filters(admin_id, user_id, start_date, end_date)
+    c = conn.cursor()
+    c.execute(f"""
+        SELECT d.task_id, t.task_name, SUM(d.xp_earned + d.bonus_xp), SUM(d.activity_count), SUM(d.time_spent)
+        FROM DailyXP d
+        JOIN Tasks t ON t.task_id = d.task_id
+        WHERE {where}
+        GROUP BY d.task_id
+        ORDER BY 3 DESC
+        """, params)
+    return Records(c.fetchall(), ['Task ID', 'Task Name', 'XP', 'Activities', 'Time Spent'])
+
+# XP Rule Functions
+# Each admin scores new activities with one rule version from xp_rules.py.
+# recompute_xp rescores an admin's live ActivityLog rows in set-based
+# passes: the new XP is computed into a temp table and applied with UPDATE
+# ... FROM while XPRescoreInProgress holds the per-row rollup and event
+# triggers off, then DailyXP, the weekly leaderboard and total_xp are each
+# moved by the summed differences, with one 'correction' event per user. XP from archived activities and user imports is kept.
+@cached_read("xp_rule")
+def _get_xp_rule_rows(conn, admin_id):
+    return conn.execute("SELECT xp_rule FROM admin WHERE id = ?", (admin_id,)).fetchall()
+
+def get_xp_rule(conn, admin_id):
+    """The rule version admin_id's new activities are scored with."""
+    rows = _get_xp_rule_rows(conn, admin_id)
+    return rows[0][0] if rows else DEFAULT_RULE
+
+RESCORE_SQL = """
+    CREATE TEMP TABLE xp_rescore AS
+    SELECT a.activity_id, a.user_id, a.date, a.task_id, COALESCE(a.xp_earned, 0) AS old_xp, {xp} AS new_xp
+    FROM ActivityLog a JOIN Tasks t ON t.task_id = a.task_id
+    WHERE a.admin_id = ?1 AND (a.xp_earned IS NOT {xp} OR a.xp_rule IS NOT ?2)
+    """
+
+RESCORE_DIFF_SQL = """
+    SELECT u.user_id, u.name, SUM(r.new_xp <> r.old_xp), COALESCE(u.total_xp, 0),
+           COALESCE(u.total_xp, 0) + SUM(r.new_xp - r.old_xp), u.current_level
+    FROM temp.xp_rescore r JOIN Users u ON u.user_id = r.user_id
+    GROUP BY u.user_id
+    HAVING SUM(r.new_xp <> r.old_xp) > 0
+    ORDER BY u.user_id
+    """
+
+def recompute_xp(conn, admin_id, rule=None, dry_run=False):
+    """Rescore an admin's activities with an XP rule (default: their current one).
+
+    Re-derives xp_earned for every live activity whose XP or rule differs,
+    moves total_xp by the change, re-levels those users and makes `rule`
+    the admin's rule for new activities, all in one transaction.
+    Archived activities keep their XP. With dry_run nothing is written.
+    Returns a summary dict whose "diff" is per-user Records of the
+    users whose XP changes.
+    """
+    start = time.perf_counter()
+    rule = get_rule(rule if rule is not None else get_xp_rule(conn, admin_id)).version
+    rescore_sql = _rule_sql(RESCORE_SQL, rule, base_xp="t.base_xp", time_multiplier="t.time_multiplier",
+                            time_spent="a.time_spent")
+    with conn:
+        conn.execute("BEGIN" if dry_run else "BEGIN IMMEDIATE")
+        conn.execute("DROP TABLE IF EXISTS temp.xp_rescore")
+        conn.execute(rescore_sql, (admin_id, rule))
+        rows = conn.execute(RESCORE_DIFF_SQL).fetchall()
+        activities_changed = sum(row[2] for row in rows)
+        new_levels = [int(level) for level in get_level_index(conn, admin_id).levels_for([row[4] for row in rows])] if rows else []
+        if not dry_run:
+            conn.execute("INSERT INTO XPRescoreInProgress (locked) VALUES (1)")
+            # rows whose XP changed get distinct change numbers for the sync feed
+            conn.execute("""
+                UPDATE ActivityLog SET xp_earned = r.new_xp, xp_rule = ?,
+                    change_seq = CASE WHEN r.new_xp <> r.old_xp THEN (SELECT seq FROM ChangeSequence) + r.rowid
+                                      ELSE ActivityLog.change_seq END
+                FROM temp.xp_rescore r WHERE ActivityLog.activity_id = r.activity_id""", (rule,))
+            conn.execute("UPDATE ChangeSequence SET seq = seq + (SELECT COALESCE(MAX(rowid), 0) FROM temp.xp_rescore)")
+            conn.execute("DELETE FROM XPRescoreInProgress")
+            conn.execute("""
+                UPDATE DailyXP SET xp_earned = xp_earned + d.change
+                FROM (SELECT user_id, date, task_id, SUM(new_xp - old_xp) AS change
+                      FROM temp.xp_rescore GROUP BY user_id, date, task_id) d
+                WHERE DailyXP.admin_id = ? AND DailyXP.user_id = d.user_id AND DailyXP.date = d.date
+                  AND DailyXP.task_id = d.task_id AND d.change <> 0""", (admin_id,))
+            conn.execute("""
+                UPDATE LeaderboardScores SET score = score + d.change
+                FROM (SELECT user_id, date(date, '-6 days', 'weekday 1') AS week, SUM(new_xp - old_xp) AS change
+                      FROM temp.xp_rescore GROUP BY user_id, week) d
+                WHERE LeaderboardScores.board = 'weekly' AND LeaderboardScores.period = d.week
+                  AND LeaderboardScores.admin_id = ? AND LeaderboardScores.user_id = d.user_id
+                  AND d.change <> 0""", (admin_id,))
+            conn.execute("""
+                INSERT INTO ActivityEvents (admin_id, user_id, kind, xp_change, data, reason)
+                SELECT ?, user_id, 'correction', SUM(new_xp - old_xp), json_object('xp_rule', ?, 'activities', COUNT(*)),
+                       'xp rule rescore'
+                FROM temp.xp_rescore GROUP BY user_id HAVING SUM(new_xp - old_xp) <> 0""", (admin_id, rule))
+            conn.execute("""
+                UPDATE Users SET total_xp = COALESCE(total_xp, 0) + d.change
+                FROM (SELECT user_id, SUM(new_xp - old_xp) AS change FROM temp.xp_rescore GROUP BY user_id) d
+                WHERE Users.user_id = d.user_id AND d.change <> 0""")
+            # levels for the new totals, so no reader sees a new total_xp with its old level
+            conn.execute("""
+                UPDATE Users SET current_level = l.value ->> 1 FROM json_each(?) l
+                WHERE Users.user_id = l.value ->> 0 AND Users.current_level IS NOT l.value ->> 1""",
+                (json.dumps([[row[0], level] for row, level in zip(rows, new_levels)]),))
+            conn.execute("UPDATE admin SET xp_rule = ? WHERE id = ?", (rule, admin_id))
+        conn.execute("DROP TABLE temp.xp_rescore")
+    diff = Records([row[:5] + (row[4] - row[3], row[5], level) for row, level in zip(rows, new_levels)],
+                   ["User ID", "Name", "Activities Changed", "Old XP", "New XP", "XP Change", "Old Level", "New Level"])
+    if not dry_run:
+        read_cache.invalidate("xp_rule", admin_id)
+        read_cache.invalidate("users", admin_id)
+    seconds = time.perf_counter() - start
+    return {
+        "rule": rule,
+        "dry_run": dry_run,
+        "activities_changed": activities_changed,
+        "users_changed": sum(1 for change in diff.column("XP Change") if change),
+        "xp_change": sum(diff.column("XP Change")),
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(activities_changed / seconds) if seconds else 0,
+        "diff": diff,
+    }
+
+# Schedule Functions
+# A schedule is a Recurrence (schedules.py) for one task and one child, or
+# every child when user_id is NULL. The agenda takes each schedule's latest
+# occurrence and marks it done if the child logged the task on or after it,
+# read from DailyXP over the shortest window that covers every schedule.
+AGENDA_TTL = 60.0  # seconds before a cached agenda is rebuilt regardless
+
+GET_SCHEDULES_SQL = """
+    SELECT schedule_id, task_id, user_id, frequency, every, weekdays, day_of_month, start_date, end_date
+    FROM Schedules WHERE admin_id = ? ORDER BY schedule_id
+    """
+
+# Which tasks each child logged on which days of the window.
+AGENDA_LOGS_SQL = "SELECT user_id, task_id, date FROM DailyXP WHERE admin_id = ? AND date >= ? AND date <= ?"
+
+def add_schedule(conn, admin_id, task_id, frequency, user_id=None, every=1, weekdays=None, day_of_month=None,
+                 start_date=None, end_date=None):
+    """Schedule a task for one child (or every child when user_id is None). Returns the schedule_id.
+
+    weekdays is a list of weekday numbers (Monday = 0). Raises ValueError
+    for a rule that can never occur.
+    """
+    rule = Recurrence(frequency, every, weekday_mask(weekdays or []), day_of_month, start_date, end_date)
+    with conn:
+        schedule_id = conn.execute("""
+            INSERT INTO Schedules (admin_id, task_id, user_id, frequency, every, weekdays, day_of_month, start_date, end_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (admin_id, task_id, user_id, rule.frequency, rule.every, rule.weekdays, rule.day_of_month,
+             rule.start.isoformat(), rule.end.isoformat() if rule.end else None)).lastrowid
+    read_cache.invalidate("schedules", admin_id)
+    return schedule_id
+
+def delete_schedule(conn, schedule_id, admin_id):
+    with conn:
+        deleted = conn.execute("DELETE FROM Schedules WHERE schedule_id = ? AND admin_id = ?", (schedule_id, admin_id)).rowcount
+    read_cache.invalidate("schedules", admin_id)
+    return deleted > 0
+
+@cached_read("schedules")
+def get_schedules(conn, admin_id):
+    c = conn.cursor()
+    c.execute(GET_SCHEDULES_SQL, (admin_id,))
+    return c.fetchall()
+
+def schedule_rule(schedule):
+    """Recurrence for a row returned by get_schedules."""
+    return Recurrence(*schedule[3:])
+
+_agendas = {}
+
+def get_agenda(conn, admin_id, day=None, user_id=None):
+    """Scheduled chores for day (default today), optionally for one child.
+
+    Returns (schedule_id, user_id, task_id, task_name, due_date, status)
+    tuples, status being 'overdue', 'due' or 'done', in that order. A missed
+    occurrence stays overdue until the task is logged or the next one comes
+    round. The household's agenda is cached per day until its users,
+    tasks or schedules change (logging an activity invalidates the users).
+    """
+    day = _date.fromisoformat(str(day)[:10]) if day else _date.today()
+    key = (getattr(conn, "db_file", None), admin_id, day)
+    generations = tuple(read_cache.generation(entity, admin_id) for entity in ("users", "tasks", "schedules"))
+    cached = _agendas.get(key)
+    now = time.monotonic()
+    if cached is not None and cached[0] > now and cached[1] == generations:
+        agenda = cached[2]
+    else:
+        agenda = _build_agenda(conn, admin_id, day)
+        if key[0] is not None:
+            if len(_agendas) >= MAX_OPEN_POOLS * 4:
+                _agendas.clear()  # old days are never read again
+            _agendas[key] = (now + AGENDA_TTL, generations, agenda)
+    return [item for item in agenda if user_id is None or item[1] == user_id]
+
+def _build_agenda(conn, admin_id, day):
+    users = [user[0] for user in get_users(conn, admin_id)]
+    tasks = {task[0]: task[1] for task in get_tasks(conn, admin_id)}
+    pending = []
+    for schedule in get_schedules(conn, admin_id):
+        schedule_id, task_id, schedule_user = schedule[:3]
+        due = schedule_rule(schedule).latest(day)
+        if due is None or task_id not in tasks:
+            continue
+        for child in users if schedule_user is None else [schedule_user]:
+            pending.append((schedule_id, child, task_id, tasks[task_id], due.isoformat()))
+    if not pending:
+        return []
+    last_logged = {}
+    for child, task_id, logged in conn.execute(AGENDA_LOGS_SQL, (admin_id, min(p[4] for p in pending), day.isoformat())):
+        if logged > last_logged.get((child, task_id), ""):
+            last_logged[(child, task_id)] = logged
+    today = day.isoformat()
+    agenda = []
+    for schedule_id, child, task_id, task_name, due in pending:
+        if last_logged.get((child, task_id), "") >= due:
+            status = "done"
+        else:
+            status = "due" if due == today else "overdue"
+        agenda.append((schedule_id, child, task_id, task_name, due, status))
+    order = {"overdue": 0, "due": 1, "done": 2}
+    agenda.sort(key=lambda item: (order[item[5]], item[4], item[3]))
+    return agenda
+
+# Leaderboard Functions
+# LeaderboardScores is kept current by triggers on ActivityLog (weekly XP)
+# and Users (all-time total_xp), so a log refreshes it in the same
+# transaction. Top-N reads walk idx_leaderboard_household/global and stop
+# after `limit` rows; ranks come from a cached RankIndex (a binary search).
+LEADERBOARD_BOARDS = ("weekly", "all_time")
+LEADERBOARD_TTL = 30.0  # seconds before a cached rank index is rebuilt
+LEADERBOARD_WEEKS = 52  # weekly periods kept by compact_leaderboards
+
+TOP_SCORES_SQL = """
+    SELECT s.user_id, u.name, s.admin_id, s.score
+    FROM LeaderboardScores s
+    JOIN Users u ON u.user_id = s.user_id
+    WHERE s.board = ? AND s.period = ? AND s.admin_id = ? AND s.score > 0
+    ORDER BY s.score DESC
+    LIMIT ?
+    """
+
+# Across households only admins who opted in are ranked.
+SHARED_TOP_SCORES_SQL = """
+    SELECT s.user_id, u.name, s.admin_id, s.score
+    FROM LeaderboardScores s
+    JOIN admin a ON a.id = s.admin_id AND a.share_leaderboard = 1
+    JOIN Users u ON u.user_id = s.user_id
+    WHERE s.board = ? AND s.period = ? AND s.score > 0
+    ORDER BY s.score DESC
+    LIMIT ?
+    """
+
+def week_start(day=None):
+    """Monday of the week containing day (a date or YYYY-MM-DD string), as YYYY-MM-DD."""
+    day = _date.fromisoformat(str(day)[:10]) if day else _date.today()
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+def _leaderboard_period(board, period):
+    if board not in LEADERBOARD_BOARDS:
+        raise ValueError(f"Unknown leaderboard {board!r}")
+    return "" if board == "all_time" else week_start(period)
+
+def get_top_scores(conn, board="weekly", admin_id=None, period=None, limit=10):
+    """Top `limit` users on a board as Records with competition ranks.
+
+    With admin_id, ranks one household; without, every household that
+    shares its leaderboard. period is any day in the week (default this
+    week) and is ignored for the all-time board.
+    """
+    period = _leaderboard_period(board, period)
+    c = conn.cursor()
+    if admin_id is None:
+        c.execute(SHARED_TOP_SCORES_SQL, (board, period, limit))
+    else:
+        c.execute(TOP_SCORES_SQL, (board, period, admin_id, limit))
+    rows = c.fetchall()
+    ranks = []
+    for i, row in enumerate(rows):
+        ranks.append(ranks[-1] if i and row[3] == rows[i - 1][3] else i + 1)
+    return Records([(rank,) + tuple(row) for rank, row in zip(ranks, rows)], ['Rank', 'User ID', 'Name', 'Household', 'XP'])
+
+_rank_indexes = {}
+
+def get_rank_index(conn, board="weekly", admin_id=None, period=None):
+    """Return the RankIndex for a household's board (or the shared board when admin_id is None).
+
+    A household's index is reused until its users are invalidated in the
+    read cache (every XP write does that) or LEADERBOARD_TTL passes; the
+    shared board is only rebuilt on the TTL.
+    """
+    period = _leaderboard_period(board, period)
+    key = (getattr(conn, "db_file", None), board, period, admin_id)
+    generation = read_cache.generation("users", admin_id) if admin_id is not None else None
+    cached = _rank_indexes.get(key)
+    now = time.monotonic()
+    if cached is not None and cached[0] > now and cached[1] == generation:
+        return cached[2]
+    if admin_id is None:
+        rows = conn.execute("""
+            SELECT s.admin_id, s.user_id, s.score FROM LeaderboardScores s
+            JOIN admin a ON a.id = s.admin_id AND a.share_leaderboard = 1
+            WHERE s.board = ? AND s.period = ? AND s.score > 0""", (board, period)).fetchall()
+    else:
+        rows = conn.execute("""
+            SELECT admin_id, user_id, score FROM LeaderboardScores
+            WHERE board = ? AND period = ? AND admin_id = ? AND score > 0""", (board, period, admin_id)).fetchall()
+    index = RankIndex(rows)
+    if key[0] is not None:
+        _rank_indexes[key] = (now + LEADERBOARD_TTL, generation, index)
+    return index
+
+def get_user_rank(conn, admin_id, user_id, board="weekly", period=None, across_households=False):
+    """Return (rank, score, users ranked) for a user; rank and score are None if they are not on the board."""
+    index = get_rank_index(conn, board, None if across_households else admin_id, period)
+    rank, score = index.rank(admin_id, user_id)
+    return rank, score, len(index)
+
+def set_leaderboard_sharing(conn, admin_id, enabled):
+    with conn:
+        conn.execute("UPDATE admin SET share_leaderboard = ? WHERE id = ?", (1 if enabled else 0, admin_id))
+
+def get_leaderboard_sharing(conn, admin_id):
+    row = conn.execute("SELECT share_leaderboard FROM admin WHERE id = ?", (admin_id,)).fetchone()
+    return bool(row and row[0])
+
+def rebuild_leaderboards(conn, admin_id=None):
+    """Recompute LeaderboardScores from DailyXP and Users, for one admin or for everyone. Returns rows written."""
+    where, params = ("WHERE admin_id = ?", (admin_id,)) if admin_id is not None else ("WHERE admin_id IS NOT NULL", ())
+    with conn:
+        conn.execute(f"DELETE FROM LeaderboardScores {where}", params)
+        rows = conn.execute(f"""
+            INSERT INTO LeaderboardScores (board, period, admin_id, user_id, score)
+            SELECT 'weekly', date(date, '-6 days', 'weekday 1') AS week, admin_id, user_id, SUM(xp_earned + bonus_xp)
+            FROM DailyXP {where} GROUP BY week, admin_id, user_id""", params).rowcount
+        rows += conn.execute(f"""
+            INSERT INTO LeaderboardScores (board, period, admin_id, user_id, score)
+            SELECT 'all_time', '', admin_id, user_id, COALESCE(total_xp, 0) FROM Users {where}""", params).rowcount
+    _rank_indexes.clear()
+    return rows
+
+def compact_leaderboards(conn, keep_weeks=LEADERBOARD_WEEKS):
+    """Drop weekly periods older than keep_weeks and empty weekly rows. Returns rows deleted.
+
+    Meant to run periodically (python migrations.py --compact-leaderboards);
+    run rebuild_leaderboards as well to correct any drift.
+    """
+    oldest = week_start(_date.today() - timedelta(weeks=keep_weeks))
+    with conn:
+        deleted = conn.execute("DELETE FROM LeaderboardScores WHERE board = 'weekly' AND (period < ? OR score <= 0)",
+                               (oldest,)).rowcount
+    _rank_indexes.clear()
+    return deleted
+
+# Change Feed Functions
+# Rows of the synced tables (sync.SYNC_ENTITIES) carry change_seq, stamped
+# from ChangeSequence by migration 11's triggers on every insert and update,
+# and deletes leave a ChangeTombstones row. The counter is bumped inside the
+# writing transaction and SQLite has one writer, so numbers become visible
+# in order: reading the counter first and then only rows at or below it
+# never skips a change that commits in between.
+CHANGES_LIMIT = 1000  # changes per page
+
+CHANGES_SQL = """
+    SELECT change_seq, {columns} FROM {table}
+    WHERE admin_id = ? AND change_seq > ? AND change_seq <= ?
+    ORDER BY change_seq LIMIT ?
+    """
+
+TOMBSTONES_SQL = """
+    SELECT seq, entity, row_id FROM ChangeTombstones
+    WHERE admin_id = ? AND seq > ? AND seq <= ?
+    ORDER BY seq LIMIT ?
+    """
+
+def _changes_sql(entity):
+    table, _, columns = SYNC_ENTITIES[entity]
+    return CHANGES_SQL.format(table=table, columns=", ".join(columns))
+
+def get_change_cursor(conn):
+    """The latest change sequence number; a client that has applied everything up to it is current."""
+    return conn.execute("SELECT seq FROM ChangeSequence").fetchone()[0]
+
+def get_changes(conn, admin_id, since=0, limit=CHANGES_LIMIT):
+    """The admin's synced rows that changed after cursor `since`, oldest change first.
+
+    Returns {"cursor", "more", "changes"}, where changes maps an entity to
+    {"columns", "rows", "deleted"}: each changed row once, with its current
+    values, and the keys of deleted rows. Pass cursor back as since for the
+    next page while more is set. since=0 is a first sync and gets every row.
+    """
+    since, limit = int(since), max(int(limit), 1)
+    upto = get_change_cursor(conn)
+    found = []
+    for entity in SYNC_ENTITIES:
+        found += [(row[0], entity, row[1:]) for row in
+                  conn.execute(_changes_sql(entity), (admin_id, since, upto, limit + 1))]
+    if since:  # a first sync has nothing to delete
+        found += [(seq, entity, row_id) for seq, entity, row_id in
+                  conn.execute(TOMBSTONES_SQL, (admin_id, since, upto, limit + 1))]
+    found.sort(key=lambda change: change[0])
+    more = len(found) > limit
+    found = found[:limit]
+    changes = {}
+    for _, entity, data in found:
+        change = changes.setdefault(entity, {"columns": list(SYNC_ENTITIES[entity][2]), "rows": [], "deleted": []})
+        if isinstance(data, tuple):
+            change["rows"].append(data)
+        else:
+            change["deleted"].append(data)
+    return {"cursor": found[-1][0] if more else max(upto, since), "more": more, "changes": changes}
+
 # Level Management Functions
 def initialize_default_levels(conn, admin_id):
     with conn:
@@ -191,52 +1390,212 @@ def initialize_default_levels(conn, admin_id):
                 INSERT INTO Levels (Level, admin_id, XPRequired, CumulativeXP, Reward)
                 VALUES (?, ?, ?, ?, ?)""",
                 (level, admin_id, xp_required, cumulative_xp, reward))
+    read_cache.invalidate("levels", admin_id)
 
 def update_level(conn, user_id):
-    c = conn.cursor()
-    c.execute("SELECT total_xp FROM Users WHERE user_id = ?", (user_id,))
-    total_xp = c.fetchone()[0]
-    levels = [100, 300, 600, 1000, 1500, 2100, 2800, 3600, 4500, 5500]  # Add more as needed
-    new_level = len([x for x in levels if x <= total_xp])
     with conn:
-        conn.execute("UPDATE Users SET current_level = ? WHERE user_id = ?", (new_level, user_id))
+        credited = _credit_xp(conn, user_id, 0)
+    if credited:
+        read_cache.invalidate("users", credited[0])
 
 def add_level(conn, admin_id, level, xp_required, cumulative_xp, reward):
     with conn:
         conn.execute("INSERT INTO Levels (Level, admin_id, XPRequired, CumulativeXP, Reward) VALUES (?, ?, ?, ?, ?)",
                      (level, admin_id, xp_required, cumulative_xp, reward))
+    read_cache.invalidate("levels", admin_id)
+    recompute_levels(conn, admin_id)
 
 def update_level_details(conn, admin_id, level, xp_required, cumulative_xp, reward):
     with conn:
         conn.execute("UPDATE Levels SET XPRequired = ?, CumulativeXP = ?, Reward = ? WHERE Level = ? AND admin_id = ?",
                      (xp_required, cumulative_xp, reward, level, admin_id))
+    read_cache.invalidate("levels", admin_id)
+    recompute_levels(conn, admin_id)
 
+GET_LEVELS_SQL = "SELECT Level, XPRequired, CumulativeXP, Reward FROM Levels WHERE admin_id = ? ORDER BY Level"
+
+@cached_read("levels")
 def get_levels(conn, admin_id):
     c = conn.cursor()
-    c.execute("SELECT Level, XPRequired, CumulativeXP, Reward FROM Levels WHERE admin_id = ?", (admin_id,))
+    c.execute(GET_LEVELS_SQL, (admin_id,))
     return c.fetchall()
 
+# Level indexes are rebuilt whenever the admin's Levels rows change. get_levels
+# is cached and invalidated by every level write, so comparing its rows with
+# the ones an index was built from is enough to notice a change.
+_level_indexes = {}
+
+def get_level_index(conn, admin_id):
+    """Return the LevelIndex for an admin's Levels rows, reusing it until they change."""
+    rows = get_levels(conn, admin_id)
+    key = (getattr(conn, "db_file", None), admin_id)
+    index = _level_indexes.get(key)
+    if index is None or index.rows != tuple(rows):
+        index = LevelIndex(rows)
+        if key[0] is not None:
+            _level_indexes[key] = index
+    return index
+
+def recompute_levels(conn, admin_id, user_ids=None):
+    """Set current_level from total_xp for some or all of an admin's users.
+
+    Every total is levelled in one vectorized lookup and only users whose
+    level changed are written. Returns the number of users updated.
+    """
+    level_index = get_level_index(conn, admin_id)
+    if user_ids is None:
+        rows = conn.execute("SELECT user_id, total_xp, current_level FROM Users WHERE admin_id = ?", (admin_id,)).fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT user_id, total_xp, current_level FROM Users WHERE admin_id = ? AND user_id IN (SELECT value FROM json_each(?))",
+            (admin_id, json.dumps(list(user_ids)))
+        ).fetchall()
+    if not rows:
+        return 0
+    new_levels = level_index.levels_for([total_xp for _, total_xp, _ in rows])
+    changes = [(int(level), user_id) for (user_id, _, current_level), level in zip(rows, new_levels) if level != current_level]
+    with conn:
+        conn.executemany("UPDATE Users SET current_level = ? WHERE user_id = ?", changes)
+    read_cache.invalidate("users", admin_id)
+    return len(changes)
+
 def update_reward(conn, level, reward, admin_id):
     with conn:
         conn.execute("UPDATE Levels SET Reward = ? WHERE Level = ? AND admin_id = ?", (reward, level, admin_id))
+    read_cache.invalidate("levels", admin_id)
 
 # Helper function to calculate XP
-def calculate_xp(conn, task_id, time_spent):
+def calculate_xp(conn, task_id, time_spent, rule=None):
+    """XP a log of task_id would earn under rule (default: the task's admin's rule)."""
+    if rule is None:
+        admin_id = conn.execute("SELECT admin_id FROM Tasks WHERE task_id = ?", (task_id,)).fetchone()
+        rule = get_xp_rule(conn, admin_id[0]) if admin_id else DEFAULT_RULE
     c = conn.cursor()
-    c.execute("SELECT base_xp, time_multiplier FROM Tasks WHERE task_id = ?", (task_id,))
+    c.execute(_rule_sql("SELECT {xp} FROM Tasks WHERE task_id = :task_id", rule, time_spent=":time_spent"),
+              {"task_id": task_id, "time_spent": time_spent})
     task = c.fetchone()
     return task[0]
-def update_total_xp(conn, user_id, xp_to_add):
+def update_total_xp(conn, user_id, xp_to_add, reason=None):
     with conn:
-        conn.execute("UPDATE Users SET total_xp = total_xp + ? WHERE user_id = ?", (xp_to_add, user_id))
-        update_level(conn, user_id)  # Update the user's level after changing XP
+        credited = _credit_xp(conn, user_id, xp_to_add)
+        if credited:
+            conn.execute("INSERT INTO ActivityEvents (admin_id, user_id, kind, xp_change, reason) VALUES (?, ?, 'adjustment', ?, ?)",
+                         (credited[0], user_id, xp_to_add, reason))
+    if credited:
+        read_cache.invalidate("users", credited[0])
 
-def add_small_reward(conn, reward):
+def add_small_reward(conn, reward, admin_id=None, weight=None, tier=None, daily_cap=None):
+    """Add a reward to an admin's pool, or to the shared pool when admin_id is None.
+
+    weight defaults to the tier's weight in REWARD_TIERS (1 without a tier);
+    daily_cap limits how often one user can get the reward per day.
+    """
+    if weight is None:
+        weight = REWARD_TIERS.get(tier, 1.0)
     with conn:
-        conn.execute("INSERT INTO SmallRewards (reward) VALUES (?)", (reward,))
+        conn.execute("INSERT INTO SmallRewards (reward, admin_id, weight, tier, daily_cap) VALUES (?, ?, ?, ?, ?)",
+                     (reward, admin_id, weight, tier, daily_cap))
+    read_cache.invalidate("small_rewards", admin_id)  # None drops every admin's cached pool
+
+def delete_small_reward(conn, reward_id, admin_id=None):
+    """Delete one of admin_id's rewards (a shared one when admin_id is None). Returns True if it existed."""
+    with conn:
+        deleted = conn.execute("DELETE FROM SmallRewards WHERE reward_id = ? AND admin_id IS ?", (reward_id, admin_id)).rowcount
+    read_cache.invalidate("small_rewards", admin_id)
+    return deleted > 0
+
+# An admin's pool is their own rewards, or the shared ones (admin_id IS NULL)
+# until they add any.
+GET_SMALL_REWARDS_SQL = """
+    SELECT reward_id, reward, weight, tier, daily_cap FROM SmallRewards
+    WHERE admin_id IS ? OR (admin_id IS NULL AND NOT EXISTS (SELECT 1 FROM SmallRewards WHERE admin_id = ?))
+    """
 
-def get_random_small_reward(conn):
+@cached_read("small_rewards")
+def get_small_rewards(conn, admin_id=None):
     c = conn.cursor()
-    c.execute("SELECT reward FROM SmallRewards ORDER BY RANDOM() LIMIT 1")
-    reward = c.fetchone()
-    return reward[0] if reward else None
\ No newline at end of file
+    c.execute(GET_SMALL_REWARDS_SQL, (admin_id, admin_id))
+    return c.fetchall()
+
+_reward_samplers = {}
+
+def get_reward_sampler(conn, admin_id=None):
+    """Return the alias-table sampler for an admin's pool, reusing it until the pool changes."""
+    rows = get_small_rewards(conn, admin_id)
+    key = (getattr(conn, "db_file", None), admin_id)
+    sampler = _reward_samplers.get(key)
+    if sampler is None or sampler.rows != tuple(row for row in rows if (row[2] or 0) > 0):
+        sampler = RewardSampler(rows)
+        if key[0] is not None:
+            _reward_samplers[key] = sampler
+    return sampler
+
+GRANT_REWARD_SQL = """
+    INSERT INTO RewardGrants (admin_id, reward_id, user_id, date, granted) VALUES (?, ?, ?, ?, 1)
+    ON CONFLICT (admin_id, reward_id, user_id, date) DO UPDATE SET granted = granted + 1
+    WHERE granted < ?
+    RETURNING granted
+    """
+
+def get_random_small_reward(conn, admin_id=None, user_id=None, date=None, attempts=8):
+    """Draw a reward from the admin's pool, weighted by rarity.
+
+    A reward with a daily_cap is only given while user_id has had it fewer
+    than daily_cap times on date (default today); the check and count are a
+    single upsert on RewardGrants. Caps are only counted when both admin_id
+    and user_id are given. A capped-out draw is retried up to `attempts`
+    times before giving nothing.
+    """
+    sampler = get_reward_sampler(conn, admin_id)
+    for _ in range(attempts):
+        row = sampler.sample()
+        if row is None:
+            return None
+        reward_id, reward, _, _, daily_cap = row
+        if daily_cap is None or user_id is None or admin_id is None:
+            return reward
+        if daily_cap <= 0:
+            continue
+        with conn:
+            granted = conn.execute(GRANT_REWARD_SQL, (admin_id, reward_id, user_id,
+                                                      str(date or time.strftime("%Y-%m-%d")), daily_cap)).fetchall()
+        if granted:
+            return reward
+    return None
+
+# Query Plan Checks
+# Hot read queries, the sample parameters used to EXPLAIN them and the index
+# each one is expected to use. Run `python migrations.py` to check them.
+HOT_QUERIES = {
+    "get_users": (GET_USERS_SQL, (1,), "idx_users_admin"),
+    "get_tasks": (GET_TASKS_SQL, (1,), "idx_tasks_admin"),
+    "get_levels": (GET_LEVELS_SQL, (1,), "idx_levels_admin_level"),
+    "get_user_activities": (USER_ACTIVITIES_SQL, (1, 1, "2024-01-01"), "idx_activitylog_admin_user_date"),
+    "get_all_user_activities": (ALL_USER_ACTIVITIES_SQL, (1, 1), "idx_activitylog_admin_user_date"),
+    "get_activity_page": (ACTIVITY_PAGE_SQL, (1, 1, "2024-01-01", 1, 25), "idx_activitylog_admin_user_date"),
+    "get_small_rewards": (GET_SMALL_REWARDS_SQL, (1, 1), "idx_smallrewards_admin"),
+    "get_recent_activities": (RECENT_ACTIVITIES_SQL, (1, 1, 20), "idx_activitylog_admin_user_date"),
+    "get_schedules": (GET_SCHEDULES_SQL, (1,), "idx_schedules_admin"),
+    "get_agenda": (AGENDA_LOGS_SQL, (1, "2024-01-01", "2024-01-31"), "idx_dailyxp_admin_date"),
+    "get_top_scores": (TOP_SCORES_SQL, ("weekly", "2024-01-01", 1, 10), "idx_leaderboard_household"),
+    "get_top_scores[shared]": (SHARED_TOP_SCORES_SQL, ("weekly", "2024-01-01", 10), "idx_leaderboard_global"),
+    "get_changes": (_changes_sql("activities"), (1, 0, 100, 1001), "idx_activitylog_admin_change"),
+    "get_changes[deleted]": (TOMBSTONES_SQL, (1, 0, 100, 1001), "idx_changetombstones_admin"),
+}
+
+def explain_query(conn, sql, params=()):
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+def check_query_plans(conn):
+    """Return (name, ok, plan) for every hot query.
+
+    ok is True when the plan searches the expected index and does not sort
+    with a temporary B-tree.
+    """
+    results = []
+    for name, (sql, params, index) in HOT_QUERIES.items():
+        plan = explain_query(conn, sql, params)
+        uses_index = any(f"INDEX {index} " in f"{detail} " for detail in plan)
+        sorts = any("USE TEMP B-TREE" in detail for detail in plan)
+        results.append((name, uses_index and not sorts, plan))
+    return results
\ No newline at end of file
@@ -0,0 +1,167 @@
+"""Snapshots and consistency checks over the ActivityEvents log.
+
+Every change to a user's XP is an event (see migration 10): activity logs,
+corrections and voids come from triggers on ActivityLog, and adjustments
+from imports and manual XP changes. A UserSnapshots row is a user's state
+worked out from the events up to one event_id, so their current state is
+the latest snapshot plus the few events after it, a bounded read however
+long the history is. take_snapshots rolls each user forward from their
+previous snapshot, touching only the events since.
+
+check_consistency compares that event-derived state with what the rest of
+the database holds (Users.total_xp and the DailyXP rollup), reading only
+events after each user's snapshot, and snapshots the users that agree.
+
+    python events.py check chores.db [--admin-id 1] [--repair]
+    python events.py snapshot chores.db
+"""
+import argparse
+import sqlite3
+import sys
+
+import db
+
+SNAPSHOT_EVERY = 200  # events since a user's last snapshot before take_snapshots makes a new one
+
+# Latest snapshot per user (zeros for users created after migration 10) and
+# the sums of the events after it. Users without events since are included.
+EVENT_STATE_SQL = """
+    SELECT u.user_id, u.admin_id,
+           COALESCE(s.event_id, 0), COALESCE(s.total_xp, 0) + COALESCE(e.xp, 0),
+           COALESCE(s.activity_xp, 0) + COALESCE(e.activity_xp, 0),
+           COALESCE(s.activity_count, 0) + COALESCE(e.activities, 0),
+           COALESCE(e.events, 0), COALESCE(e.last_event, s.event_id, 0)
+    FROM Users u
+    LEFT JOIN UserSnapshots s ON s.user_id = u.user_id
+        AND s.event_id = (SELECT MAX(event_id) FROM UserSnapshots WHERE user_id = u.user_id)
+    LEFT JOIN (
+        SELECT ev.user_id, SUM(ev.xp_change) AS xp,
+               SUM(CASE WHEN ev.kind IN ('log', 'correction', 'void') THEN ev.xp_change ELSE 0 END) AS activity_xp,
+               SUM(ev.activity_change) AS activities, COUNT(*) AS events, MAX(ev.event_id) AS last_event
+        FROM ActivityEvents ev
+        WHERE ev.user_id IN (SELECT user_id FROM Users WHERE {inner})
+          AND ev.event_id > COALESCE((SELECT MAX(event_id) FROM UserSnapshots WHERE user_id = ev.user_id), 0)
+        GROUP BY ev.user_id
+    ) e ON e.user_id = u.user_id
+    WHERE {outer}
+    """
+
+STATE_COLUMNS = ("user_id", "admin_id", "snapshot_event_id", "total_xp", "activity_xp", "activity_count",
+                 "events_since_snapshot", "last_event_id")
+
+
+def _filter(admin_id=None, user_id=None, alias=""):
+    if user_id is not None:
+        return f"{alias}user_id = ?", (user_id,)
+    if admin_id is not None:
+        return f"{alias}admin_id = ?", (admin_id,)
+    return "1", ()
+
+
+def event_states(conn, admin_id=None, user_id=None):
+    """Event-derived state dicts (see STATE_COLUMNS) for one user, one admin's users or everyone."""
+    inner, params = _filter(admin_id, user_id)
+    outer, _ = _filter(admin_id, user_id, "u.")
+    rows = conn.execute(EVENT_STATE_SQL.format(inner=inner, outer=outer), params * 2).fetchall()
+    return [dict(zip(STATE_COLUMNS, row)) for row in rows]
+
+
+def get_user_state(conn, user_id):
+    """A user's XP and activity count from their latest snapshot and the events since, or None."""
+    states = event_states(conn, user_id=user_id)
+    return states[0] if states else None
+
+
+def _write_snapshots(conn, states):
+    with conn:
+        conn.executemany("""
+            INSERT OR IGNORE INTO UserSnapshots (user_id, event_id, admin_id, total_xp, activity_xp, activity_count)
+            VALUES (?, ?, ?, ?, ?, ?)""",
+            [(s["user_id"], s["last_event_id"], s["admin_id"], s["total_xp"], s["activity_xp"], s["activity_count"])
+             for s in states])
+    return len(states)
+
+
+def take_snapshots(conn, admin_id=None, min_events=SNAPSHOT_EVERY):
+    """Snapshot every user with at least min_events events since their last snapshot. Returns how many."""
+    return _write_snapshots(conn, [s for s in event_states(conn, admin_id) if s["events_since_snapshot"] >= max(min_events, 1)])
+
+
+ROLLUP_TOTALS_SQL = """
+    SELECT user_id, COALESCE(SUM(xp_earned + bonus_xp), 0), COALESCE(SUM(activity_count), 0)
+    FROM DailyXP WHERE {where} GROUP BY user_id
+    """
+
+
+def check_consistency(conn, admin_id=None, repair=False, snapshot=True):
+    """Compare event-derived state with Users.total_xp and DailyXP.
+
+    Returns a list of problem dicts (user_id, field, expected, actual); an
+    empty list means everything agrees. Users that agree are snapshotted so
+    the next check starts from here. With repair, total_xp is reset to the
+    event-derived value and levels are recomputed; rollup mismatches are
+    fixed with db.rebuild_rollups.
+    """
+    where, params = _filter(admin_id)
+    states = event_states(conn, admin_id)
+    totals = dict(conn.execute(f"SELECT user_id, COALESCE(total_xp, 0) FROM Users WHERE {where}", params).fetchall())
+    rollups = {row[0]: row[1:] for row in conn.execute(ROLLUP_TOTALS_SQL.format(where=where), params)}
+    problems, consistent = [], []
+    for state in states:
+        user_id = state["user_id"]
+        actual_xp, actual_count = rollups.get(user_id, (0, 0))
+        found = [(field, expected, actual) for field, expected, actual in (
+            ("total_xp", state["total_xp"], totals.get(user_id, 0)),
+            ("activity_xp", state["activity_xp"], actual_xp),
+            ("activity_count", state["activity_count"], actual_count),
+        ) if expected != actual]
+        problems.extend({"user_id": user_id, "admin_id": state["admin_id"], "field": field, "expected": expected,
+                         "actual": actual} for field, expected, actual in found)
+        if not found and state["events_since_snapshot"]:
+            consistent.append(state)
+    if snapshot:
+        _write_snapshots(conn, consistent)
+    if repair and problems:
+        drifted = [p for p in problems if p["field"] == "total_xp"]
+        with conn:
+            conn.executemany("UPDATE Users SET total_xp = ? WHERE user_id = ?", [(p["expected"], p["user_id"]) for p in drifted])
+        for owner in {p["admin_id"] for p in drifted}:
+            db.recompute_levels(conn, owner, [p["user_id"] for p in drifted if p["admin_id"] == owner])
+        for owner in {p["admin_id"] for p in problems if p["field"] != "total_xp"}:
+            db.rebuild_rollups(conn, owner)
+    return problems
+
+
+def get_activity_events(conn, activity_id):
+    """Every event recorded for one activity, oldest first."""
+    return conn.execute("""
+        SELECT event_id, kind, xp_change, data, reason, created_at FROM ActivityEvents
+        WHERE activity_id = ? ORDER BY event_id""", (activity_id,)).fetchall()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Snapshot and check the activity event log.")
+    parser.add_argument("command", choices=["check", "snapshot"])
+    parser.add_argument("db_file", nargs="?", default=db.DATABASE)
+    parser.add_argument("--admin-id", type=int)
+    parser.add_argument("--repair", action="store_true", help="reset drifted totals from the events (check only)")
+    parser.add_argument("--min-events", type=int, default=SNAPSHOT_EVERY)
+    args = parser.parse_args(argv[1:])
+
+    conn = sqlite3.connect(args.db_file)
+    db.create_tables(conn)
+    try:
+        if args.command == "snapshot":
+            print(f"Snapshotted {take_snapshots(conn, args.admin_id, args.min_events)} users")
+            return 0
+        problems = check_consistency(conn, args.admin_id, repair=args.repair)
+    finally:
+        conn.close()
+    for p in problems:
+        print(f"user {p['user_id']}: {p['field']} is {p['actual']}, events say {p['expected']}")
+    print(f"{len(problems)} problems" + (" (repaired)" if problems and args.repair else ""))
+    return 1 if problems and not args.repair else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
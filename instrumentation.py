@@ -0,0 +1,269 @@
+"""Query timing, slow-query logging and per-rerun profiles.
+
+Connections are only wrapped while instrumentation is on, so the disabled
+path costs one check per connection checkout:
+
+- ``CHORES_PROFILE=1`` instruments every connection and writes statements
+  slower than ``CHORES_SLOW_QUERY_MS`` (default 100) to
+  ``CHORES_SLOW_QUERY_LOG`` (default slow_queries.log).
+- ``streamlit_profiler()`` adds a sidebar toggle that profiles a single
+  session's rerun and shows the queries it issued and its render times.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+enabled = os.environ.get("CHORES_PROFILE", "") not in ("", "0")
+slow_query_ms = float(os.environ.get("CHORES_SLOW_QUERY_MS", 100))
+slow_query_log_file = os.environ.get("CHORES_SLOW_QUERY_LOG", "slow_queries.log")
+
+slow_query_log = logging.getLogger("chores.slow_queries")
+_local = threading.local()
+_log_lock = threading.Lock()
+_SKIP_FILES = (os.path.abspath(__file__), "contextlib.py")
+
+
+def configure(enable=None, slow_ms=None, log_file=None):
+    global enabled, slow_query_ms, slow_query_log_file
+    if enable is not None:
+        enabled = enable
+    if slow_ms is not None:
+        slow_query_ms = slow_ms
+    if log_file is not None:
+        slow_query_log_file = log_file
+
+
+class QueryRecord:
+    __slots__ = ("sql", "call_site", "ms", "rows", "logged")
+
+    def __init__(self, sql, call_site):
+        self.sql = " ".join(sql.split())
+        self.call_site = call_site
+        self.ms = 0.0
+        self.rows = 0
+        self.logged = False
+
+
+class Profile:
+    """Queries and named timings collected during one script run."""
+
+    def __init__(self):
+        self.queries = []
+        self.timings = {}
+
+    def summary(self):
+        by_statement = {}
+        for q in self.queries:
+            entry = by_statement.setdefault(q.sql, {"statement": q.sql[:120], "calls": 0, "total_ms": 0.0,
+                                                    "rows": 0, "call_site": q.call_site})
+            entry["calls"] += 1
+            entry["total_ms"] += q.ms
+            entry["rows"] += q.rows
+        statements = sorted(by_statement.values(), key=lambda e: e["total_ms"], reverse=True)
+        for entry in statements:
+            entry["total_ms"] = round(entry["total_ms"], 3)
+        return {
+            "queries": len(self.queries),
+            "db_ms": round(sum(q.ms for q in self.queries), 3),
+            "timings_ms": {name: round(ms, 3) for name, ms in self.timings.items()},
+            "statements": statements,
+        }
+
+
+def current_profile():
+    return getattr(_local, "profile", None)
+
+
+def is_active():
+    return enabled or getattr(_local, "profile", None) is not None
+
+
+@contextmanager
+def profile_rerun():
+    """Collect every instrumented query made on this thread into a Profile."""
+    profile = Profile()
+    previous = current_profile()
+    _local.profile = profile
+    try:
+        yield profile
+    finally:
+        _local.profile = previous
+
+
+@contextmanager
+def timed(name):
+    """Record how long the block took under name in the current profile."""
+    profile = current_profile()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.timings[name] = profile.timings.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def instrument(conn):
+    """Return conn wrapped for timing if instrumentation is on, else conn itself."""
+    if not is_active() or isinstance(conn, InstrumentedConnection):
+        return conn
+    return InstrumentedConnection(conn)
+
+
+def _call_site():
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_code.co_filename.endswith(_SKIP_FILES):
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+def _start(sql):
+    record = QueryRecord(sql, _call_site())
+    profile = current_profile()
+    if profile is not None:
+        profile.queries.append(record)
+    return record
+
+
+def _add(record, started, rows=0):
+    record.ms += (time.perf_counter() - started) * 1000
+    record.rows += rows
+    if record.ms >= slow_query_ms and not record.logged:
+        record.logged = True
+        _log_slow(record)
+
+
+def _log_slow(record):
+    with _log_lock:
+        if not slow_query_log.handlers and slow_query_log_file:
+            handler = logging.FileHandler(slow_query_log_file)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            slow_query_log.addHandler(handler)
+            slow_query_log.setLevel(logging.WARNING)
+            slow_query_log.propagate = False
+    slow_query_log.warning("%.1f ms rows=%d at %s: %s", record.ms, record.rows, record.call_site, record.sql)
+
+
+class InstrumentedCursor:
+    """Times execute and fetch calls on a sqlite3 cursor."""
+
+    def __init__(self, cursor, record=None):
+        self._cursor = cursor
+        self._record = record
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, sql, parameters=()):
+        self._record = _start(sql)
+        started = time.perf_counter()
+        self._cursor.execute(sql, parameters)
+        _add(self._record, started, max(self._cursor.rowcount, 0))
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._record = _start(sql)
+        started = time.perf_counter()
+        self._cursor.executemany(sql, seq_of_parameters)
+        _add(self._record, started, max(self._cursor.rowcount, 0))
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        if self._record is not None:
+            _add(self._record, started, 1 if row is not None else 0)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        if self._record is not None:
+            _add(self._record, started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        if self._record is not None:
+            _add(self._record, started, len(rows))
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+
+class InstrumentedConnection:
+    """Proxy for a sqlite3 connection whose statements are timed."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def cursor(self, *args):
+        return InstrumentedCursor(self._conn.cursor(*args))
+
+    def execute(self, sql, parameters=()):
+        return InstrumentedCursor(self._conn.cursor()).execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return InstrumentedCursor(self._conn.cursor()).executemany(sql, seq_of_parameters)
+
+    def executescript(self, script):
+        record = _start(script)
+        started = time.perf_counter()
+        cursor = self._conn.executescript(script)
+        _add(record, started)
+        return cursor
+
+
+@contextmanager
+def streamlit_profiler(label="Profile this page"):
+    """Sidebar toggle that profiles this rerun and shows the result.
+
+    Yields the Profile, or None when the toggle is off.
+    """
+    import streamlit as st
+
+    if not st.sidebar.toggle(label, value=enabled, key="profile_page"):
+        yield None
+        return
+    started = time.perf_counter()
+    with profile_rerun() as profile:
+        yield profile
+    profile.timings["script"] = (time.perf_counter() - started) * 1000
+    show_profile_panel(profile)
+
+
+def show_profile_panel(profile):
+    import pandas as pd
+    import streamlit as st
+
+    summary = profile.summary()
+    with st.sidebar.expander("Profile", expanded=True):
+        col1, col2 = st.columns(2)
+        col1.metric("Queries", summary["queries"])
+        col2.metric("DB Time", f"{summary['db_ms']:.1f} ms")
+        for name, ms in summary["timings_ms"].items():
+            st.caption(f"{name}: {ms:.1f} ms")
+        if summary["statements"]:
+            st.dataframe(pd.DataFrame(summary["statements"]), hide_index=True)
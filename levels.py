@@ -0,0 +1,68 @@
+"""Level lookups from an admin's Levels rows.
+
+A user has reached every level whose CumulativeXP is at or below their total
+XP, and their level is the highest of those (the same rule as
+``MAX(Level) ... WHERE CumulativeXP <= total_xp``). LevelIndex keeps the
+thresholds sorted so a lookup is a bisect, and the array methods level a
+whole column of XP totals in one call. numpy is only imported by the array
+methods, so building an index for single lookups stays cheap.
+"""
+from bisect import bisect_right
+from itertools import accumulate
+
+
+class LevelIndex:
+    __slots__ = ("rows", "thresholds", "level_numbers", "_np_thresholds", "_np_level_numbers")
+
+    def __init__(self, rows):
+        """rows are (Level, XPRequired, CumulativeXP, Reward) tuples as returned by db.get_levels."""
+        self.rows = tuple(rows)
+        pairs = sorted((cumulative, level) for level, _, cumulative, _ in self.rows if cumulative is not None)
+        self.thresholds = [cumulative for cumulative, _ in pairs]
+        # level_numbers[i] is the level held after reaching the first i thresholds
+        self.level_numbers = list(accumulate([0] + [level for _, level in pairs], max))
+        self._np_thresholds = self._np_level_numbers = None
+
+    def level_for(self, total_xp):
+        return self.level_numbers[bisect_right(self.thresholds, total_xp or 0)]
+
+    def progress(self, total_xp):
+        """Return (level, XP at the start of the level, XP for the next level or None, progress 0-1)."""
+        total_xp = total_xp or 0
+        reached = bisect_right(self.thresholds, total_xp)
+        floor = self.thresholds[reached - 1] if reached else 0
+        ceiling = self.thresholds[reached] if reached < len(self.thresholds) else None
+        if ceiling is None or ceiling == floor:
+            progress = 1.0
+        else:
+            progress = min(max((total_xp - floor) / (ceiling - floor), 0.0), 1.0)
+        return self.level_numbers[reached], floor, ceiling, progress
+
+    def _arrays(self):
+        import numpy as np
+        if self._np_thresholds is None:
+            self._np_thresholds = np.array(self.thresholds, dtype=float)
+            self._np_level_numbers = np.array(self.level_numbers)
+        return np
+
+    def levels_for(self, totals):
+        """Vectorized level_for over an array of XP totals."""
+        np = self._arrays()
+        totals = np.nan_to_num(np.asarray(totals, dtype=float))
+        return self._np_level_numbers[np.searchsorted(self._np_thresholds, totals, side="right")]
+
+    def progress_for(self, totals):
+        """Vectorized progress over an array of XP totals.
+
+        Returns (levels, floors, ceilings, progress) arrays; ceilings are NaN
+        at the top level.
+        """
+        np = self._arrays()
+        totals = np.nan_to_num(np.asarray(totals, dtype=float))
+        reached = np.searchsorted(self._np_thresholds, totals, side="right")
+        floors = np.concatenate(([0.0], self._np_thresholds))[reached]
+        ceilings = np.concatenate((self._np_thresholds, [np.nan]))[reached]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            progress = (totals - floors) / (ceilings - floors)
+        progress = np.clip(np.nan_to_num(progress, nan=1.0, posinf=1.0, neginf=0.0), 0.0, 1.0)
+        return self._np_level_numbers[reached], floors, ceilings, progress
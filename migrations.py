@@ -0,0 +1,679 @@
+"""Versioned schema migrations for the chore tracker database.
+
+The schema version is stored in SQLite's ``PRAGMA user_version``. Each
+migration runs in its own transaction together with the version bump, so an
+existing chores.db is upgraded in place and a failed step leaves the file at
+the previous version.
+
+Run ``python migrations.py [db_file]`` to upgrade a database by hand and
+print the query plans of the hot queries in db.py. Add ``--rebuild-rollups``
+to recompute the DailyXP rollup table from ActivityLog.
+"""
+import argparse
+import sqlite3
+import sys
+
+
+def _change_feed_triggers(table, entity, key, update_when="", delete_when=""):
+    """Migration 11's triggers for one synced table: stamp inserted and updated
+    rows with the next change sequence number, and leave a tombstone for
+    deletes. The stamping UPDATE changes change_seq, so it does not stamp again."""
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{entity}_change_insert
+        AFTER INSERT ON {table}
+        BEGIN
+            UPDATE ChangeSequence SET seq = seq + 1;
+            UPDATE {table} SET change_seq = (SELECT seq FROM ChangeSequence) WHERE rowid = NEW.rowid;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_{entity}_change_update
+        AFTER UPDATE ON {table}
+        WHEN NEW.change_seq IS OLD.change_seq{update_when}
+        BEGIN
+            UPDATE ChangeSequence SET seq = seq + 1;
+            UPDATE {table} SET change_seq = (SELECT seq FROM ChangeSequence) WHERE rowid = NEW.rowid;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_{entity}_change_delete
+        AFTER DELETE ON {table}
+        {"WHEN " + delete_when if delete_when else ""}
+        BEGIN
+            UPDATE ChangeSequence SET seq = seq + 1;
+            INSERT INTO ChangeTombstones (seq, admin_id, entity, row_id)
+            VALUES ((SELECT seq FROM ChangeSequence), OLD.admin_id, '{entity}', OLD.{key});
+        END;
+    """
+
+
+MIGRATIONS = [
+    (1, "Base schema", """
+        CREATE TABLE IF NOT EXISTS admin (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS Users (
+            user_id INTEGER PRIMARY KEY,
+            admin_id INTEGER,
+            name TEXT NOT NULL,
+            current_level INTEGER DEFAULT 0,
+            total_xp INTEGER DEFAULT 0,
+            FOREIGN KEY (admin_id) REFERENCES admin(id)
+        );
+        CREATE TABLE IF NOT EXISTS Tasks (
+            task_id INTEGER PRIMARY KEY,
+            admin_id INTEGER,
+            task_name TEXT NOT NULL,
+            base_xp INTEGER NOT NULL,
+            time_multiplier REAL NOT NULL,
+            FOREIGN KEY (admin_id) REFERENCES admin(id)
+        );
+        CREATE TABLE IF NOT EXISTS ActivityLog (
+            activity_id INTEGER PRIMARY KEY,
+            admin_id INTEGER,
+            user_id INTEGER,
+            task_id INTEGER,
+            date TEXT NOT NULL,
+            time_spent INTEGER,
+            xp_earned INTEGER,
+            bonus_xp INTEGER DEFAULT 0,
+            small_reward TEXT,
+            FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE,
+            FOREIGN KEY (task_id) REFERENCES Tasks(task_id),
+            FOREIGN KEY (admin_id) REFERENCES admin(id) ON DELETE CASCADE
+        );
+        CREATE TABLE IF NOT EXISTS "Levels" (
+            Level INTEGER,
+            admin_id INTEGER,
+            XPRequired INTEGER,
+            CumulativeXP INTEGER,
+            Reward TEXT,
+            PRIMARY KEY (Level, admin_id),
+            FOREIGN KEY (admin_id) REFERENCES admin(id)
+        );
+        CREATE TABLE IF NOT EXISTS SmallRewards (
+            reward_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            reward TEXT NOT NULL
+        );
+    """),
+    (2, "Indexes for per-admin and per-user lookups", """
+        CREATE INDEX IF NOT EXISTS idx_activitylog_admin_user_date
+            ON ActivityLog (admin_id, user_id, date);
+        CREATE INDEX IF NOT EXISTS idx_users_admin ON Users (admin_id);
+        CREATE INDEX IF NOT EXISTS idx_tasks_admin ON Tasks (admin_id);
+        CREATE INDEX IF NOT EXISTS idx_levels_admin_cumulative
+            ON Levels (admin_id, CumulativeXP);
+    """),
+    (3, "Per-user/per-day/per-task XP rollup kept current by triggers", """
+        CREATE TABLE IF NOT EXISTS DailyXP (
+            admin_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            task_id INTEGER NOT NULL,
+            activity_count INTEGER NOT NULL DEFAULT 0,
+            time_spent INTEGER NOT NULL DEFAULT 0,
+            xp_earned INTEGER NOT NULL DEFAULT 0,
+            bonus_xp INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (admin_id, user_id, date, task_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_dailyxp_admin_date ON DailyXP (admin_id, date);
+
+        CREATE TRIGGER IF NOT EXISTS trg_activitylog_rollup_insert
+        AFTER INSERT ON ActivityLog
+        WHEN NEW.admin_id IS NOT NULL AND NEW.user_id IS NOT NULL AND NEW.task_id IS NOT NULL
+        BEGIN
+            INSERT INTO DailyXP (admin_id, user_id, date, task_id, activity_count, time_spent, xp_earned, bonus_xp)
+            VALUES (NEW.admin_id, NEW.user_id, NEW.date, NEW.task_id, 1,
+                    COALESCE(NEW.time_spent, 0), COALESCE(NEW.xp_earned, 0), COALESCE(NEW.bonus_xp, 0))
+            ON CONFLICT (admin_id, user_id, date, task_id) DO UPDATE SET
+                activity_count = activity_count + 1,
+                time_spent = time_spent + excluded.time_spent,
+                xp_earned = xp_earned + excluded.xp_earned,
+                bonus_xp = bonus_xp + excluded.bonus_xp;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_activitylog_rollup_delete
+        AFTER DELETE ON ActivityLog
+        BEGIN
+            UPDATE DailyXP SET
+                activity_count = activity_count - 1,
+                time_spent = time_spent - COALESCE(OLD.time_spent, 0),
+                xp_earned = xp_earned - COALESCE(OLD.xp_earned, 0),
+                bonus_xp = bonus_xp - COALESCE(OLD.bonus_xp, 0)
+            WHERE admin_id = OLD.admin_id AND user_id = OLD.user_id AND date = OLD.date AND task_id = OLD.task_id;
+            DELETE FROM DailyXP
+            WHERE admin_id = OLD.admin_id AND user_id = OLD.user_id AND date = OLD.date AND task_id = OLD.task_id
+              AND activity_count <= 0;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_activitylog_rollup_update
+        AFTER UPDATE OF admin_id, user_id, task_id, date, time_spent, xp_earned, bonus_xp ON ActivityLog
+        BEGIN
+            UPDATE DailyXP SET
+                activity_count = activity_count - 1,
+                time_spent = time_spent - COALESCE(OLD.time_spent, 0),
+                xp_earned = xp_earned - COALESCE(OLD.xp_earned, 0),
+                bonus_xp = bonus_xp - COALESCE(OLD.bonus_xp, 0)
+            WHERE admin_id = OLD.admin_id AND user_id = OLD.user_id AND date = OLD.date AND task_id = OLD.task_id;
+            DELETE FROM DailyXP
+            WHERE admin_id = OLD.admin_id AND user_id = OLD.user_id AND date = OLD.date AND task_id = OLD.task_id
+              AND activity_count <= 0;
+            INSERT INTO DailyXP (admin_id, user_id, date, task_id, activity_count, time_spent, xp_earned, bonus_xp)
+            SELECT NEW.admin_id, NEW.user_id, NEW.date, NEW.task_id, 1,
+                   COALESCE(NEW.time_spent, 0), COALESCE(NEW.xp_earned, 0), COALESCE(NEW.bonus_xp, 0)
+            WHERE NEW.admin_id IS NOT NULL AND NEW.user_id IS NOT NULL AND NEW.task_id IS NOT NULL
+            ON CONFLICT (admin_id, user_id, date, task_id) DO UPDATE SET
+                activity_count = activity_count + 1,
+                time_spent = time_spent + excluded.time_spent,
+                xp_earned = xp_earned + excluded.xp_earned,
+                bonus_xp = bonus_xp + excluded.bonus_xp;
+        END;
+
+        DELETE FROM DailyXP;
+        INSERT INTO DailyXP (admin_id, user_id, date, task_id, activity_count, time_spent, xp_earned, bonus_xp)
+        SELECT admin_id, user_id, date, task_id, COUNT(*),
+               COALESCE(SUM(time_spent), 0), COALESCE(SUM(xp_earned), 0), COALESCE(SUM(bonus_xp), 0)
+        FROM ActivityLog
+        WHERE admin_id IS NOT NULL AND user_id IS NOT NULL AND task_id IS NOT NULL
+        GROUP BY admin_id, user_id, date, task_id;
+    """),
+    (4, "Archived ActivityLog partitions and their rollup totals", """
+        CREATE TABLE IF NOT EXISTS ActivityArchive (
+            archive_id INTEGER PRIMARY KEY,
+            admin_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            path TEXT NOT NULL,
+            first_date TEXT NOT NULL,
+            last_date TEXT NOT NULL,
+            max_activity_id INTEGER NOT NULL,
+            row_count INTEGER NOT NULL,
+            xp_earned INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_activityarchive_admin_date ON ActivityArchive (admin_id, last_date);
+
+        -- Rollup totals of archived rows, so rebuild_rollups stays correct
+        -- without reading the archive files.
+        CREATE TABLE IF NOT EXISTS ArchivedDailyXP (
+            admin_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            task_id INTEGER NOT NULL,
+            activity_count INTEGER NOT NULL DEFAULT 0,
+            time_spent INTEGER NOT NULL DEFAULT 0,
+            xp_earned INTEGER NOT NULL DEFAULT 0,
+            bonus_xp INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (admin_id, user_id, date, task_id)
+        ) WITHOUT ROWID;
+
+        -- Holds a row only inside an archiving transaction, so moving rows
+        -- out of ActivityLog leaves DailyXP alone.
+        CREATE TABLE IF NOT EXISTS ArchiveInProgress (locked INTEGER PRIMARY KEY);
+
+        DROP TRIGGER IF EXISTS trg_activitylog_rollup_delete;
+        CREATE TRIGGER trg_activitylog_rollup_delete
+        AFTER DELETE ON ActivityLog
+        WHEN NOT EXISTS (SELECT 1 FROM ArchiveInProgress)
+        BEGIN
+            UPDATE DailyXP SET
+                activity_count = activity_count - 1,
+                time_spent = time_spent - COALESCE(OLD.time_spent, 0),
+                xp_earned = xp_earned - COALESCE(OLD.xp_earned, 0),
+                bonus_xp = bonus_xp - COALESCE(OLD.bonus_xp, 0)
+            WHERE admin_id = OLD.admin_id AND user_id = OLD.user_id AND date = OLD.date AND task_id = OLD.task_id;
+            DELETE FROM DailyXP
+            WHERE admin_id = OLD.admin_id AND user_id = OLD.user_id AND date = OLD.date AND task_id = OLD.task_id
+              AND activity_count <= 0;
+        END;
+    """),
+    (5, "Content hashes of imported files", """
+        CREATE TABLE IF NOT EXISTS ImportLog (
+            import_id INTEGER PRIMARY KEY,
+            admin_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            filename TEXT,
+            summary TEXT NOT NULL,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (admin_id, kind, content_hash)
+        );
+    """),
+    (6, "Per-admin weighted small rewards with daily caps", """
+        -- admin_id NULL marks the shared pool used by admins without rewards of their own.
+        ALTER TABLE SmallRewards ADD COLUMN admin_id INTEGER REFERENCES admin(id);
+        ALTER TABLE SmallRewards ADD COLUMN weight REAL NOT NULL DEFAULT 1.0;
+        ALTER TABLE SmallRewards ADD COLUMN tier TEXT;
+        ALTER TABLE SmallRewards ADD COLUMN daily_cap INTEGER;
+        CREATE INDEX IF NOT EXISTS idx_smallrewards_admin ON SmallRewards (admin_id);
+
+        -- How often each capped reward was given to each user per day.
+        CREATE TABLE IF NOT EXISTS RewardGrants (
+            admin_id INTEGER NOT NULL,
+            reward_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            granted INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (admin_id, reward_id, user_id, date)
+        ) WITHOUT ROWID;
+    """),
+    (7, "Materialized weekly and all-time leaderboards", """
+        ALTER TABLE admin ADD COLUMN share_leaderboard INTEGER NOT NULL DEFAULT 0;
+
+        -- board 'weekly' keys period by the week's Monday; 'all_time' uses ''.
+        CREATE TABLE IF NOT EXISTS LeaderboardScores (
+            board TEXT NOT NULL,
+            period TEXT NOT NULL,
+            admin_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            score INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (board, period, admin_id, user_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_leaderboard_household ON LeaderboardScores (board, period, admin_id, score DESC);
+        CREATE INDEX IF NOT EXISTS idx_leaderboard_global ON LeaderboardScores (board, period, score DESC);
+
+        CREATE TRIGGER IF NOT EXISTS trg_activitylog_leaderboard_insert
+        AFTER INSERT ON ActivityLog
+        WHEN NEW.admin_id IS NOT NULL AND NEW.user_id IS NOT NULL
+        BEGIN
+            INSERT INTO LeaderboardScores (board, period, admin_id, user_id, score)
+            VALUES ('weekly', date(NEW.date, '-6 days', 'weekday 1'), NEW.admin_id, NEW.user_id,
+                    COALESCE(NEW.xp_earned, 0) + COALESCE(NEW.bonus_xp, 0))
+            ON CONFLICT (board, period, admin_id, user_id) DO UPDATE SET score = score + excluded.score;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_activitylog_leaderboard_delete
+        AFTER DELETE ON ActivityLog
+        WHEN NOT EXISTS (SELECT 1 FROM ArchiveInProgress)
+        BEGIN
+            UPDATE LeaderboardScores SET score = score - COALESCE(OLD.xp_earned, 0) - COALESCE(OLD.bonus_xp, 0)
+            WHERE board = 'weekly' AND period = date(OLD.date, '-6 days', 'weekday 1')
+              AND admin_id = OLD.admin_id AND user_id = OLD.user_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_activitylog_leaderboard_update
+        AFTER UPDATE OF admin_id, user_id, date, xp_earned, bonus_xp ON ActivityLog
+        BEGIN
+            UPDATE LeaderboardScores SET score = score - COALESCE(OLD.xp_earned, 0) - COALESCE(OLD.bonus_xp, 0)
+            WHERE board = 'weekly' AND period = date(OLD.date, '-6 days', 'weekday 1')
+              AND admin_id = OLD.admin_id AND user_id = OLD.user_id;
+            INSERT INTO LeaderboardScores (board, period, admin_id, user_id, score)
+            SELECT 'weekly', date(NEW.date, '-6 days', 'weekday 1'), NEW.admin_id, NEW.user_id,
+                   COALESCE(NEW.xp_earned, 0) + COALESCE(NEW.bonus_xp, 0)
+            WHERE NEW.admin_id IS NOT NULL AND NEW.user_id IS NOT NULL
+            ON CONFLICT (board, period, admin_id, user_id) DO UPDATE SET score = score + excluded.score;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_users_leaderboard_insert
+        AFTER INSERT ON Users
+        WHEN NEW.admin_id IS NOT NULL
+        BEGIN
+            INSERT OR REPLACE INTO LeaderboardScores (board, period, admin_id, user_id, score)
+            VALUES ('all_time', '', NEW.admin_id, NEW.user_id, COALESCE(NEW.total_xp, 0));
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_users_leaderboard_update
+        AFTER UPDATE OF admin_id, total_xp ON Users
+        BEGIN
+            UPDATE LeaderboardScores SET admin_id = NEW.admin_id, score = COALESCE(NEW.total_xp, 0)
+            WHERE board = 'all_time' AND period = '' AND admin_id IS OLD.admin_id AND user_id = OLD.user_id
+              AND NEW.admin_id IS NOT NULL;
+            INSERT OR IGNORE INTO LeaderboardScores (board, period, admin_id, user_id, score)
+            SELECT 'all_time', '', NEW.admin_id, NEW.user_id, COALESCE(NEW.total_xp, 0)
+            WHERE NEW.admin_id IS NOT NULL;
+            DELETE FROM LeaderboardScores
+            WHERE board = 'all_time' AND admin_id IS OLD.admin_id AND user_id = OLD.user_id AND NEW.admin_id IS NULL;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_users_leaderboard_delete
+        AFTER DELETE ON Users
+        BEGIN
+            DELETE FROM LeaderboardScores WHERE admin_id IS OLD.admin_id AND user_id = OLD.user_id;
+        END;
+
+        INSERT INTO LeaderboardScores (board, period, admin_id, user_id, score)
+        SELECT 'weekly', date(date, '-6 days', 'weekday 1') AS week, admin_id, user_id, SUM(xp_earned + bonus_xp)
+        FROM DailyXP GROUP BY week, admin_id, user_id;
+        INSERT INTO LeaderboardScores (board, period, admin_id, user_id, score)
+        SELECT 'all_time', '', admin_id, user_id, COALESCE(total_xp, 0) FROM Users WHERE admin_id IS NOT NULL;
+    """),
+    (8, "Recurring chore schedules", """
+        -- user_id NULL schedules the task for every child of the admin.
+        -- weekdays is a bitmask with Monday = 1 (weekly schedules only).
+        CREATE TABLE IF NOT EXISTS Schedules (
+            schedule_id INTEGER PRIMARY KEY,
+            admin_id INTEGER NOT NULL,
+            task_id INTEGER NOT NULL,
+            user_id INTEGER,
+            frequency TEXT NOT NULL CHECK (frequency IN ('daily', 'weekly', 'monthly')),
+            every INTEGER NOT NULL DEFAULT 1 CHECK (every >= 1),
+            weekdays INTEGER,
+            day_of_month INTEGER,
+            start_date TEXT NOT NULL,
+            end_date TEXT,
+            FOREIGN KEY (admin_id) REFERENCES admin(id),
+            FOREIGN KEY (task_id) REFERENCES Tasks(task_id),
+            FOREIGN KEY (user_id) REFERENCES Users(user_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_schedules_admin ON Schedules (admin_id);
+
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_schedules_delete
+        AFTER DELETE ON Tasks
+        BEGIN
+            DELETE FROM Schedules WHERE task_id = OLD.task_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_users_schedules_delete
+        AFTER DELETE ON Users
+        BEGIN
+            DELETE FROM Schedules WHERE user_id = OLD.user_id;
+        END;
+    """),
+    (9, "Versioned XP rules", """
+        -- The xp_rules.py version that scored each activity; NULL is base XP from before rules were versioned.
+        ALTER TABLE ActivityLog ADD COLUMN xp_rule INTEGER;
+        -- The version new activities are scored with.
+        ALTER TABLE admin ADD COLUMN xp_rule INTEGER NOT NULL DEFAULT 1;
+
+        -- Holds a row only while db.recompute_xp rescores an admin, which
+        -- adjusts DailyXP and the leaderboards in bulk instead of per row.
+        CREATE TABLE IF NOT EXISTS XPRescoreInProgress (locked INTEGER PRIMARY KEY);
+
+        DROP TRIGGER IF EXISTS trg_activitylog_rollup_update;
+        CREATE TRIGGER trg_activitylog_rollup_update
+        AFTER UPDATE OF admin_id, user_id, task_id, date, time_spent, xp_earned, bonus_xp ON ActivityLog
+        WHEN NOT EXISTS (SELECT 1 FROM XPRescoreInProgress)
+        BEGIN
+            UPDATE DailyXP SET
+                activity_count = activity_count - 1,
+                time_spent = time_spent - COALESCE(OLD.time_spent, 0),
+                xp_earned = xp_earned - COALESCE(OLD.xp_earned, 0),
+                bonus_xp = bonus_xp - COALESCE(OLD.bonus_xp, 0)
+            WHERE admin_id = OLD.admin_id AND user_id = OLD.user_id AND date = OLD.date AND task_id = OLD.task_id;
+            DELETE FROM DailyXP
+            WHERE admin_id = OLD.admin_id AND user_id = OLD.user_id AND date = OLD.date AND task_id = OLD.task_id
+              AND activity_count <= 0;
+            INSERT INTO DailyXP (admin_id, user_id, date, task_id, activity_count, time_spent, xp_earned, bonus_xp)
+            SELECT NEW.admin_id, NEW.user_id, NEW.date, NEW.task_id, 1,
+                   COALESCE(NEW.time_spent, 0), COALESCE(NEW.xp_earned, 0), COALESCE(NEW.bonus_xp, 0)
+            WHERE NEW.admin_id IS NOT NULL AND NEW.user_id IS NOT NULL AND NEW.task_id IS NOT NULL
+            ON CONFLICT (admin_id, user_id, date, task_id) DO UPDATE SET
+                activity_count = activity_count + 1,
+                time_spent = time_spent + excluded.time_spent,
+                xp_earned = xp_earned + excluded.xp_earned,
+                bonus_xp = bonus_xp + excluded.bonus_xp;
+        END;
+
+        DROP TRIGGER IF EXISTS trg_activitylog_leaderboard_update;
+        CREATE TRIGGER trg_activitylog_leaderboard_update
+        AFTER UPDATE OF admin_id, user_id, date, xp_earned, bonus_xp ON ActivityLog
+        WHEN NOT EXISTS (SELECT 1 FROM XPRescoreInProgress)
+        BEGIN
+            UPDATE LeaderboardScores SET score = score - COALESCE(OLD.xp_earned, 0) - COALESCE(OLD.bonus_xp, 0)
+            WHERE board = 'weekly' AND period = date(OLD.date, '-6 days', 'weekday 1')
+              AND admin_id = OLD.admin_id AND user_id = OLD.user_id;
+            INSERT INTO LeaderboardScores (board, period, admin_id, user_id, score)
+            SELECT 'weekly', date(NEW.date, '-6 days', 'weekday 1'), NEW.admin_id, NEW.user_id,
+                   COALESCE(NEW.xp_earned, 0) + COALESCE(NEW.bonus_xp, 0)
+            WHERE NEW.admin_id IS NOT NULL AND NEW.user_id IS NOT NULL
+            ON CONFLICT (board, period, admin_id, user_id) DO UPDATE SET score = score + excluded.score;
+        END;
+    """),
+    (10, "Append-only activity events and per-user snapshots", """
+        -- Every change to an activity, a task or a user's XP, in order. kind is
+        -- 'log', 'correction' or 'void' for activities, 'task_change' for Tasks
+        -- and 'adjustment' for XP given outside activities. xp_change and
+        -- activity_change are the event's effect on the user.
+        CREATE TABLE IF NOT EXISTS ActivityEvents (
+            event_id INTEGER PRIMARY KEY,
+            admin_id INTEGER,
+            user_id INTEGER,
+            activity_id INTEGER,
+            kind TEXT NOT NULL CHECK (kind IN ('log', 'correction', 'void', 'task_change', 'adjustment')),
+            xp_change INTEGER NOT NULL DEFAULT 0,
+            activity_change INTEGER NOT NULL DEFAULT 0,
+            data TEXT,
+            reason TEXT,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_activityevents_user ON ActivityEvents (user_id, event_id);
+        CREATE INDEX IF NOT EXISTS idx_activityevents_activity ON ActivityEvents (activity_id);
+
+        CREATE TRIGGER IF NOT EXISTS trg_activityevents_append_only
+        BEFORE UPDATE ON ActivityEvents
+        BEGIN
+            SELECT RAISE(ABORT, 'ActivityEvents is append-only');
+        END;
+
+        -- A user's state as of event_id, derived from the events alone.
+        CREATE TABLE IF NOT EXISTS UserSnapshots (
+            user_id INTEGER NOT NULL,
+            event_id INTEGER NOT NULL,
+            admin_id INTEGER,
+            total_xp INTEGER NOT NULL,
+            activity_xp INTEGER NOT NULL,
+            activity_count INTEGER NOT NULL,
+            taken_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, event_id)
+        ) WITHOUT ROWID;
+
+        -- Holds the reason for a correction or void while it is written.
+        CREATE TABLE IF NOT EXISTS EventContext (reason TEXT);
+
+        CREATE TRIGGER IF NOT EXISTS trg_activitylog_event_insert
+        AFTER INSERT ON ActivityLog
+        BEGIN
+            INSERT INTO ActivityEvents (admin_id, user_id, activity_id, kind, xp_change, activity_change, reason)
+            VALUES (NEW.admin_id, NEW.user_id, NEW.activity_id, 'log',
+                    COALESCE(NEW.xp_earned, 0) + COALESCE(NEW.bonus_xp, 0), 1, (SELECT reason FROM EventContext));
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_activitylog_event_update
+        AFTER UPDATE OF user_id, task_id, date, time_spent, xp_earned, bonus_xp ON ActivityLog
+        WHEN NOT EXISTS (SELECT 1 FROM XPRescoreInProgress)
+        BEGIN
+            -- moving an activity to another user takes it off the old user's total
+            INSERT INTO ActivityEvents (admin_id, user_id, activity_id, kind, xp_change, activity_change, data, reason)
+            SELECT OLD.admin_id, OLD.user_id, OLD.activity_id, 'correction',
+                   CASE WHEN OLD.user_id IS NEW.user_id
+                        THEN COALESCE(NEW.xp_earned, 0) + COALESCE(NEW.bonus_xp, 0) ELSE 0 END
+                       - COALESCE(OLD.xp_earned, 0) - COALESCE(OLD.bonus_xp, 0),
+                   CASE WHEN OLD.user_id IS NEW.user_id THEN 0 ELSE -1 END,
+                   json_object('old', json_object('user_id', OLD.user_id, 'task_id', OLD.task_id, 'date', OLD.date,
+                                                  'time_spent', OLD.time_spent, 'xp_earned', OLD.xp_earned, 'bonus_xp', OLD.bonus_xp),
+                               'new', json_object('user_id', NEW.user_id, 'task_id', NEW.task_id, 'date', NEW.date,
+                                                  'time_spent', NEW.time_spent, 'xp_earned', NEW.xp_earned, 'bonus_xp', NEW.bonus_xp)),
+                   (SELECT reason FROM EventContext);
+            INSERT INTO ActivityEvents (admin_id, user_id, activity_id, kind, xp_change, activity_change, reason)
+            SELECT NEW.admin_id, NEW.user_id, NEW.activity_id, 'correction',
+                   COALESCE(NEW.xp_earned, 0) + COALESCE(NEW.bonus_xp, 0), 1, (SELECT reason FROM EventContext)
+            WHERE OLD.user_id IS NOT NEW.user_id;
+        END;
+
+        -- Archiving moves rows out of ActivityLog without voiding them.
+        CREATE TRIGGER IF NOT EXISTS trg_activitylog_event_delete
+        AFTER DELETE ON ActivityLog
+        WHEN NOT EXISTS (SELECT 1 FROM ArchiveInProgress)
+        BEGIN
+            INSERT INTO ActivityEvents (admin_id, user_id, activity_id, kind, xp_change, activity_change, data, reason)
+            VALUES (OLD.admin_id, OLD.user_id, OLD.activity_id, 'void',
+                    -COALESCE(OLD.xp_earned, 0) - COALESCE(OLD.bonus_xp, 0), -1,
+                    json_object('task_id', OLD.task_id, 'date', OLD.date, 'time_spent', OLD.time_spent,
+                                'xp_earned', OLD.xp_earned, 'bonus_xp', OLD.bonus_xp, 'small_reward', OLD.small_reward),
+                    (SELECT reason FROM EventContext));
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_event_insert
+        AFTER INSERT ON Tasks
+        BEGIN
+            INSERT INTO ActivityEvents (admin_id, kind, data)
+            VALUES (NEW.admin_id, 'task_change', json_object('task_id', NEW.task_id, 'old', NULL,
+                    'new', json_object('task_name', NEW.task_name, 'base_xp', NEW.base_xp, 'time_multiplier', NEW.time_multiplier)));
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_event_update
+        AFTER UPDATE OF task_name, base_xp, time_multiplier ON Tasks
+        BEGIN
+            INSERT INTO ActivityEvents (admin_id, kind, data)
+            VALUES (NEW.admin_id, 'task_change', json_object('task_id', NEW.task_id,
+                    'old', json_object('task_name', OLD.task_name, 'base_xp', OLD.base_xp, 'time_multiplier', OLD.time_multiplier),
+                    'new', json_object('task_name', NEW.task_name, 'base_xp', NEW.base_xp, 'time_multiplier', NEW.time_multiplier)));
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_event_delete
+        AFTER DELETE ON Tasks
+        BEGIN
+            INSERT INTO ActivityEvents (admin_id, kind, data)
+            VALUES (OLD.admin_id, 'task_change', json_object('task_id', OLD.task_id,
+                    'old', json_object('task_name', OLD.task_name, 'base_xp', OLD.base_xp, 'time_multiplier', OLD.time_multiplier),
+                    'new', NULL));
+        END;
+
+        -- A user created with XP (e.g. by an import) opens with an adjustment.
+        CREATE TRIGGER IF NOT EXISTS trg_users_event_insert
+        AFTER INSERT ON Users
+        WHEN COALESCE(NEW.total_xp, 0) <> 0
+        BEGIN
+            INSERT INTO ActivityEvents (admin_id, user_id, kind, xp_change, reason)
+            VALUES (NEW.admin_id, NEW.user_id, 'adjustment', NEW.total_xp, 'opening balance');
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_users_snapshots_delete
+        AFTER DELETE ON Users
+        BEGIN
+            DELETE FROM UserSnapshots WHERE user_id = OLD.user_id;
+        END;
+
+        -- Existing users start from a snapshot of what they have now.
+        INSERT INTO UserSnapshots (user_id, event_id, admin_id, total_xp, activity_xp, activity_count)
+        SELECT u.user_id, 0, u.admin_id, COALESCE(u.total_xp, 0),
+               COALESCE((SELECT SUM(xp_earned + bonus_xp) FROM DailyXP d WHERE d.admin_id = u.admin_id AND d.user_id = u.user_id), 0),
+               COALESCE((SELECT SUM(activity_count) FROM DailyXP d WHERE d.admin_id = u.admin_id AND d.user_id = u.user_id), 0)
+        FROM Users u;
+    """),
+    (11, "Change sequence and tombstones for the sync feed", """
+        -- One counter for the database. It is bumped inside the writing
+        -- transaction and SQLite has a single writer, so sequence numbers
+        -- become visible in order.
+        CREATE TABLE IF NOT EXISTS ChangeSequence (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            seq INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO ChangeSequence (id, seq) VALUES (1, 0);
+
+        -- Kept for good: only real deletes write one (archiving and XP
+        -- rescoring do not), so the table grows with deletes, not with logs.
+        CREATE TABLE IF NOT EXISTS ChangeTombstones (
+            seq INTEGER PRIMARY KEY,
+            admin_id INTEGER,
+            entity TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            deleted_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_changetombstones_admin ON ChangeTombstones (admin_id, seq);
+
+        ALTER TABLE Users ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE Tasks ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE Levels ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE Schedules ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE SmallRewards ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE ActivityLog ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0;
+        -- Offline clients tag each log, so a replayed one is recognised.
+        ALTER TABLE ActivityLog ADD COLUMN client_ref TEXT;
+
+        -- Existing rows get distinct numbers, table after table, so a first
+        -- sync from cursor 0 can page through them.
+        UPDATE Users SET change_seq = rowid + (SELECT seq FROM ChangeSequence);
+        UPDATE ChangeSequence SET seq = COALESCE((SELECT MAX(change_seq) FROM Users), seq);
+        UPDATE Tasks SET change_seq = rowid + (SELECT seq FROM ChangeSequence);
+        UPDATE ChangeSequence SET seq = COALESCE((SELECT MAX(change_seq) FROM Tasks), seq);
+        UPDATE Levels SET change_seq = rowid + (SELECT seq FROM ChangeSequence);
+        UPDATE ChangeSequence SET seq = COALESCE((SELECT MAX(change_seq) FROM Levels), seq);
+        UPDATE Schedules SET change_seq = rowid + (SELECT seq FROM ChangeSequence);
+        UPDATE ChangeSequence SET seq = COALESCE((SELECT MAX(change_seq) FROM Schedules), seq);
+        UPDATE SmallRewards SET change_seq = rowid + (SELECT seq FROM ChangeSequence);
+        UPDATE ChangeSequence SET seq = COALESCE((SELECT MAX(change_seq) FROM SmallRewards), seq);
+        UPDATE ActivityLog SET change_seq = rowid + (SELECT seq FROM ChangeSequence);
+        UPDATE ChangeSequence SET seq = COALESCE((SELECT MAX(change_seq) FROM ActivityLog), seq);
+
+        CREATE INDEX IF NOT EXISTS idx_users_admin_change ON Users (admin_id, change_seq);
+        CREATE INDEX IF NOT EXISTS idx_tasks_admin_change ON Tasks (admin_id, change_seq);
+        CREATE INDEX IF NOT EXISTS idx_levels_admin_change ON Levels (admin_id, change_seq);
+        CREATE INDEX IF NOT EXISTS idx_schedules_admin_change ON Schedules (admin_id, change_seq);
+        CREATE INDEX IF NOT EXISTS idx_smallrewards_admin_change ON SmallRewards (admin_id, change_seq);
+        CREATE INDEX IF NOT EXISTS idx_activitylog_admin_change ON ActivityLog (admin_id, change_seq);
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_activitylog_client_ref
+            ON ActivityLog (admin_id, client_ref) WHERE client_ref IS NOT NULL;
+        -- get_levels lists levels in order; the other getters read the
+        -- (admin_id) indexes, whose rowid tails are already in key order
+        CREATE INDEX IF NOT EXISTS idx_levels_admin_level ON Levels (admin_id, Level);
+    """
+     + _change_feed_triggers("Users", "users", "user_id")
+     + _change_feed_triggers("Tasks", "tasks", "task_id")
+     + _change_feed_triggers("Levels", "levels", "Level")
+     + _change_feed_triggers("Schedules", "schedules", "schedule_id")
+     + _change_feed_triggers("SmallRewards", "small_rewards", "reward_id")
+     # recompute_xp stamps its rescored rows itself; archived rows are not deleted for clients
+     + _change_feed_triggers("ActivityLog", "activities", "activity_id",
+                             update_when=" AND NOT EXISTS (SELECT 1 FROM XPRescoreInProgress)",
+                             delete_when="NOT EXISTS (SELECT 1 FROM ArchiveInProgress)")),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=LATEST_VERSION):
+    """Apply every migration above the database's version, up to target.
+
+    Returns the list of versions that were applied.
+    """
+    current = get_schema_version(conn)
+    applied = []
+    for version, description, script in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+        try:
+            conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {version};\nCOMMIT;")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.rollback()
+            raise sqlite3.OperationalError(f"Migration {version} ({description}) failed: {e}") from e
+        applied.append(version)
+    return applied
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Upgrade a chore tracker database and check its query plans.")
+    parser.add_argument("db_file", nargs="?", default="chores.db")
+    parser.add_argument("--rebuild-rollups", action="store_true",
+                        help="recompute DailyXP and the leaderboards from ActivityLog")
+    parser.add_argument("--compact-leaderboards", action="store_true",
+                        help="drop weekly leaderboard periods older than a year")
+    args = parser.parse_args(argv[1:])
+
+    conn = sqlite3.connect(args.db_file)
+    before = get_schema_version(conn)
+    applied = migrate(conn)
+    print(f"{args.db_file}: schema version {before} -> {get_schema_version(conn)} (applied {applied or 'nothing'})")
+
+    from db import check_query_plans, compact_leaderboards, rebuild_leaderboards, rebuild_rollups  # imported late, db imports this module
+    if args.rebuild_rollups:
+        print(f"Rebuilt {rebuild_rollups(conn)} DailyXP rows")
+        print(f"Rebuilt {rebuild_leaderboards(conn)} leaderboard rows")
+    if args.compact_leaderboards:
+        print(f"Removed {compact_leaderboards(conn)} old leaderboard rows")
+    failed = False
+    for name, ok, plan in check_query_plans(conn):
+        print(f"[{'ok' if ok else 'FULL SCAN'}] {name}")
+        for detail in plan:
+            print(f"    {detail}")
+        failed = failed or not ok
+    conn.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,13 +1,11 @@
+import math
 import streamlit as st
-import pandas as pd
-from db import create_connection, get_users
-import plotly.graph_objects as go
+from db import pooled_connection, get_users, get_level_index, get_xp_by_day, get_xp_by_task, get_top_scores, get_user_rank
+from instrumentation import streamlit_profiler, timed
+from shards import database_for
+from datetime import date, timedelta
 
 
-# Connect to the SQLite database
-database = "chores.db"
-conn = create_connection(database)
-
 def display_key_metrics(users):
     if users.empty:
         st.write("No user data available.")
@@ -22,13 +20,38 @@ def display_key_metrics(users):
     col2.metric("Average XP", average_xp)
     col3.metric("Total Kids", total_users)
 
-def plot_progress_bars(users):
-    st.write("## Progress to Next Level")
-    for index, row in users.iterrows():
-        label = f"{row['Name']} (Level {row['Current Level']} - {row['Total XP']} XP)"
-        progress = row['Total XP'] % 100  # Assuming each level up requires 100 XP for simplicity
-        st.progress(progress)
-        st.write(label)
+PROGRESS_CHARTS_PER_PAGE = 12
+PROGRESS_GRID_COLUMNS = 3
+
+def compute_level_progress(users, level_index):
+    """Adds Level, Level XP, Next Level XP and Progress columns for every user at once.
+
+    Progress is the share of the current level's XP band already earned
+    (1 at the top level).
+    """
+    levels, floors, ceilings, progress = level_index.progress_for(users['Total XP'].to_numpy())
+    progress_df = users.copy()
+    progress_df['Level'] = levels
+    progress_df['Level XP'] = floors
+    progress_df['Next Level XP'] = ceilings
+    progress_df['Progress'] = progress
+    return progress_df
+
+def plot_progress_bars(progress):
+    """One horizontal bar chart of every user's progress to their next level."""
+    import plotly.graph_objects as go
+    labels = progress['Name'] + " (Level " + progress['Level'].astype(str) + ")"
+    fig = go.Figure(go.Bar(
+        x=progress['Progress'] * 100,
+        y=labels,
+        orientation='h',
+        marker_color='cyan',
+        text=(progress['Progress'] * 100).round().astype(int).astype(str) + "%",
+        hovertext=progress['Total XP'].astype(str) + " XP",
+    ))
+    fig.update_layout(xaxis=dict(range=[0, 100], title='% to Next Level'), yaxis=dict(autorange='reversed'),
+                      height=max(250, 40 * len(progress)), title="Progress to Next Level")
+    st.plotly_chart(fig, use_container_width=True)
 
 
 
@@ -37,6 +60,7 @@ def generate_user_detail_charts(users):
         st.write("No user data available.")
         return
 
+    import plotly.graph_objects as go  # deferred like make_subplots, so pages without charts never load plotly
     fig = go.Figure()
     # Add traces
     fig.add_trace(go.Bar(
@@ -72,53 +96,114 @@ def generate_user_detail_charts(users):
 
    
 
-def create_progress_chart(name, current_xp, next_level_xp, current_level):
-    progress = (current_xp % 100) / 100 * next_level_xp  # Calculate the actual progress towards the next level
-    remaining = next_level_xp - progress
+def plot_xp_trends(daily_xp, task_xp):
+    st.subheader("XP Trends")
+    if daily_xp.empty:
+        st.write("No activity logged in this period.")
+        return
 
-    fig = go.Figure(data=[go.Pie(
-        labels=["Progress", "Remaining"],
-        values=[progress, remaining],
-        hole=.7,
-        marker_colors=["cyan", "lightgrey"],
-        hoverinfo="label+percent"
-    )])
+    import plotly.graph_objects as go
+    fig = go.Figure()
+    for name, user_xp in daily_xp.groupby('Name'):
+        fig.add_trace(go.Scatter(x=user_xp['Date'], y=user_xp['XP'], mode='lines+markers', name=name))
+    fig.update_layout(xaxis_title='Date', yaxis_title='XP', title="XP Earned Over Time")
+    st.plotly_chart(fig, use_container_width=True)
 
-    fig.update_layout(
-        title=f"{name} - Level {current_level}",
-        showlegend=True,
-        annotations=[dict(text=f"{int((progress / next_level_xp) * 100)}%", x=0.5, y=0.5, font_size=20, showarrow=False)]
-    )
+    fig = go.Figure(go.Bar(x=task_xp['Task Name'], y=task_xp['XP'], marker_color='indigo'))
+    fig.update_layout(xaxis_tickangle=-45, yaxis_title='XP', title="XP by Task")
+    st.plotly_chart(fig, use_container_width=True)
 
+
+def create_progress_grid(progress, columns=PROGRESS_GRID_COLUMNS):
+    """Draws every user's progress ring into one subplot grid figure."""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots  # only the Rings style needs it, and it is slow to import
+    rows = math.ceil(len(progress) / columns)
+    fig = make_subplots(
+        rows=rows, cols=columns,
+        specs=[[{"type": "domain"}] * columns for _ in range(rows)],
+        subplot_titles=list(progress['Name'] + " - Level " + progress['Level'].astype(str)),
+    )
+    percents = (progress['Progress'] * 100).round().astype(int).to_numpy()
+    for position, (percent, value) in enumerate(zip(percents, progress['Progress'].to_numpy())):
+        fig.add_trace(go.Pie(
+            labels=["Progress", "Remaining"],
+            values=[value, 1 - value],
+            hole=.7,
+            marker_colors=["cyan", "lightgrey"],
+            hoverinfo="label+percent",
+            sort=False,
+            showlegend=position == 0,
+            title=dict(text=f"{percent}%", font_size=20),
+        ), row=position // columns + 1, col=position % columns + 1)
+    fig.update_layout(height=300 * rows)
     return fig
 
 
+def load_dashboard_data(conn, admin_id, start_date, freq="D"):
+    import pandas as pd
+    user_data = pd.DataFrame(get_users(conn, admin_id), columns=["User ID", "Name", "Current Level", "Total XP"])
+    daily_xp = get_xp_by_day(conn, admin_id, start_date=start_date, freq=freq).to_frame()
+    task_xp = get_xp_by_task(conn, admin_id, start_date=start_date).to_frame()
+    progress = compute_level_progress(user_data, get_level_index(conn, admin_id))
+    return user_data, daily_xp, task_xp, progress
+
+
+def display_leaderboards(conn, admin_id, users):
+    st.subheader("Leaderboards")
+    col1, col2 = st.columns(2)
+    board = col1.radio("Board", options=["weekly", "all_time"], horizontal=True,
+                       format_func=lambda b: {"weekly": "This Week", "all_time": "All Time"}[b])
+    across = col2.radio("Ranking", options=[False, True], horizontal=True,
+                        format_func=lambda a: "All Households" if a else "This Household")
+    top = get_top_scores(conn, board, None if across else admin_id)
+    if top.empty:
+        st.write("No XP on this board yet." if not across else
+                 "No households share their leaderboard yet; turn sharing on in Admin Tools.")
+        return
+    st.dataframe(top.to_frame().drop(columns=["User ID"] + ([] if across else ["Household"])).set_index("Rank"))
+    ranks = []
+    for user_id, name in zip(users["User ID"], users["Name"]):
+        rank, score, total = get_user_rank(conn, admin_id, user_id, board, across_households=across)
+        ranks.append(f"{name}: #{rank} of {total} ({score} XP)" if rank else f"{name}: not ranked yet")
+    if ranks:
+        st.caption(" · ".join(ranks))
+
+
 def dashboard_page():
     st.title("Kids' Progress Dashboard")
     
-    # Connect to the SQLite database
-    database = "chores.db"
-    conn = create_connection(database)
-
     # Fetch data
     admin_id = 1  # Assuming admin_id is set to 1 for this example
-    user_data = pd.DataFrame(get_users(conn, admin_id), columns=["User ID", "Name", "Current Level", "Total XP"])
+    col1, col2 = st.columns(2)
+    days = col1.selectbox("Trend Window", options=[30, 90, 365], format_func=lambda d: f"Last {d} days")
+    freq = col2.radio("Group By", options=["D", "W"], format_func=lambda f: {"D": "Day", "W": "Week"}[f], horizontal=True)
+    start_date = date.today() - timedelta(days=days)
+    with pooled_connection(database_for(admin_id)) as conn:
+        user_data, daily_xp, task_xp, progress = load_dashboard_data(conn, admin_id, start_date, freq)
     
     # Display Metrics and Charts
     display_key_metrics(user_data)
     generate_user_detail_charts(user_data)
+    plot_xp_trends(daily_xp, task_xp)
+    with pooled_connection(database_for(admin_id)) as conn:
+        display_leaderboards(conn, admin_id, user_data)
     st.subheader ("Progress to Next Level")
-    users = pd.DataFrame(get_users(conn, admin_id), columns=["User ID", "Name", "Current Level", "Total XP"])
-    next_level_xp = 100  # Assuming a flat rate for simplification; this could be dynamic.
+    if progress.empty:
+        return
 
-    cols = st.columns(3)  # Adjust the number of columns based on layout preferences
-    col_index = 0
+    col1, col2 = st.columns(2)
+    style = col1.radio("Chart Style", options=["Rings", "Bars"], horizontal=True)
+    pages = math.ceil(len(progress) / PROGRESS_CHARTS_PER_PAGE)
+    page = col2.number_input("Page", min_value=1, max_value=pages, value=1) if pages > 1 else 1
+    page_progress = progress.iloc[(page - 1) * PROGRESS_CHARTS_PER_PAGE:page * PROGRESS_CHARTS_PER_PAGE]
 
-    for _, row in users.iterrows():
-        with cols[col_index]:
-            fig = create_progress_chart(row['Name'], row['Total XP'], next_level_xp, row['Current Level'])
-            st.plotly_chart(fig, use_container_width=True)
-        col_index = (col_index + 1) % len(cols)  # Move to the next column
+    if style == "Rings":
+        st.plotly_chart(create_progress_grid(page_progress), use_container_width=True)
+    else:
+        plot_progress_bars(page_progress)
 
 
-dashboard_page()
+if __name__ == "__main__":
+    with streamlit_profiler(), timed("dashboard_page"):
+        dashboard_page()
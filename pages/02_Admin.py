@@ -1,21 +1,34 @@
 import streamlit as st
-from db import create_connection, add_task, delete_task, add_user, delete_user, update_user, get_users, get_tasks, get_levels, add_level, update_level_details
-import pandas as pd
-
-st.set_page_config(page_title="Admin", page_icon="🔑", layout="wide")
+from db import pooled_connection, get_pool_stats, get_cache_stats, bulk_import_activities, read_activity_rows, import_users, add_task, delete_task, add_user, delete_user, update_user, get_users, get_tasks, get_levels, add_level, update_level_details, get_small_rewards, add_small_reward, delete_small_reward, get_leaderboard_sharing, set_leaderboard_sharing, add_schedule, delete_schedule, get_schedules, schedule_rule, get_xp_rule, recompute_xp
+import io
+from writer import get_writer_stats
+from shards import database_for
+from auth import get_auth_stats
+from rewards import REWARD_TIERS
+from schedules import FREQUENCIES, WEEKDAYS
+from xp_rules import XP_RULES
+import events
+import archive
+from datetime import date, timedelta
 
 admin_id = 1
 
 def import_users_from_csv(conn, admin_id, csv_file):
-    df = pd.read_csv(csv_file)
-    for _, row in df.iterrows():
-        name = row.get('Name')
-        current_level = row.get('Current Level')
-        total_xp = row.get('Total XP')
-        if name:
-            add_user(conn, admin_id, name, current_level, total_xp)
+    return import_users(conn, admin_id, csv_file, getattr(csv_file, "name", None))
+
+def import_activities(conn, admin_id, uploaded_file):
+    fmt = "jsonl" if uploaded_file.name.endswith(".jsonl") else "csv"
+    text = io.TextIOWrapper(uploaded_file, encoding="utf-8", newline="")
+    return bulk_import_activities(conn, admin_id, read_activity_rows(text, fmt))
+
+def show_table(rows, columns=None, index=None, **kwargs):
+    """st.dataframe over rows; pandas is imported here so the page loads without it until a table is shown."""
+    import pandas as pd
+    df = pd.DataFrame(rows, columns=columns)
+    st.dataframe(df.set_index(index) if index else df, **kwargs)
 
 def export_users_to_csv(conn, admin_id):
+    import pandas as pd
     users = get_users(conn, admin_id)
     users_df = pd.DataFrame(users, columns=["User ID", "Name", "Current Level", "Total XP"])
     return users_df.to_csv(index=False)
@@ -54,10 +67,91 @@ def manage_levels(conn, admin_id):
                     st.success(f"Level {selected_level} updated successfully!")
                     st.experimental_rerun()  # Optionally, rerun to update the level list immediately.
     
-def admin_page():
+def manage_small_rewards(conn, admin_id):
+    section = st.expander("Manage Small Rewards", key="manage_small_rewards", on_change="rerun")
+    if not section.open:
+        return
+    with section:
+        rewards = get_small_rewards(conn, admin_id)
+        if rewards:
+            total_weight = sum(r[2] for r in rewards) or 1
+            show_table([(*r, f"{r[2] / total_weight:.1%}") for r in rewards],
+                       ["Reward ID", "Reward", "Weight", "Tier", "Daily Cap", "Chance"], "Reward ID")
+        col1, col2 = st.columns(2)
+        with col1:
+            with st.form("Add Small Reward"):
+                st.caption("Adding a reward starts this household's own pool in place of the shared one.")
+                reward = st.text_input("Reward")
+                tier = st.selectbox("Rarity", options=list(REWARD_TIERS), format_func=str.title)
+                daily_cap = st.number_input("Daily cap per child (0 for none)", min_value=0, step=1)
+                if st.form_submit_button("Add Reward") and reward:
+                    add_small_reward(conn, reward, admin_id, tier=tier, daily_cap=daily_cap or None)
+                    st.success("Reward added!")
+        with col2:
+            to_remove = st.selectbox("Select a reward to remove", rewards, format_func=lambda r: r[1], key="remove_reward")
+            if to_remove and st.button("Remove Reward"):
+                if delete_small_reward(conn, to_remove[0], admin_id):
+                    st.success(f"Reward '{to_remove[1]}' removed.")
+                    st.rerun()
+                else:
+                    st.warning("Shared rewards can't be removed here; add your own to replace them.")
+
+def manage_schedules(conn, admin_id):
+    section = st.expander("Manage Schedules", key="manage_schedules", on_change="rerun")
+    if not section.open:
+        return
+    with section:
+        tasks = {task[0]: task[1] for task in get_tasks(conn, admin_id)}
+        children = {user[0]: user[1] for user in get_users(conn, admin_id)}
+        schedules = get_schedules(conn, admin_id)
+        if schedules:
+            show_table([(s[0], tasks.get(s[1]), children.get(s[2], "All children"), schedule_rule(s).describe())
+                        for s in schedules], ["Schedule ID", "Task", "Child", "Repeats"], "Schedule ID")
+        col1, col2 = st.columns(2)
+        with col1:
+            with st.form("Add Schedule"):
+                task_id = st.selectbox("Task", options=list(tasks), format_func=tasks.get)
+                user_id = st.selectbox("Child", options=[None] + list(children),
+                                       format_func=lambda u: "All children" if u is None else children[u])
+                frequency = st.selectbox("Repeats", options=FREQUENCIES, format_func=str.title)
+                every = st.number_input("Every (days, weeks or months)", min_value=1, value=1, step=1)
+                weekdays = st.multiselect("On (weekly)", options=range(7), format_func=lambda d: WEEKDAYS[d])
+                day_of_month = st.number_input("Day of month (monthly, 0 for the start day)", min_value=0, max_value=31, step=1)
+                start_date = st.date_input("Starting", value=date.today())
+                if st.form_submit_button("Add Schedule") and task_id is not None:
+                    try:
+                        add_schedule(conn, admin_id, task_id, frequency, user_id, every, weekdays, day_of_month or None, start_date)
+                        st.success("Schedule added!")
+                    except ValueError as e:
+                        st.error(f"Could not add schedule: {e}")
+        with col2:
+            to_remove = st.selectbox("Select a schedule to remove", schedules, key="remove_schedule",
+                                     format_func=lambda s: f"{tasks.get(s[1])} ({schedule_rule(s).describe()})")
+            if to_remove and st.button("Remove Schedule"):
+                delete_schedule(conn, to_remove[0], admin_id)
+                st.success("Schedule removed.")
+                st.rerun()
+
+def manage_xp_rules(conn, admin_id):
+    with st.expander("XP Rules"):
+        current = get_xp_rule(conn, admin_id)
+        st.write(f"New activities earn XP by rule {current}: {XP_RULES[current].name}.")
+        st.caption("Rescore after changing a task's XP or switching rules so past activities, totals and levels match.")
+        rule = st.selectbox("Rule", options=list(XP_RULES), index=list(XP_RULES).index(current),
+                            format_func=lambda r: f"{r}: {XP_RULES[r].name}")
+        col1, col2 = st.columns(2)
+        preview = col1.button("Preview Changes")
+        apply = col2.button("Rescore History")
+        if preview or apply:
+            summary = recompute_xp(conn, admin_id, rule, dry_run=not apply)
+            verb = "Rescored" if apply else "Would rescore"
+            st.write(f"{verb} {summary['activities_changed']} activities ({summary['xp_change']:+} XP) "
+                     f"in {summary['seconds']}s.")
+            if not summary["diff"].empty:
+                st.dataframe(summary["diff"].to_frame().set_index("User ID"))
+
+def admin_page(conn):
     st.title("Admin Tools")
-    database = "chores.db"
-    conn = create_connection(database)
 
     with st.expander("Manage Tasks"):
         col1, col2 = st.columns(2)
@@ -95,36 +189,41 @@ def admin_page():
                 
 
     manage_levels(conn, admin_id)
-    with st.expander("View All Data"):
-
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.subheader("All Users and XP Data")
-            users = get_users(conn, admin_id)
-            if users:
-                users_df = pd.DataFrame(users, columns=["User ID", "Name", "Current Level", "Total XP"])
-                users_df.set_index("User ID", inplace=True)
-                st.dataframe(users_df)
-            else:
-                st.write("No users data available.")
-        with col2:
-            st.subheader("All Tasks")
-            tasks = get_tasks(conn, admin_id)
-            if tasks:
-                tasks_df = pd.DataFrame(tasks, columns=["Task ID", "Task Name", "Base XP", "Time Multiplier"])
-                tasks_df.set_index("Task ID", inplace=True)
-                st.dataframe(tasks_df)
-            else:
-                st.write("No tasks data available.")
-        with col3:
-            st.subheader("All Rewards")
-            levels = get_levels(conn, admin_id)
-            if levels:
-                levels_df = pd.DataFrame(levels, columns=["Level", "XP Required", "Cumulative XP", "Reward"])
-                levels_df.set_index("Level", inplace=True)
-                st.dataframe(levels_df)
-            else:
-                st.write("No level data available.")
+    manage_small_rewards(conn, admin_id)
+    manage_schedules(conn, admin_id)
+    manage_xp_rules(conn, admin_id)
+    with st.expander("Leaderboards"):
+        sharing = get_leaderboard_sharing(conn, admin_id)
+        share = st.checkbox("Show this household on the all-households leaderboard", value=sharing,
+                            help="Only children's names and XP are shared.")
+        if share != sharing:
+            set_leaderboard_sharing(conn, admin_id, share)
+            st.success("Leaderboard sharing updated.")
+    all_data = st.expander("View All Data", key="view_all_data", on_change="rerun")
+    if all_data.open:
+        with all_data:
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.subheader("All Users and XP Data")
+                users = get_users(conn, admin_id)
+                if users:
+                    show_table(users, ["User ID", "Name", "Current Level", "Total XP"], "User ID")
+                else:
+                    st.write("No users data available.")
+            with col2:
+                st.subheader("All Tasks")
+                tasks = get_tasks(conn, admin_id)
+                if tasks:
+                    show_table(tasks, ["Task ID", "Task Name", "Base XP", "Time Multiplier"], "Task ID")
+                else:
+                    st.write("No tasks data available.")
+            with col3:
+                st.subheader("All Rewards")
+                levels = get_levels(conn, admin_id)
+                if levels:
+                    show_table(levels, ["Level", "XP Required", "Cumulative XP", "Reward"], "Level")
+                else:
+                    st.write("No level data available.")
 
     with st.expander("Import/Export Users"):
         col1, col2 = st.columns(2)
@@ -134,8 +233,17 @@ def admin_page():
             st.subheader("Import Users")
             uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
             if uploaded_file is not None:
-                import_users_from_csv(conn, admin_id, uploaded_file)
-                st.success("Users imported successfully!")
+                try:
+                    summary = import_users_from_csv(conn, admin_id, uploaded_file)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    if summary["already_imported"]:
+                        st.info("This file has already been imported.")
+                    else:
+                        st.success(f"Added {summary['rows_inserted']} users and updated {summary['rows_updated']}; "
+                                   f"{summary['rows_invalid']} invalid rows skipped.")
+                    st.json(summary)
         
         # Export Users
         with col2:
@@ -148,4 +256,63 @@ def admin_page():
                     file_name='users.csv',
                     mime='text/csv',
                 )
-admin_page()
\ No newline at end of file
+
+    with st.expander("Import Activity History"):
+        st.write("Upload a CSV or JSON Lines file with date, time_spent, bonus_xp, small_reward, "
+                 "a user_id or name column and a task_id or task_name column.")
+        activity_file = st.file_uploader("Choose an activity file", type=["csv", "jsonl"], key="activity_file")
+        if activity_file is not None and st.button("Import Activities"):
+            summary = import_activities(conn, admin_id, activity_file)
+            st.success(f"Imported {summary['rows_inserted']} activities "
+                       f"({summary['rows_per_second']} rows/s), skipped {summary['rows_skipped']}.")
+            st.json(summary)
+
+    archived = st.expander("Archive Old Activity", key="archive_old_activity", on_change="rerun")
+    if archived.open:
+        with archived:
+            partitions = archive.archived_partitions(conn, admin_id)
+            if partitions:
+                show_table(partitions, ["Month", "File", "First Date", "Last Date", "Activities", "XP Earned",
+                                        "Archived At"], hide_index=True)
+            if not archive.available():
+                st.info("Install pyarrow to archive old activities to Parquet files.")
+            else:
+                st.write("Moves activities before the cutoff out of the database into Parquet files. "
+                         "History, totals and the dashboard are unchanged.")
+                cutoff = st.date_input("Archive activities before", value=date.today() - timedelta(days=365))
+                if st.button("Archive"):
+                    summary = archive.archive_activities(conn, cutoff, admin_id)
+                    st.success(f"Archived {summary['rows_archived']} activities in {summary['partitions']} partitions.")
+
+    with st.expander("Consistency Check"):
+        st.caption("Compares each child's XP and activity totals with the event log, reading only events since the last check.")
+        col1, col2 = st.columns(2)
+        check = col1.button("Run Check")
+        repair = col2.button("Repair From Event Log")
+        if check or repair:
+            problems = events.check_consistency(conn, admin_id, repair=repair)
+            if problems:
+                show_table(problems)
+                st.warning("Repaired." if repair else f"{len(problems)} mismatches found.")
+            else:
+                st.success("Everything matches the event log.")
+
+    with st.expander("Database Stats"):
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.subheader("Connection Pool")
+            st.json(get_pool_stats(database_for(admin_id)))
+        with col2:
+            st.subheader("Read Cache")
+            st.json(get_cache_stats())
+        with col3:
+            st.subheader("Activity Writer")
+            st.json(get_writer_stats(database_for(admin_id)) or {"status": "not started"})
+        with col4:
+            st.subheader("Logins")
+            st.json(get_auth_stats())
+
+if __name__ == "__main__":
+    st.set_page_config(page_title="Admin", page_icon="🔑", layout="wide")
+    with pooled_connection(database_for(admin_id)) as conn:
+        admin_page(conn)
\ No newline at end of file
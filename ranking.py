@@ -0,0 +1,31 @@
+"""Rank lookups over a leaderboard's scores.
+
+RankIndex keeps one board's scores sorted (highest first, stored negated so
+bisect works on an ascending list), so "what rank is this score" is a
+binary search instead of a COUNT over every row that beats it. Ranks are
+competition ranks: tied scores share a rank and the next rank skips.
+"""
+from bisect import bisect_left
+
+
+class RankIndex:
+    __slots__ = ("_negated", "_by_user")
+
+    def __init__(self, rows):
+        """rows are (admin_id, user_id, score) tuples in any order."""
+        rows = list(rows)
+        self._negated = sorted(-score for _, _, score in rows)
+        self._by_user = {(admin_id, user_id): score for admin_id, user_id, score in rows}
+
+    def __len__(self):
+        return len(self._negated)
+
+    def rank_of_score(self, score):
+        return bisect_left(self._negated, -score) + 1
+
+    def rank(self, admin_id, user_id):
+        """Return (rank, score) for a user on the board, or (None, None) if they are not on it."""
+        score = self._by_user.get((admin_id, user_id))
+        if score is None:
+            return None, None
+        return self.rank_of_score(score), score
@@ -0,0 +1,39 @@
+"""Lightweight query results.
+
+Query functions in db return Records: a list of named tuples plus the
+column labels the pages show. Callers that only loop over rows (the API,
+the CLIs, the tracker's buttons) never import pandas; to_frame() builds a
+DataFrame when a page actually needs one, importing pandas then.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def record_type(columns):
+    """A named tuple class for a tuple of column labels ("Task Name" becomes task_name)."""
+    return namedtuple("Record", [column.lower().replace(" ", "_") for column in columns], rename=True)
+
+
+class Records(list):
+    __slots__ = ("columns", "start")
+
+    def __init__(self, rows, columns, start=0):
+        """rows are tuples in column order; start is the first row's index in to_frame() (0 or 1)."""
+        self.columns = tuple(columns)
+        self.start = start
+        super().__init__(map(record_type(self.columns)._make, rows))
+
+    @property
+    def empty(self):
+        return not self
+
+    def column(self, label):
+        position = self.columns.index(label)
+        return [row[position] for row in self]
+
+    def to_frame(self):
+        import pandas as pd
+        df = pd.DataFrame(list(self), columns=list(self.columns))
+        df.index += self.start
+        return df
@@ -0,0 +1,248 @@
+"""Weekly parent reports for every household, generated in parallel.
+
+Each household's report is independent, so generate_reports fans admins
+out across a process pool. Every worker keeps one read-only connection per
+database file (one per shard when sharded) and, per admin, reads the kids,
+their levels, the DailyXP rollup from the week's Monday onwards and the
+week's small rewards: a few indexed queries however long the history is.
+The per-kid numbers come from pandas groupbys over those rows. A kid's XP at
+the end of the week is their total minus what they earned after it, so
+levels reached work for past weeks too, archived months included (DailyXP
+keeps archived days).
+
+    python reports.py chores.db [--week 2024-05-06] [--out reports] [--workers 4] [--admin-id 1 ...]
+
+writes reports/<week>/admin_<id>.html and .csv.
+"""
+import argparse
+import html
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from urllib.request import pathname2url
+
+import pandas as pd
+
+import db
+import shards
+
+REPORT_FORMATS = ("html", "csv")
+REPORT_COLUMNS = ["Name", "XP", "Bonus XP", "Chores", "Minutes", "Active Days", "Top Task", "Level",
+                  "Levels Gained", "Rewards Earned"]
+
+WEEK_XP_SQL = """
+    SELECT d.user_id, d.date, COALESCE(t.task_name, 'Deleted task') AS task_name,
+           d.activity_count, d.time_spent, d.xp_earned, d.bonus_xp
+    FROM DailyXP d
+    LEFT JOIN Tasks t ON t.task_id = d.task_id
+    WHERE d.admin_id = ? AND d.date >= ?
+    """
+
+WEEK_SMALL_REWARDS_SQL = """
+    SELECT user_id, small_reward FROM ActivityLog
+    WHERE admin_id = ? AND date >= ? AND date < ? AND small_reward IS NOT NULL
+    """
+
+_connections = {}  # per worker process: database file -> read-only connection
+
+
+def connect_read_only(db_file):
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(db_file))}?mode=ro", uri=True)
+
+
+def _connection(admin_id):
+    db_file = shards.database_for(admin_id)
+    conn = _connections.get(db_file)
+    if conn is None:
+        conn = _connections[db_file] = connect_read_only(db_file)
+    return conn
+
+
+def _init_worker(database, shard_dir, catalog):
+    db.DATABASE = database
+    shards.configure(shard_dir, catalog)
+
+
+def build_report(conn, admin_id, week=None):
+    """One row per kid for the week starting on week's Monday, as a DataFrame in REPORT_COLUMNS order."""
+    start = db.week_start(week)
+    end = (date.fromisoformat(start) + timedelta(days=7)).isoformat()
+    users = pd.DataFrame(db.get_users(conn, admin_id), columns=["user_id", "Name", "current_level", "total_xp"])
+    users = users.set_index("user_id")
+    levels = db.get_level_index(conn, admin_id)
+
+    days = pd.DataFrame(conn.execute(WEEK_XP_SQL, (admin_id, start)).fetchall(),
+                        columns=["user_id", "date", "task_name", "activity_count", "time_spent", "xp_earned", "bonus_xp"])
+    days["xp"] = days["xp_earned"] + days["bonus_xp"]
+    in_week = days["date"] < end
+    this_week = days[in_week]
+    totals = this_week.groupby("user_id").agg(**{
+        "XP": ("xp", "sum"), "Bonus XP": ("bonus_xp", "sum"), "Chores": ("activity_count", "sum"),
+        "Minutes": ("time_spent", "sum"), "Active Days": ("date", "nunique")})
+    by_task = this_week.groupby(["user_id", "task_name"])["xp"].sum().sort_values(ascending=False, kind="stable")
+    top_task = by_task.reset_index().drop_duplicates("user_id").set_index("user_id")["task_name"]
+    after = days[~in_week].groupby("user_id")["xp"].sum()
+
+    report = users[["Name"]].join(totals).join(top_task.rename("Top Task"))
+    counts = ["XP", "Bonus XP", "Chores", "Minutes", "Active Days"]
+    report[counts] = report[counts].fillna(0).astype(int)
+    end_xp = users["total_xp"].fillna(0) - after.reindex(users.index, fill_value=0)
+    report["Level"] = levels.levels_for(end_xp.to_numpy())
+    report["Levels Gained"] = report["Level"] - levels.levels_for((end_xp - report["XP"]).to_numpy())
+
+    level_rewards = {level: reward for level, _, _, reward in db.get_levels(conn, admin_id) if reward}
+    small = pd.DataFrame(conn.execute(WEEK_SMALL_REWARDS_SQL, (admin_id, start, end)).fetchall(),
+                         columns=["user_id", "reward"])
+    small = small.groupby(["user_id", "reward"]).size()
+    rewards = {}
+    for (user_id, reward), count in small.items():
+        rewards.setdefault(user_id, []).append(f"{reward} x{count}" if count > 1 else reward)
+    for user_id, level, gained in zip(report.index, report["Level"], report["Levels Gained"]):
+        reached = [level_rewards[n] for n in range(level - gained + 1, level + 1) if n in level_rewards]
+        rewards[user_id] = reached + rewards.get(user_id, [])
+    report["Rewards Earned"] = pd.Series({user_id: "; ".join(r) for user_id, r in rewards.items()}, dtype=object)
+    report["Top Task"] = report["Top Task"].fillna("")
+    report["Rewards Earned"] = report["Rewards Earned"].fillna("")
+    return report.sort_values(["XP", "Name"], ascending=[False, True])[REPORT_COLUMNS].reset_index(drop=True)
+
+
+def render_html(report, household, week):
+    start = date.fromisoformat(db.week_start(week))
+    title = f"{household}: week of {start:%d %B %Y}"
+    summary = (f"{int(report['XP'].sum())} XP from {int(report['Chores'].sum())} chores"
+               f" across {len(report)} kids") if len(report) else "No kids yet."
+    table = report.to_html(index=False, border=0, classes="report", na_rep="")
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table.report {{ border-collapse: collapse; }}
+table.report th, table.report td {{ padding: 4px 10px; border-bottom: 1px solid #ddd; text-align: left; }}
+</style>
+</head>
+<body>
+<h1>{html.escape(title)}</h1>
+<p>{html.escape(summary)}</p>
+{table}
+</body>
+</html>
+"""
+
+
+def write_report(admin_id, week=None, out_dir="reports", formats=REPORT_FORMATS):
+    """Build and write one admin's report. Returns a summary dict. Runs in the pool's workers."""
+    started = time.perf_counter()
+    conn = _connection(admin_id)
+    row = conn.execute("SELECT username FROM admin WHERE id = ?", (admin_id,)).fetchone()
+    household = row[0] if row else f"Household {admin_id}"
+    report = build_report(conn, admin_id, week)
+    directory = os.path.join(out_dir, db.week_start(week))
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    for fmt in formats:
+        path = os.path.join(directory, f"admin_{admin_id}.{fmt}")
+        if fmt == "csv":
+            report.to_csv(path, index=False)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(render_html(report, household, week))
+        files.append(path)
+    return {"admin_id": admin_id, "kids": len(report), "xp": int(report["XP"].sum()), "files": files,
+            "seconds": round(time.perf_counter() - started, 4), "pid": os.getpid()}
+
+
+def admin_ids(database=None):
+    """Every admin id, from the catalog when sharded."""
+    conn = connect_read_only(shards.get_catalog_file() if shards.is_sharded() else database or db.DATABASE)
+    try:
+        return [admin_id for admin_id, in conn.execute("SELECT id FROM admin ORDER BY id")]
+    finally:
+        conn.close()
+
+
+def generate_reports(database=None, admins=None, week=None, out_dir="reports", workers=None,
+                     formats=REPORT_FORMATS, progress=None):
+    """Write every admin's weekly report. Returns (summaries, seconds).
+
+    workers defaults to os.cpu_count(); workers=1 runs in this process, with
+    no pool. progress(done, total, summary) is called as each report finishes.
+    A failed report is returned as a summary with an "error" key.
+    """
+    database = database or db.DATABASE
+    admins = list(admins) if admins is not None else admin_ids(database)
+    workers = min(workers or os.cpu_count() or 1, len(admins)) or 1
+    setup = (database, shards.shard_dir, shards.catalog_file)
+    started = time.perf_counter()
+    summaries = []
+
+    def finished(summary):
+        summaries.append(summary)
+        if progress:
+            progress(len(summaries), len(admins), summary)
+
+    if workers == 1:
+        saved = (db.DATABASE, shards.shard_dir, shards.catalog_file)
+        _init_worker(*setup)
+        try:
+            for admin_id in admins:
+                try:
+                    finished(write_report(admin_id, week, out_dir, formats))
+                except (sqlite3.Error, OSError) as e:
+                    finished({"admin_id": admin_id, "error": str(e)})
+        finally:
+            for conn in _connections.values():
+                conn.close()
+            _connections.clear()
+            db.DATABASE = saved[0]
+            shards.configure(*saved[1:])
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=setup) as pool:
+            futures = {pool.submit(write_report, admin_id, week, out_dir, formats): admin_id for admin_id in admins}
+            for future in as_completed(futures):
+                try:
+                    finished(future.result())
+                except (sqlite3.Error, OSError) as e:
+                    finished({"admin_id": futures[future], "error": str(e)})
+    summaries.sort(key=lambda s: s["admin_id"])
+    return summaries, time.perf_counter() - started
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Write weekly HTML/CSV reports for every household.")
+    parser.add_argument("db_file", nargs="?", default=db.DATABASE)
+    parser.add_argument("--week", help="any day in the week to report (default: this week)")
+    parser.add_argument("--out", default="reports", help="output directory, default reports")
+    parser.add_argument("--workers", type=int, help="worker processes, default the number of CPUs")
+    parser.add_argument("--admin-id", type=int, action="append", help="only these admins (repeatable)")
+    parser.add_argument("--format", choices=REPORT_FORMATS, action="append", help="default html and csv")
+    parser.add_argument("--quiet", action="store_true", help="no per-report progress lines")
+    args = parser.parse_args(argv[1:])
+
+    if not shards.is_sharded():
+        conn = sqlite3.connect(args.db_file)  # the workers are read-only, so migrate here first
+        db.create_tables(conn)
+        conn.close()
+
+    def progress(done, total, summary):
+        if "error" in summary:
+            print(f"[{done}/{total}] admin {summary['admin_id']}: failed: {summary['error']}")
+        elif not args.quiet:
+            print(f"[{done}/{total}] admin {summary['admin_id']}: {summary['kids']} kids, {summary['xp']} XP "
+                  f"({summary['seconds']:.2f}s)")
+
+    summaries, seconds = generate_reports(args.db_file, args.admin_id, args.week, args.out, args.workers,
+                                          tuple(args.format or REPORT_FORMATS), progress)
+    failed = sum("error" in s for s in summaries)
+    print(f"Wrote {len(summaries) - failed} reports to {os.path.join(args.out, db.week_start(args.week))} "
+          f"in {seconds:.2f}s" + (f"; {failed} failed" if failed else ""))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
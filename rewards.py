@@ -0,0 +1,46 @@
+"""Weighted small-reward sampling.
+
+A household's reward pool is drawn from with Vose's alias method: building
+the table is O(n) and each draw is O(1) (one random index, one coin flip),
+so the Log Task click costs the same however many rewards there are. The
+table is rebuilt only when the pool's rows change.
+"""
+import random
+
+# Default weight for each rarity tier; a reward's own weight overrides it.
+REWARD_TIERS = {"common": 10.0, "rare": 3.0, "epic": 1.0}
+
+
+class RewardSampler:
+    __slots__ = ("rows", "_probability", "_alias")
+
+    def __init__(self, rows):
+        """rows are (reward_id, reward, weight, tier, daily_cap) tuples as returned by db.get_small_rewards."""
+        self.rows = tuple(row for row in rows if (row[2] or 0) > 0)
+        n = len(self.rows)
+        self._probability = [0.0] * n
+        self._alias = [0] * n
+        if not n:
+            return
+        total = sum(row[2] for row in self.rows)
+        scaled = [row[2] * n / total for row in self.rows]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self._probability[s] = scaled[s]
+            self._alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in small + large:  # leftovers are 1 up to rounding error
+            self._probability[i] = 1.0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def sample(self, rng=random):
+        """Return one row, or None for an empty pool."""
+        if not self.rows:
+            return None
+        i = rng.randrange(len(self.rows))
+        return self.rows[i if rng.random() < self._probability[i] else self._alias[i]]
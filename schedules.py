@@ -0,0 +1,111 @@
+"""Recurrence rules for scheduled chores.
+
+A Recurrence says which days a chore comes round on: every `every` days,
+on chosen weekdays every `every` weeks, or on one day of the month every
+`every` months, from a start date to an optional end date. Occurrences are
+worked out on demand for a date window instead of being stored, so a
+schedule is one row however long it runs.
+"""
+import calendar
+from datetime import date, timedelta
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+def weekday_mask(weekdays):
+    """Bitmask (Monday = 1) for an iterable of weekday numbers, Monday = 0."""
+    return sum(1 << day for day in set(weekdays))
+
+
+def mask_weekdays(mask):
+    return [day for day in range(7) if mask & (1 << day)]
+
+
+def _as_date(value):
+    return value if isinstance(value, date) or value is None else date.fromisoformat(str(value)[:10])
+
+
+def _months_between(start, day):
+    return (day.year - start.year) * 12 + day.month - start.month
+
+
+class Recurrence:
+    __slots__ = ("frequency", "every", "weekdays", "day_of_month", "start", "end")
+
+    def __init__(self, frequency, every=1, weekdays=None, day_of_month=None, start=None, end=None):
+        """weekdays is a bitmask (see weekday_mask); start and end are dates or YYYY-MM-DD strings."""
+        if frequency not in FREQUENCIES:
+            raise ValueError(f"Unknown frequency {frequency!r}")
+        if int(every) < 1:
+            raise ValueError("every must be at least 1")
+        self.frequency = frequency
+        self.every = int(every)
+        self.start = _as_date(start) or date.today()
+        self.end = _as_date(end)
+        if self.end is not None and self.end < self.start:
+            raise ValueError("end date is before the start date")
+        self.weekdays = self.day_of_month = None
+        if frequency == "weekly":
+            self.weekdays = int(weekdays or weekday_mask([self.start.weekday()])) & 0x7F
+            if not self.weekdays:
+                raise ValueError("a weekly schedule needs at least one weekday")
+        elif frequency == "monthly":
+            self.day_of_month = int(day_of_month or self.start.day)
+            if not 1 <= self.day_of_month <= 31:
+                raise ValueError("day_of_month must be between 1 and 31")
+
+    def occurs_on(self, day):
+        if day < self.start or (self.end is not None and day > self.end):
+            return False
+        if self.frequency == "daily":
+            return (day - self.start).days % self.every == 0
+        if self.frequency == "weekly":
+            weeks = (day - timedelta(days=day.weekday()) - (self.start - timedelta(days=self.start.weekday()))).days // 7
+            return bool(self.weekdays & (1 << day.weekday())) and weeks % self.every == 0
+        # a day_of_month past the end of a short month falls on its last day
+        last_day = calendar.monthrange(day.year, day.month)[1]
+        return day.day == min(self.day_of_month, last_day) and _months_between(self.start, day) % self.every == 0
+
+    def occurrences(self, start, end):
+        """Yield the dates it occurs on between start and end, inclusive, lazily."""
+        day = max(_as_date(start), self.start)
+        last = _as_date(end) if self.end is None else min(_as_date(end), self.end)
+        step = 1
+        if self.frequency == "daily":
+            day += timedelta(days=-(day - self.start).days % self.every)
+            step = self.every
+        while day <= last:
+            if self.occurs_on(day):
+                yield day
+            day += timedelta(days=step)
+
+    def latest(self, day):
+        """The last occurrence on or before day, or None if it has not started yet."""
+        day = _as_date(day)
+        if self.end is not None:
+            day = min(day, self.end)
+        if day < self.start:
+            return None
+        if self.frequency == "daily":
+            return day - timedelta(days=(day - self.start).days % self.every)
+        # one full period back always holds an occurrence (or reaches the start)
+        period = 7 * self.every if self.frequency == "weekly" else 31 * self.every
+        for back in range(period + 1):
+            candidate = day - timedelta(days=back)
+            if candidate < self.start:
+                return None
+            if self.occurs_on(candidate):
+                return candidate
+        return None
+
+    def describe(self):
+        unit = {"daily": "day", "weekly": "week", "monthly": "month"}[self.frequency]
+        text = f"Every {unit}" if self.every == 1 else f"Every {self.every} {unit}s"
+        if self.frequency == "weekly":
+            text += " on " + ", ".join(WEEKDAYS[d] for d in mask_weekdays(self.weekdays))
+        elif self.frequency == "monthly":
+            text += f" on day {self.day_of_month}"
+        if self.end is not None:
+            text += f" until {self.end.isoformat()}"
+        return text
@@ -0,0 +1,223 @@
+"""Optional sharded storage: one SQLite file per admin.
+
+With ``CHORES_SHARD_DIR`` set, each household lives in its own
+``admin_<id>.db`` inside that directory, so one busy household's writes no
+longer hold the write lock for everyone else. A small catalog database
+(``CHORES_CATALOG``, default ``<shard dir>/catalog.db``) holds the ``admin``
+table; admin ids are allocated there and the admin row is copied into the
+shard without its password hash, so the shard schema is unchanged and the
+catalog is the only place a credential is checked or upgraded. Without ``CHORES_SHARD_DIR``
+everything routes to ``db.DATABASE`` as before.
+
+Split an existing single-file database with::
+
+    python shards.py split chores.db --shard-dir shards
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import db
+from sync import SYNC_ENTITIES
+
+shard_dir = os.environ.get("CHORES_SHARD_DIR") or None
+catalog_file = os.environ.get("CHORES_CATALOG") or None
+
+CATALOG_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS admin (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL
+    );
+"""
+
+# Copied per admin by split_database, parents before children.
+SHARDED_TABLES = ("Users", "Tasks", "Levels", "ActivityLog", "ArchivedDailyXP", "ActivityArchive", "RewardGrants",
+                  "Schedules", "ActivityEvents", "UserSnapshots", "ChangeTombstones")
+
+
+def configure(directory=None, catalog=None):
+    global shard_dir, catalog_file
+    shard_dir = directory
+    catalog_file = catalog
+
+
+def is_sharded():
+    return shard_dir is not None
+
+
+def get_catalog_file():
+    return catalog_file or os.path.join(shard_dir, "catalog.db")
+
+
+def shard_file(admin_id, directory=None):
+    return os.path.join(directory or shard_dir, f"admin_{int(admin_id)}.db")
+
+
+def database_for(admin_id):
+    """Database file that holds admin_id's data."""
+    return shard_file(admin_id) if is_sharded() else db.DATABASE
+
+
+def create_catalog(conn):
+    conn.executescript(CATALOG_SCHEMA)
+
+
+def catalog_connection():
+    os.makedirs(shard_dir, exist_ok=True)
+    db.get_pool(get_catalog_file(), setup=create_catalog)
+    return db.pooled_connection(get_catalog_file())
+
+
+def register_admin(username, password):
+    if not is_sharded():
+        with db.pooled_connection(db.DATABASE) as conn:
+            return db.register_admin(conn, username, password)
+    password_hash = db.hash_password(password)
+    try:
+        with catalog_connection() as catalog:
+            with catalog:
+                admin_id = catalog.execute(
+                    "INSERT INTO admin (username, password_hash) VALUES (?, ?)", (username, password_hash)
+                ).lastrowid
+    except sqlite3.IntegrityError as ie:
+        print(f"IntegrityError: {ie}")
+        return False
+    try:
+        with db.pooled_connection(shard_file(admin_id)) as conn:
+            with conn:
+                conn.execute("INSERT INTO admin (id, username, password_hash) VALUES (?, ?, '')", (admin_id, username))
+            db.initialize_default_levels(conn, admin_id)
+            _copy_small_rewards(conn)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        with catalog_connection() as catalog, catalog:
+            catalog.execute("DELETE FROM admin WHERE id = ?", (admin_id,))
+        return False
+    return True
+
+
+def login_admin(username, password):
+    if not is_sharded():
+        with db.pooled_connection(db.DATABASE) as conn:
+            return db.login_admin(conn, username, password)
+    with catalog_connection() as catalog:
+        admin_id, ok = db.login_admin(catalog, username, password)
+    if ok:
+        # shards split before hashes were left out still hold a copy that rehashing would leave stale
+        with db.pooled_connection(shard_file(admin_id)) as conn, conn:
+            conn.execute("UPDATE admin SET password_hash = '' WHERE id = ? AND password_hash != ''", (admin_id,))
+    return admin_id, ok
+
+
+def _copy_small_rewards(conn):
+    """Seed a new shard's shared SmallRewards from admin 1's shard, the closest thing to a shared pool."""
+    source = shard_file(1)
+    if conn.db_file == source or not os.path.exists(source):
+        return
+    with db.pooled_connection(source) as src:
+        rewards = src.execute("SELECT reward, weight, tier, daily_cap FROM SmallRewards WHERE admin_id IS NULL").fetchall()
+    with conn:
+        conn.executemany("INSERT INTO SmallRewards (reward, weight, tier, daily_cap) VALUES (?, ?, ?, ?)", rewards)
+    db.read_cache.invalidate("small_rewards")
+
+
+def _columns(conn, table, schema="main"):
+    return [row[1] for row in conn.execute(f'PRAGMA {schema}.table_info("{table}")')]
+
+
+def split_database(source, directory, catalog=None):
+    """Copy each admin in a single-file database into its own shard.
+
+    The source is left untouched. Admin ids, user ids and task ids are kept,
+    the shared SmallRewards are copied into every shard and DailyXP and the
+    leaderboards are rebuilt; cross-household leaderboards only rank the
+    households that share a database file. Archived partitions stay where they are; the shard's archive
+    paths are rewritten to point at them. Returns {admin_id: rows copied}.
+    """
+    os.makedirs(directory, exist_ok=True)
+    catalog = catalog or os.path.join(directory, "catalog.db")
+    src = sqlite3.connect(source)
+    db.create_tables(src)  # bring the source up to the current schema first
+    admins = src.execute("SELECT id, username, password_hash FROM admin ORDER BY id").fetchall()
+    src.close()
+
+    cat = sqlite3.connect(catalog)
+    create_catalog(cat)
+    with cat:
+        cat.executemany("INSERT OR REPLACE INTO admin (id, username, password_hash) VALUES (?, ?, ?)", admins)
+    cat.close()
+
+    copied = {}
+    for admin_id, _, _ in admins:
+        path = shard_file(admin_id, directory)
+        if os.path.exists(path):
+            raise FileExistsError(f"{path} already exists; refusing to overwrite a shard")
+        conn = sqlite3.connect(path)
+        db.create_tables(conn)
+        conn.execute("ATTACH DATABASE ? AS src", (source,))
+        rows = 0
+        with conn:
+            # the whole admin row, so settings such as xp_rule come along
+            columns = ", ".join(c for c in _columns(conn, "admin") if c in _columns(conn, "admin", "src"))
+            conn.execute(f"INSERT INTO main.admin ({columns}) SELECT {columns} FROM src.admin WHERE id = ?", (admin_id,))
+            conn.execute("UPDATE main.admin SET password_hash = '' WHERE id = ?", (admin_id,))  # kept in the catalog only
+            for table in SHARDED_TABLES:
+                if table in ("ActivityEvents", "UserSnapshots"):
+                    # the copies above fired the event triggers; keep the source's history instead
+                    conn.execute(f"DELETE FROM main.{table}")
+                columns = ", ".join(c for c in _columns(conn, table) if c in _columns(conn, table, "src"))
+                rows += conn.execute(
+                    f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM src.{table} WHERE admin_id = ?",
+                    (admin_id,),
+                ).rowcount
+            # SmallRewards has a nullable admin_id: shared rewards go to every shard
+            columns = ", ".join(_columns(conn, "SmallRewards"))
+            conn.execute(f"INSERT INTO main.SmallRewards ({columns}) SELECT {columns} FROM src.SmallRewards "
+                         "WHERE admin_id IS NULL OR admin_id = ?", (admin_id,))
+            # the copies were stamped with new change numbers; keep the source's so device cursors stay valid
+            conn.execute("UPDATE main.ChangeSequence SET seq = (SELECT seq FROM src.ChangeSequence)")
+            for table, key, _ in SYNC_ENTITIES.values():
+                conn.execute(f"""
+                    UPDATE main.{table} SET change_seq = s.change_seq FROM src.{table} s
+                    WHERE s.{key} = {table}.{key} AND s.admin_id IS {table}.admin_id
+                      AND s.change_seq IS NOT {table}.change_seq""")
+            # archive paths are relative to the database's directory
+            source_dir, target_dir = os.path.dirname(os.path.abspath(source)), os.path.dirname(os.path.abspath(path))
+            for archive_id, archive_path in conn.execute("SELECT archive_id, path FROM ActivityArchive").fetchall():
+                moved = os.path.relpath(os.path.join(source_dir, archive_path), target_dir)
+                conn.execute("UPDATE ActivityArchive SET path = ? WHERE archive_id = ?", (moved, archive_id))
+        conn.execute("DETACH DATABASE src")
+        db.rebuild_rollups(conn, admin_id)
+        db.rebuild_leaderboards(conn, admin_id)
+        conn.close()
+        copied[admin_id] = rows
+    return copied
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Manage per-admin database shards.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    split = commands.add_parser("split", help="split a single-file database into one shard per admin")
+    split.add_argument("source", nargs="?", default=db.DATABASE)
+    split.add_argument("--shard-dir", default="shards")
+    split.add_argument("--catalog", help="catalog database (default: <shard dir>/catalog.db)")
+    args = parser.parse_args(argv[1:])
+
+    start = time.perf_counter()
+    try:
+        copied = split_database(args.source, args.shard_dir, args.catalog)
+    except (sqlite3.Error, FileExistsError) as e:
+        print(f"Split failed: {e}")
+        return 1
+    for admin_id, rows in copied.items():
+        print(f"admin {admin_id}: {rows} rows -> {shard_file(admin_id, args.shard_dir)}")
+    print(f"Split {len(copied)} admins in {time.perf_counter() - start:.2f}s. "
+          f"Run with CHORES_SHARD_DIR={args.shard_dir} to use the shards.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
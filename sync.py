@@ -0,0 +1,232 @@
+"""Delta sync for devices: the synced tables and an offline-first client.
+
+Every table in SYNC_ENTITIES carries a change_seq stamped from one
+database-wide counter (migration 11), and deleted rows leave a tombstone, so
+``db.get_changes`` (``GET /admins/{id}/changes?since=<cursor>``) returns just
+the rows that changed after a client's cursor, each once with its current
+values. A sync then costs about as much as the churn since the last one,
+not the size of the household's history.
+
+SyncClient keeps a local SQLite copy of one household. It pulls deltas
+into that copy and queues activity logs in an outbox while the API cannot
+be reached. Each queued log carries a client_ref, and the server logs a
+client_ref at most once, so replaying a log whose reply was lost does not
+log it twice.
+
+    python sync.py http://localhost:8000 --admin-id 1 --token <token> [--cache sync_cache.db]
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import time
+import uuid
+from datetime import date
+from urllib import error, request
+
+# entity: (table, key column, columns sent to clients); every table has admin_id and change_seq
+SYNC_ENTITIES = {
+    "users": ("Users", "user_id", ("user_id", "name", "current_level", "total_xp")),
+    "tasks": ("Tasks", "task_id", ("task_id", "task_name", "base_xp", "time_multiplier")),
+    "levels": ("Levels", "Level", ("Level", "XPRequired", "CumulativeXP", "Reward")),
+    "schedules": ("Schedules", "schedule_id", ("schedule_id", "task_id", "user_id", "frequency", "every", "weekdays",
+                                               "day_of_month", "start_date", "end_date")),
+    "small_rewards": ("SmallRewards", "reward_id", ("reward_id", "reward", "weight", "tier", "daily_cap")),
+    "activities": ("ActivityLog", "activity_id", ("activity_id", "user_id", "task_id", "date", "time_spent", "xp_earned",
+                                                  "bonus_xp", "small_reward", "client_ref")),
+}
+
+PULL_LIMIT = 1000  # changes per page
+PUSH_BATCH = 500  # the API's MAX_BATCH
+
+CACHE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS SyncState (name TEXT PRIMARY KEY, value);
+    -- status is 'queued' until the server logs it, or 'rejected' with the server's error
+    CREATE TABLE IF NOT EXISTS Outbox (
+        client_ref TEXT PRIMARY KEY,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        error TEXT,
+        queued_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+
+class SyncClient:
+    def __init__(self, base_url, admin_id, token=None, cache_file="sync_cache.db", timeout=10.0, transport=None):
+        """transport(method, path, body, token) -> (status, raw body bytes) replaces HTTP, e.g. to call api.app in-process."""
+        self.base_url = base_url.rstrip("/")
+        self.admin_id = admin_id
+        self.token = token
+        self.timeout = timeout
+        self.transport = transport or self._http
+        self.bytes_received = 0
+        self.conn = sqlite3.connect(cache_file)
+        self.conn.executescript(CACHE_SCHEMA)
+        for entity, (_, key, columns) in SYNC_ENTITIES.items():
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {entity} ({', '.join(columns)}, PRIMARY KEY ({key}))")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _http(self, method, path, body, token):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        data = json.dumps(body).encode() if body is not None else None
+        req = request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with request.urlopen(req, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except error.HTTPError as e:
+            return e.code, e.read()
+
+    def _request(self, method, path, body=None):
+        """(status, decoded JSON); raises OSError when the API cannot be reached."""
+        status, raw = self.transport(method, f"/admins/{self.admin_id}{path}", body, self.token)
+        self.bytes_received += len(raw)
+        return status, json.loads(raw or b"null")
+
+    @property
+    def cursor(self):
+        row = self.conn.execute("SELECT value FROM SyncState WHERE name = 'cursor'").fetchone()
+        return row[0] if row else 0
+
+    def apply(self, delta):
+        """Apply one page from get_changes in one local transaction. Returns rows upserted plus rows deleted."""
+        applied = 0
+        with self.conn:
+            for entity, change in delta["changes"].items():
+                if entity not in SYNC_ENTITIES:
+                    continue  # a newer server; ignore what this client does not know
+                _, key, _ = SYNC_ENTITIES[entity]
+                # deletes first: a row deleted and re-added in the same page is in both
+                self.conn.executemany(f"DELETE FROM {entity} WHERE {key} = ?", [(k,) for k in change.get("deleted", ())])
+                columns = change.get("columns", ())
+                if change.get("rows"):
+                    self.conn.executemany(
+                        f"INSERT OR REPLACE INTO {entity} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                        change["rows"])
+                applied += len(change.get("deleted", ())) + len(change.get("rows", ()))
+            self.conn.execute("INSERT OR REPLACE INTO SyncState (name, value) VALUES ('cursor', ?)", (delta["cursor"],))
+        return applied
+
+    def pull(self, limit=PULL_LIMIT):
+        """Fetch and apply pages of changes until caught up. Returns a summary dict."""
+        start, received = time.perf_counter(), self.bytes_received
+        pages = changes = 0
+        while True:
+            status, delta = self._request("GET", f"/changes?since={self.cursor}&limit={limit}")
+            if status != 200:
+                raise RuntimeError(f"Pull failed ({status}): {delta}")
+            changes += self.apply(delta)
+            pages += 1
+            if not delta["more"]:
+                break
+        return {"pages": pages, "changes": changes, "cursor": self.cursor, "bytes": self.bytes_received - received,
+                "seconds": round(time.perf_counter() - start, 4)}
+
+    def log_activity(self, user_id, task_id, time_spent=0, bonus_xp=0, day=None):
+        """Queue an activity log and try to send it straight away. Returns its client_ref."""
+        client_ref = uuid.uuid4().hex
+        payload = {"user_id": user_id, "task_id": task_id, "time_spent": time_spent, "bonus_xp": bonus_xp,
+                   "date": str(day or date.today()), "client_ref": client_ref}
+        with self.conn:
+            self.conn.execute("INSERT INTO Outbox (client_ref, payload) VALUES (?, ?)", (client_ref, json.dumps(payload)))
+        try:
+            self.push()
+        except (OSError, RuntimeError):
+            pass  # offline or the server is struggling: it stays queued for the next sync
+        return client_ref
+
+    def push(self, batch=PUSH_BATCH):
+        """Send queued logs, oldest first. Returns (sent, rejected); raises OSError when offline.
+
+        A log the server refuses (unknown user or task) is marked rejected and
+        not sent again; one that failed on the server's side stays queued.
+        """
+        sent = rejected = 0
+        while True:
+            queued = self.conn.execute("SELECT client_ref, payload FROM Outbox WHERE status = 'queued' "
+                                       "ORDER BY queued_at, rowid LIMIT ?", (batch,)).fetchall()
+            if not queued:
+                return sent, rejected
+            status, body = self._request("POST", "/activities/batch", {"activities": [json.loads(p) for _, p in queued]})
+            if status not in (201, 207):
+                raise RuntimeError(f"Push failed ({status}): {body}")
+            kept = 0
+            with self.conn:
+                for (client_ref, _), result in zip(queued, body["results"]):
+                    if result["ok"]:
+                        self.conn.execute("DELETE FROM Outbox WHERE client_ref = ?", (client_ref,))
+                        sent += 1
+                    elif result.get("status", 400) < 500:
+                        self.conn.execute("UPDATE Outbox SET status = 'rejected', error = ? WHERE client_ref = ?",
+                                          (result["error"], client_ref))
+                        rejected += 1
+                    else:
+                        kept += 1
+            if kept:
+                return sent, rejected  # try those again on the next sync
+
+    def sync(self):
+        """Push the outbox, then pull, so the pulled rows include the server's XP for what was just sent."""
+        summary = {"offline": False, "sent": 0, "rejected": 0}
+        try:
+            summary["sent"], summary["rejected"] = self.push()
+            summary.update(self.pull())
+        except OSError as e:
+            summary.update(offline=True, error=str(e))
+        summary["queued"] = len(self.pending())
+        return summary
+
+    def _rows(self, entity, where="", params=()):
+        return self.conn.execute(f"SELECT {', '.join(SYNC_ENTITIES[entity][2])} FROM {entity} {where}", params).fetchall()
+
+    def users(self):
+        return self._rows("users", "ORDER BY user_id")
+
+    def tasks(self):
+        return self._rows("tasks", "ORDER BY task_id")
+
+    def levels(self):
+        return self._rows("levels", "ORDER BY Level")
+
+    def activities(self, user_id=None):
+        if user_id is None:
+            return self._rows("activities", "ORDER BY date DESC, activity_id DESC")
+        return self._rows("activities", "WHERE user_id = ? ORDER BY date DESC, activity_id DESC", (user_id,))
+
+    def pending(self):
+        """Queued logs the server has not confirmed yet, as payload dicts."""
+        return [json.loads(p) for p, in self.conn.execute(
+            "SELECT payload FROM Outbox WHERE status = 'queued' ORDER BY queued_at, rowid")]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Sync a local copy of one household with the JSON API.")
+    parser.add_argument("base_url")
+    parser.add_argument("--admin-id", type=int, required=True)
+    parser.add_argument("--token", help="session token from POST /login")
+    parser.add_argument("--cache", default="sync_cache.db")
+    args = parser.parse_args(argv[1:])
+
+    client = SyncClient(args.base_url, args.admin_id, args.token, args.cache)
+    try:
+        summary = client.sync()
+    except RuntimeError as e:
+        print(e)
+        return 1
+    finally:
+        client.close()
+    if summary["offline"]:
+        print(f"Offline ({summary['error']}); {summary['queued']} logs queued")
+        return 1
+    print(f"Sent {summary['sent']} logs ({summary['rejected']} rejected), pulled {summary['changes']} changes "
+          f"in {summary['pages']} pages ({summary['bytes']} bytes, {summary['seconds']}s), cursor {summary['cursor']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
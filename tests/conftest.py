@@ -0,0 +1,72 @@
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import writer  # noqa: E402
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    """A migrated database with one household: admin "parent", two kids, two tasks and the default levels."""
+    path = str(tmp_path / "chores.db")
+    monkeypatch.setattr(db, "DATABASE", path)
+    conn = sqlite3.connect(path)
+    db.create_tables(conn)
+    db.register_admin(conn, "parent", "password")
+    admin_id, _ = db.login_admin(conn, "parent", "password")
+    db.add_user(conn, admin_id, "Ada")
+    db.add_user(conn, admin_id, "Ben")
+    db.add_task(conn, admin_id, "Dishes", 10, 1.0)
+    db.add_task(conn, admin_id, "Laundry", 20, 0.5)
+    conn.close()
+    db.read_cache.clear()
+    yield path
+    writer.close_writers()
+    db.close_pools()
+    db.read_cache.clear()
+
+
+@pytest.fixture
+def conn(db_file):
+    conn = sqlite3.connect(db_file)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def household(conn):
+    """(admin_id, [user_id, ...], [task_id, ...]) of the seeded household."""
+    admin_id = conn.execute("SELECT id FROM admin WHERE username = 'parent'").fetchone()[0]
+    users = [row[0] for row in db.get_users(conn, admin_id)]
+    tasks = [row[0] for row in db.get_tasks(conn, admin_id)]
+    return admin_id, users, tasks
+
+
+def call_app(app, method, path, body=None, token=None):
+    """Send one request straight to an ASGI app; returns (status, raw body bytes)."""
+    path, _, query = path.partition("?")
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode(), "headers": headers,
+             "client": ("127.0.0.1", 0)}
+    payload = b"" if body is None else json.dumps(body).encode()
+    response = {"body": b""}
+
+    async def receive():
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        else:
+            response["body"] += message.get("body", b"")
+
+    asyncio.run(app(scope, receive, send))
+    return response["status"], response["body"]
+
@@ -0,0 +1,62 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import db
+import migrations
+
+USERS_SQL = "SELECT user_id, admin_id, name, current_level, total_xp FROM Users ORDER BY user_id"
+TASKS_SQL = "SELECT task_id, admin_id, task_name, base_xp, time_multiplier FROM Tasks ORDER BY task_id"
+BASELINE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chores.db")
+
+
+@pytest.fixture
+def baseline(tmp_path):
+    """A copy of the shipped version-0 database with a few activities logged the old way."""
+    path = str(tmp_path / "baseline.db")
+    shutil.copyfile(BASELINE_DB, path)
+    conn = sqlite3.connect(path)
+    assert migrations.get_schema_version(conn) == 0
+    with conn:
+        conn.executemany(
+            "INSERT INTO ActivityLog (admin_id, user_id, task_id, date, time_spent, xp_earned, bonus_xp, small_reward) "
+            "VALUES (1, ?, ?, ?, ?, ?, ?, ?)",
+            [(1, 1, "2024-03-01", 10, 20, None, None), (1, 1, "2024-03-01", 5, 20, 5, "Sticker"),
+             (2, 2, "2024-03-04", 30, 60, 0, None)])
+    yield conn
+    conn.close()
+
+
+def test_migrates_baseline_to_latest(baseline):
+    users = baseline.execute(USERS_SQL).fetchall()
+    tasks = baseline.execute(TASKS_SQL).fetchall()
+
+    assert migrations.migrate(baseline) == list(range(1, migrations.LATEST_VERSION + 1))
+    assert migrations.get_schema_version(baseline) == migrations.LATEST_VERSION
+    assert baseline.execute("PRAGMA integrity_check").fetchone() == ("ok",)
+    assert baseline.execute("PRAGMA foreign_key_check").fetchall() == []
+
+    assert baseline.execute(USERS_SQL).fetchall() == users
+    assert baseline.execute(TASKS_SQL).fetchall() == tasks
+    assert baseline.execute("SELECT COUNT(*) FROM ActivityLog").fetchone() == (3,)
+
+    daily = baseline.execute("SELECT user_id, date, task_id, activity_count, time_spent, xp_earned, bonus_xp "
+                             "FROM DailyXP ORDER BY 1, 2, 3").fetchall()
+    assert daily == [(1, "2024-03-01", 1, 2, 15, 40, 5), (2, "2024-03-04", 2, 1, 30, 60, 0)]
+
+    assert [name for name, ok, _ in db.check_query_plans(baseline) if not ok] == []
+
+
+def test_migrate_is_idempotent(baseline):
+    migrations.migrate(baseline)
+    assert migrations.migrate(baseline) == []
+    db.create_tables(baseline)
+    assert migrations.get_schema_version(baseline) == migrations.LATEST_VERSION
+
+
+def test_migrates_step_by_step(baseline):
+    for version in range(1, migrations.LATEST_VERSION + 1):
+        assert migrations.migrate(baseline, version) == [version]
+    assert [name for name, ok, _ in db.check_query_plans(baseline) if not ok] == []
@@ -0,0 +1,100 @@
+"""DailyXP, the leaderboards and total_xp are kept by triggers; they must always agree with ActivityLog."""
+from collections import Counter
+from datetime import date
+
+import pytest
+
+import db
+import events
+
+ACTIVITY_ROWS_SQL = "SELECT user_id, task_id, date, time_spent, xp_earned, bonus_xp FROM ActivityLog WHERE admin_id = ?"
+
+
+def week_of(day):
+    return db.week_start(day)
+
+
+def assert_consistent(conn, admin_id, archived=()):
+    """archived holds ActivityLog rows (as ACTIVITY_ROWS_SQL selects them) that were moved to Parquet."""
+    rows = conn.execute(ACTIVITY_ROWS_SQL, (admin_id,)).fetchall() + list(archived)
+
+    totals, days, weeks = Counter(), {}, Counter()
+    for user_id, task_id, day, time_spent, xp_earned, bonus_xp in rows:
+        totals[user_id] += xp_earned + bonus_xp
+        count, minutes, xp, bonus = days.get((user_id, day, task_id), (0, 0, 0, 0))
+        days[(user_id, day, task_id)] = (count + 1, minutes + time_spent, xp + xp_earned, bonus + bonus_xp)
+        weeks[(user_id, week_of(day))] += xp_earned + bonus_xp
+
+    users = dict(conn.execute("SELECT user_id, total_xp FROM Users WHERE admin_id = ?", (admin_id,)).fetchall())
+    assert users == {user_id: totals[user_id] for user_id in users}
+
+    daily = {(user_id, day, task_id): tuple(rest) for user_id, day, task_id, *rest in conn.execute(
+        "SELECT user_id, date, task_id, activity_count, time_spent, xp_earned, bonus_xp FROM DailyXP "
+        "WHERE admin_id = ? AND activity_count > 0", (admin_id,))}
+    assert daily == days
+
+    weekly = {(user_id, period): score for user_id, period, score in conn.execute(
+        "SELECT user_id, period, score FROM LeaderboardScores WHERE board = 'weekly' AND admin_id = ? AND score != 0",
+        (admin_id,))}
+    assert weekly == {key: score for key, score in weeks.items() if score}
+    all_time = dict(conn.execute(
+        "SELECT user_id, score FROM LeaderboardScores WHERE board = 'all_time' AND admin_id = ?", (admin_id,)).fetchall())
+    assert all_time == users
+
+    assert events.check_consistency(conn, admin_id, snapshot=False) == []
+
+
+def log(conn, household, day, user=0, task=0, time_spent=10, bonus_xp=0):
+    admin_id, users, tasks = household
+    db.log_activity(conn, admin_id, users[user], tasks[task], day, time_spent, bonus_xp)
+    return conn.execute("SELECT MAX(activity_id) FROM ActivityLog").fetchone()[0]
+
+
+@pytest.fixture
+def history(conn, household):
+    """Activity ids logged across two old months and today."""
+    today = date.today().isoformat()
+    return [log(conn, household, "2024-01-10"), log(conn, household, "2024-01-10", task=1, time_spent=30),
+            log(conn, household, "2024-02-03", user=1, bonus_xp=5), log(conn, household, today, user=1, task=1),
+            log(conn, household, today, time_spent=45, bonus_xp=2)]
+
+
+def test_log(conn, household, history):
+    assert_consistent(conn, household[0])
+
+
+def test_correct(conn, household, history):
+    admin_id, users, tasks = household
+    db.correct_activity(conn, admin_id, history[0], task_id=tasks[1], time_spent=60, reason="wrong chore")
+    db.correct_activity(conn, admin_id, history[3], date="2024-02-04", bonus_xp=3)
+    assert_consistent(conn, admin_id)
+
+
+def test_void(conn, household, history):
+    admin_id = household[0]
+    db.void_activity(conn, admin_id, history[1], reason="logged twice")
+    db.void_activity(conn, admin_id, history[4])
+    assert_consistent(conn, admin_id)
+
+
+def test_rescore(conn, household, history):
+    admin_id = household[0]
+    rule = 2 if db.get_xp_rule(conn, admin_id) == 1 else 1
+    assert db.recompute_xp(conn, admin_id, rule)["activities_changed"] > 0
+    assert_consistent(conn, admin_id)
+    users = db.get_users(conn, admin_id)
+    levels = db.get_level_index(conn, admin_id).levels_for([total_xp for *_, total_xp in users])
+    assert [current_level for _, _, current_level, _ in users] == [int(level) for level in levels]
+
+
+def test_archive_then_rescore(conn, household, history):
+    pytest.importorskip("pyarrow")
+    import archive
+
+    admin_id = household[0]
+    archived = conn.execute(ACTIVITY_ROWS_SQL + " AND date < '2024-03-01'", (admin_id,)).fetchall()
+    assert archive.archive_activities(conn, "2024-03-01", admin_id)["rows_archived"] == len(archived)
+    assert_consistent(conn, admin_id, archived)
+
+    db.recompute_xp(conn, admin_id, 2 if db.get_xp_rule(conn, admin_id) == 1 else 1)  # archived rows keep their XP
+    assert_consistent(conn, admin_id, archived)
@@ -0,0 +1,82 @@
+import sqlite3
+
+import pytest
+
+import api
+import auth
+from conftest import call_app
+from sync import SyncClient
+
+
+@pytest.fixture
+def token(db_file):
+    _, token = auth.login("parent", "password")
+    yield token
+    auth.logout(token)
+
+
+def make_client(tmp_path, admin_id, token, transport):
+    return SyncClient("http://in-process", admin_id, token, cache_file=str(tmp_path / "cache.db"), transport=transport)
+
+
+def activity_count(db_file):
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM ActivityLog").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_replaying_a_push_logs_once(tmp_path, db_file, household, token):
+    admin_id, users, tasks = household
+    lost = []
+
+    def lose_first_reply(method, path, body, token):
+        reply = call_app(api.app, method, path, body, token)
+        if method == "POST" and not lost:
+            lost.append(reply)
+            raise OSError("connection reset")  # the server logged it, the client never heard back
+        return reply
+
+    client = make_client(tmp_path, admin_id, token, lose_first_reply)
+    try:
+        client.log_activity(users[0], tasks[0], time_spent=10)
+        assert lost and len(client.pending()) == 1
+        assert activity_count(db_file) == 1
+
+        summary = client.sync()
+        assert summary["sent"] == 1 and summary["queued"] == 0
+        assert activity_count(db_file) == 1
+        assert len(client.activities()) == 1
+        first_xp = client.users()[0][3]
+
+        assert client.push() == (0, 0)  # nothing left to resend
+        client.pull()
+        assert client.users()[0][3] == first_xp
+    finally:
+        client.close()
+
+
+def test_batch_replay_returns_first_result(db_file, household, token):
+    admin_id, users, tasks = household
+    batch = {"activities": [{"user_id": users[0], "task_id": tasks[0], "time_spent": 5, "client_ref": "a"},
+                            {"user_id": users[1], "task_id": tasks[1], "time_spent": 20, "client_ref": "b"}]}
+    path = f"/admins/{admin_id}/activities/batch"
+    status, first = call_app(api.app, "POST", path, batch, token)
+    assert status == 201
+    status, again = call_app(api.app, "POST", path, batch, token)
+    assert status == 201
+    assert again == first
+    assert activity_count(db_file) == 2
+
+
+def test_rejected_log_is_not_resent(tmp_path, db_file, household, token):
+    admin_id, users, tasks = household
+    client = make_client(tmp_path, admin_id, token, lambda *args: call_app(api.app, *args))
+    try:
+        client.log_activity(users[0], -1)
+        assert client.pending() == []
+        assert client.push() == (0, 0)
+        assert activity_count(db_file) == 0
+    finally:
+        client.close()
@@ -0,0 +1,52 @@
+from datetime import date
+
+import pytest
+
+import db
+from writer import ActivityWriter
+
+TODAY = date.today().isoformat()
+
+
+@pytest.fixture
+def activity_writer(db_file):
+    # a long max_wait so everything submitted below lands in one batch
+    activity_writer = ActivityWriter(db_file, max_wait=0.2)
+    yield activity_writer
+    activity_writer.close()
+
+
+def logged(conn):
+    return conn.execute("SELECT user_id, task_id, xp_earned FROM ActivityLog ORDER BY activity_id").fetchall()
+
+
+def test_ack_resolves_after_commit(activity_writer, conn, household):
+    admin_id, users, tasks = household
+    xp_earned, total_xp, current_level = activity_writer.submit(admin_id, users[0], tasks[0], TODAY, 10).result(5)
+    assert xp_earned > 0
+    assert total_xp == xp_earned
+    assert current_level == db.get_level_index(conn, admin_id).levels_for([total_xp])[0]
+    assert logged(conn) == [(users[0], tasks[0], xp_earned)]
+
+
+def test_bad_item_fails_alone(activity_writer, conn, household):
+    admin_id, users, tasks = household
+    futures = [activity_writer.submit(admin_id, users[0], tasks[0], TODAY, 10),
+               activity_writer.submit(admin_id, users[1], -1, TODAY, 10),
+               activity_writer.submit(admin_id, users[1], tasks[1], TODAY, 30)]
+    good, bad, last = futures
+    with pytest.raises(ValueError):
+        bad.result(5)
+    assert good.result(5)[0] > 0 and last.result(5)[0] > 0
+    assert [row[:2] for row in logged(conn)] == [(users[0], tasks[0]), (users[1], tasks[1])]
+    stats = activity_writer.stats()
+    assert stats["batches"] == 1
+    assert stats["failed"] == 1
+
+
+def test_client_ref_is_logged_once(activity_writer, conn, household):
+    admin_id, users, tasks = household
+    first = activity_writer.submit(admin_id, users[0], tasks[0], TODAY, 10, client_ref="button-1").result(5)
+    again = activity_writer.submit(admin_id, users[0], tasks[0], TODAY, 10, client_ref="button-1").result(5)
+    assert again == first
+    assert len(logged(conn)) == 1
@@ -1,18 +1,23 @@
+import time
+import uuid
+
 import streamlit as st
-from db import create_connection, create_tables, get_users, get_tasks, log_activity, get_user_activities, login_admin, get_levels, get_all_user_activities, get_random_small_reward
-import pandas as pd
+from db import pooled_connection, get_users, get_tasks, get_user_activities, login_admin, get_level_index, get_activity_page, get_random_small_reward, get_agenda, get_recent_activities, correct_activity, void_activity
 from datetime import datetime
-import time
+from writer import get_writer
+from shards import database_for
 
 
 admin_id = 1
+HISTORY_PAGE_SIZES = [10, 25, 50, 100]
+LOG_ACK_TIMEOUT = 10  # seconds before a log still waiting for the background writer is flagged as slow
+ACK_POLL_INTERVAL = 0.5  # seconds between checks for acknowledged logs
 
 def main():
     # Set up the Streamlit page
     st.set_page_config(page_title="Home", page_icon="🏠", layout="wide")
-    database = "chores.db"
-    conn = create_connection(database)
-    create_tables(conn)
+    with pooled_connection(database_for(admin_id)) as conn:
+        show_tracker(conn, admin_id)
     
     
 
@@ -36,33 +41,30 @@ def show_tracker(conn, admin_id):
     else:
         st.error("Please select a user.")
 
+def markdown_table(records):
+    cell = lambda value: "" if value is None else str(value).replace("|", "\\|")
+    lines = ["| " + " | ".join(records.columns) + " |", "|" + " --- |" * len(records.columns)]
+    lines += ["| " + " | ".join(cell(value) for value in row) + " |" for row in records]
+    return "\n".join(lines)
+
+def get_level_progress(level_index, total_xp):
+    """Returns (progress through the current level between 0 and 1, XP still needed for the next one)."""
+    _, _, next_level_xp, progress_percent = level_index.progress(total_xp)
+    xp_to_next_level = next_level_xp - total_xp if next_level_xp is not None else 0
+    return progress_percent, xp_to_next_level
+
 def display_user_progress(conn, user_id, admin_id, current_date):
     user_details = get_users(conn, admin_id)
     user_details = [user for user in user_details if user[0] == user_id][0]
     user_name, current_level, total_xp = user_details[1], user_details[2], user_details[3]
     
-    levels = get_levels(conn, admin_id)
-    current_level_info = next((level for level in levels if level[0] == current_level), None)
-    next_level_info = next((level for level in levels if level[0] == current_level + 1), None)
+    progress_percent, xp_to_next_level = get_level_progress(get_level_index(conn, admin_id), total_xp)
 
     st.title(f"{user_name}'s Chore Progress")
     col1, col2 = st.columns(2)
     with col1:
         st.header("Current Level")
         st.subheader(f"Level {current_level}")
-
-        if current_level_info:
-            xp_for_next_level = next_level_info[2]  # Cumulative XP required for next level
-        else:
-            xp_for_next_level = 100  # Use current level max if there's no next level
-
-        
-        # Calculate progress percentage based on total XP against the XP needed for next level
-        progress_percent = total_xp / xp_for_next_level if xp_for_next_level else 1
-        progress_percent = max(0, min(progress_percent, 1))  # Clamp the value between 0 and 1
-        xp_to_next_level = xp_for_next_level - total_xp
-
-
         st.progress(progress_percent)
         st.caption(f"{xp_to_next_level} XP to Next Level")
 
@@ -71,21 +73,89 @@ def display_user_progress(conn, user_id, admin_id, current_date):
         st.subheader(f"{total_xp} XP")
 
 
+    display_agenda(conn, admin_id, user_id, current_date)
+
     # Display today's tasks
     today_tasks = get_user_activities(conn, admin_id, user_id, str(current_date))
     if not today_tasks.empty:
         st.header("Today's Tasks")
-        st.dataframe(today_tasks)
+        # a few rows at most, so a markdown table instead of st.dataframe keeps pandas off the first page load
+        st.markdown(markdown_table(today_tasks))
     else:
         st.write("No tasks for today.")
 
-    # Expander for all tasks
-    with st.expander("View All Tasks"):
-        all_tasks = get_all_user_activities(conn, admin_id, user_id)
-        if not all_tasks.empty:
-            st.dataframe(all_tasks)
-        else:
-            st.write("No tasks found.")
+    # Expander for all tasks, only queried while it is open
+    history = st.expander("View All Tasks", key=f"history_{user_id}", on_change="rerun")
+    if history.open:
+        with history:
+            display_activity_history(conn, admin_id, user_id)
+
+    fix = st.expander("Fix a Mistake", key=f"fix_{user_id}", on_change="rerun")
+    if fix.open:
+        with fix:
+            fix_activity(conn, admin_id, user_id)
+
+def fix_activity(conn, admin_id, user_id):
+    """Corrects or removes one of the user's recent activities; both are kept in the event log."""
+    recent = get_recent_activities(conn, admin_id, user_id)
+    if not recent:
+        st.write("No recent activities.")
+        return
+    activity = st.selectbox("Activity", recent, key=f"fix_activity_{user_id}",
+                            format_func=lambda a: f"{a[1]} {a[2]} ({a[3]} min, {(a[4] or 0) + (a[5] or 0)} XP)")
+    activity_id = activity[0]
+    col1, col2 = st.columns(2)
+    time_spent = col1.number_input("Time Spent (minutes)", min_value=0, value=activity[3] or 0, key=f"fix_time_{activity_id}")
+    bonus_xp = col2.number_input("Bonus XP", min_value=0, value=activity[5] or 0, key=f"fix_bonus_{activity_id}")
+    reason = st.text_input("Reason", key=f"fix_reason_{activity_id}") or None
+    col1, col2 = st.columns(2)
+    if col1.button("Save Correction", key=f"fix_save_{activity_id}"):
+        correct_activity(conn, admin_id, activity_id, time_spent=time_spent, bonus_xp=bonus_xp, reason=reason)
+        st.session_state["log_toasts"] = ["Activity corrected."]
+        st.rerun()
+    if col2.button("Remove Activity", key=f"fix_void_{activity_id}"):
+        void_activity(conn, admin_id, activity_id, reason)
+        st.session_state["log_toasts"] = ["Activity removed."]
+        st.rerun()
+
+def display_agenda(conn, admin_id, user_id, current_date):
+    """Scheduled chores that are due or overdue, each completed with one click."""
+    agenda = get_agenda(conn, admin_id, current_date, user_id)
+    if not agenda:
+        return
+    st.header("Today's Chores")
+    for schedule_id, _, task_id, task_name, due_date, status in agenda:
+        col1, col2 = st.columns([3, 1])
+        if status == "done":
+            col1.write(f"~~{task_name}~~ ✅")
+            continue
+        col1.write(f"**{task_name}**" + (f" (overdue since {due_date})" if status == "overdue" else ""))
+        if col2.button("Complete", key=f"complete_{schedule_id}_{user_id}"):
+            log_task(conn, admin_id, user_id, task_id, current_date)
+
+def display_activity_history(conn, admin_id, user_id):
+    """Shows one page of the user's history at a time, newest first."""
+    # Cursor for the start of every page visited so far; the last one is shown.
+    cursors_key = f"history_cursors_{user_id}"
+    cursors = st.session_state.setdefault(cursors_key, [None])
+    page_size = st.selectbox("Page Size", HISTORY_PAGE_SIZES, index=1, key=f"history_page_size_{user_id}",
+                             on_change=lambda: st.session_state.pop(cursors_key, None))
+
+    page, next_cursor = get_activity_page(conn, admin_id, user_id, page_size, cursors[-1])
+    if page.empty:
+        st.write("No tasks found.")
+        return
+    page.start += (len(cursors) - 1) * page_size
+    st.dataframe(page.to_frame())
+
+    col1, col2, col3 = st.columns(3)
+    if col1.button("Newer", disabled=len(cursors) == 1, key=f"history_newer_{user_id}"):
+        cursors.pop()
+        st.rerun()
+    col2.caption(f"Page {len(cursors)}")
+    if col3.button("Older", disabled=next_cursor is None, key=f"history_older_{user_id}"):
+        cursors.append(next_cursor)
+        st.rerun()
 def manage_tasks(conn, user_id, admin_id):
     """Manages tasks and activities for the selected user."""
     task_list = get_tasks(conn, admin_id)
@@ -95,15 +165,56 @@ def manage_tasks(conn, user_id, admin_id):
     date = st.sidebar.date_input("Date")
     time_spent = st.sidebar.number_input("Time Spent (minutes)", min_value=0, value=0)
     bonus_xp = st.sidebar.number_input("Bonus XP", min_value=0, value=0)
+
+    # Toasts queued by the click that triggered this rerun
+    for message in st.session_state.pop("log_toasts", []):
+        st.toast(message)
+
     if st.sidebar.button('Log Task'):
-        small_reward = get_random_small_reward(conn)
-        log_activity(conn, admin_id, user_id, task_id, str(date), time_spent, bonus_xp, small_reward)
-        st.success("Task logged successfully!")
+        log_task(conn, admin_id, user_id, task_id, date, time_spent, bonus_xp)
+    if st.session_state.get("log_acks"):  # from this click, the agenda or an earlier rerun
+        poll_log_acks()
+
+def log_task(conn, admin_id, user_id, task_id, date, time_spent=0, bonus_xp=0):
+    """Submits to the background writer without waiting; poll_log_acks shows the result on a later rerun.
+
+    A log keeps its client_ref (and reward) in the session until it is
+    acknowledged, so clicking again replays it instead of logging twice.
+    """
+    pending = st.session_state.setdefault("pending_logs", {})
+    key = (user_id, task_id, str(date), time_spent, bonus_xp)
+    if key not in pending:
+        pending[key] = (uuid.uuid4().hex, get_random_small_reward(conn, admin_id, user_id, str(date)))
+    client_ref, small_reward = pending[key]
+    ack = get_writer(database_for(admin_id)).submit(admin_id, user_id, task_id, str(date), time_spent, bonus_xp,
+                                                    small_reward, client_ref)
+    st.session_state.setdefault("log_acks", []).append((key, ack, time.monotonic()))
+
+@st.fragment(run_every=ACK_POLL_INTERVAL)
+def poll_log_acks():
+    """Turns acknowledged logs into toasts and reruns the page; only this fragment reruns while they are pending."""
+    acks = st.session_state.get("log_acks", [])
+    pending = st.session_state.get("pending_logs", {})
+    toasts = []
+    for entry in [entry for entry in acks if entry[1].done()]:
+        acks.remove(entry)
+        key, ack, _ = entry
+        _, small_reward = pending.pop(key, (None, None))
+        try:
+            xp_earned, _, current_level = ack.result()
+        except Exception as e:
+            toasts.append(f"Could not log task: {e}")
+            continue
+        toasts.append(f"Task logged successfully! +{xp_earned + key[4]} XP")
         if small_reward:
-            st.toast(f"Congratulations! You earned {small_reward} .")
-        
-        time.sleep(4)
+            toasts.append(f"Congratulations! You earned {small_reward} .")
+    if toasts:
+        st.session_state.setdefault("log_toasts", []).extend(toasts)
         st.rerun()
+    if any(time.monotonic() - submitted > LOG_ACK_TIMEOUT for _, _, submitted in acks):
+        st.warning("Still saving. Clicking again will not log a task twice.")
+    elif acks:
+        st.caption("Saving...")
 
 if __name__ == "__main__":
     main()
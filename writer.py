@@ -0,0 +1,175 @@
+"""Background writer that group-commits activity logs.
+
+The Streamlit script thread submits a log and gets a Future back instead of
+running the transaction itself. A single writer thread per database drains
+the queue and commits everything that arrived together in one transaction,
+so concurrent sessions stop contending for SQLite's write lock and a burst
+of clicks costs one commit instead of one each. The writer has its own
+connection rather than one from the pool, since the page that waits for
+its ack is holding a pooled connection itself.
+"""
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import db
+import events
+
+_STOP = object()
+SNAPSHOT_BATCHES = 100  # batches between event snapshots of the admins just written to
+
+
+class ActivityWriter:
+    def __init__(self, db_file=db.DATABASE, max_batch=200, max_wait=0.005):
+        """max_wait is how long (seconds) to keep collecting once a batch has started."""
+        self.db_file = db_file
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._failed = 0
+        self._commit_time = 0.0
+        self._max_commit = 0.0
+        self._ack_time = 0.0
+        self._max_batch_seen = 0
+        self._conn = None
+        self._thread = threading.Thread(target=self._run, name=f"activity-writer:{db_file}", daemon=True)
+        self._thread.start()
+
+    def submit(self, admin_id, user_id, task_id, date, time_spent, bonus_xp=0, small_reward=None, client_ref=None):
+        """Queue an activity log; the Future resolves to log_activity's result after commit."""
+        future = Future()
+        self._queue.put((time.perf_counter(), (admin_id, user_id, task_id, date, time_spent, bonus_xp, small_reward,
+                                               client_ref), future))
+        return future
+
+    def close(self, timeout=5.0):
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)  # finish this batch, stop on the next loop
+                break
+            batch.append(item)
+        return batch
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = db.get_pool(self.db_file).dedicated()
+        return self._conn
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                if self._conn is not None:
+                    self._conn.close()
+                return
+            try:
+                self._write(batch)
+            except Exception as e:  # keep the writer alive; fail the whole batch
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        results = []
+        admins = set()
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for _, args, _ in batch:
+                    # A savepoint per log lets one bad entry fail alone.
+                    conn.execute("SAVEPOINT activity")
+                    try:
+                        *log, client_ref = args
+                        results.append((db.insert_activity(conn, *log, client_ref=client_ref), None))
+                        admins.add(args[0])
+                    except (sqlite3.Error, ValueError) as e:
+                        conn.execute("ROLLBACK TO activity")
+                        results.append((None, e))
+                    conn.execute("RELEASE activity")
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+        committed = time.perf_counter()
+        for admin_id in admins:
+            db.read_cache.invalidate("users", admin_id)
+
+        failed = 0
+        for (enqueued, _, future), (result, error) in zip(batch, results):
+            if error is None:
+                future.set_result(result)
+            else:
+                failed += 1
+                future.set_exception(error)
+        with self._lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._failed += failed
+            self._commit_time += committed - started
+            self._max_commit = max(self._max_commit, committed - started)
+            self._ack_time += sum(committed - enqueued for enqueued, _, _ in batch)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+            snapshot = self._batches % SNAPSHOT_BATCHES == 0
+        if snapshot:  # keeps each user's replay from their latest snapshot short
+            for admin_id in admins:
+                events.take_snapshots(conn, admin_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "db_file": self.db_file,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "failed": self._failed,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "max_batch_size": self._max_batch_seen,
+                "avg_commit_ms": round(self._commit_time * 1000 / self._batches, 3) if self._batches else 0.0,
+                "max_commit_ms": round(self._max_commit * 1000, 3),
+                "avg_ack_ms": round(self._ack_time * 1000 / self._items, 3) if self._items else 0.0,
+            }
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+def get_writer(db_file=db.DATABASE, **kwargs):
+    """Return the process-wide writer for db_file, starting it on first use."""
+    with _writers_lock:
+        writer = _writers.get(db_file)
+        if writer is None:
+            writer = _writers[db_file] = ActivityWriter(db_file, **kwargs)
+    return writer
+
+def get_writer_stats(db_file=db.DATABASE):
+    writer = _writers.get(db_file)
+    return writer.stats() if writer else None
+
+def close_writers():
+    with _writers_lock:
+        for writer in _writers.values():
+            writer.close()
+        _writers.clear()
+
+atexit.register(close_writers)
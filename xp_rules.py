@@ -0,0 +1,83 @@
+"""Versioned rules for the XP an activity earns.
+
+A rule is a SQL expression over ``{base_xp}``, ``{time_multiplier}`` and
+``{time_spent}`` placeholders, so the same rule scores a single log, a bulk
+import and a whole-history recompute inside SQLite. Rules are never edited
+in place: a new formula gets a new version. Every activity records the
+version that scored it and each admin picks the version used for new ones
+(``db.recompute_xp`` switches an admin over and rescores their history).
+
+    python xp_rules.py chores.db --admin-id 1 --rule 2 --dry-run
+"""
+import argparse
+import sqlite3
+import sys
+
+
+class XPRule:
+    __slots__ = ("version", "name", "template")
+
+    def __init__(self, version, name, template):
+        self.version = version
+        self.name = name
+        self.template = template
+
+    def expression(self, base_xp="base_xp", time_multiplier="time_multiplier", time_spent="time_spent"):
+        """The rule as SQL, with the placeholders replaced by column names or parameters."""
+        return "(" + self.template.format(base_xp=base_xp, time_multiplier=time_multiplier, time_spent=time_spent) + ")"
+
+
+XP_RULES = {}
+
+
+def register_rule(version, name, template):
+    if version in XP_RULES:
+        raise ValueError(f"XP rule {version} is already registered")
+    XP_RULES[version] = XPRule(version, name, template)
+    return XP_RULES[version]
+
+
+def get_rule(version):
+    try:
+        return XP_RULES[version]
+    except KeyError:
+        raise ValueError(f"Unknown XP rule {version!r}") from None
+
+
+register_rule(1, "Base XP", "COALESCE({base_xp}, 0)")
+# time_multiplier is XP per minute spent, on top of the task's base XP
+register_rule(2, "Base XP + minutes x multiplier",
+              "COALESCE({base_xp}, 0) + CAST(ROUND(MAX(COALESCE({time_spent}, 0), 0) * COALESCE({time_multiplier}, 0)) AS INTEGER)")
+
+DEFAULT_RULE = 1
+LATEST_RULE = max(XP_RULES)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Rescore an admin's activities with an XP rule.")
+    parser.add_argument("db_file", nargs="?", default="chores.db")
+    parser.add_argument("--admin-id", type=int, required=True)
+    parser.add_argument("--rule", type=int, help=f"rule version (default: the admin's current rule); latest is {LATEST_RULE}")
+    parser.add_argument("--dry-run", action="store_true", help="show what would change without writing")
+    args = parser.parse_args(argv[1:])
+
+    from db import create_tables, recompute_xp  # imported late, db imports this module
+    conn = sqlite3.connect(args.db_file)
+    create_tables(conn)
+    try:
+        summary = recompute_xp(conn, args.admin_id, args.rule, dry_run=args.dry_run)
+    except ValueError as e:
+        print(e)
+        return 1
+    finally:
+        conn.close()
+    verb = "Would rescore" if args.dry_run else "Rescored"
+    print(f"{verb} {summary['activities_changed']} activities for {summary['users_changed']} users "
+          f"with rule {summary['rule']} ({summary['xp_change']:+} XP) in {summary['seconds']}s")
+    if not summary["diff"].empty:
+        print(summary["diff"].to_frame().to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))